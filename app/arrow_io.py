@@ -0,0 +1,207 @@
+import numpy as np
+
+from app.decoding import MAX_ERRORS, DecodeError, field_error
+from app.schemas import CustomerFeatures, INT_FEATURES, NUM_BOUNDS
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET_TYPES = ("application/vnd.apache.parquet", "application/x-parquet")
+
+
+# pyarrow est optionnel : seuls les endpoints Arrow/Parquet en dépendent
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def available():
+    return _pyarrow() is not None
+
+
+# Schéma Arrow attendu (CustomerFeatures) : les chaînes peuvent aussi être
+# envoyées en dictionary<int32, string>, les numériques dans n'importe quel
+# type entier/flottant
+def arrow_schema():
+    pa = _pyarrow()
+    types = {str: pa.string(), int: pa.int64(), float: pa.float64()}
+    return pa.schema(
+        [
+            pa.field(name, types[tp], nullable=False)
+            for name, tp in CustomerFeatures.__annotations__.items()
+        ]
+    )
+
+
+def schema_description(engine):
+    vocabularies = dict(zip(engine.cat_features, engine.cat_categories))
+    return {
+        "content_types": [ARROW_STREAM, *PARQUET_TYPES],
+        "response": {
+            "content_type": ARROW_STREAM,
+            "fields": [{"name": "probability", "type": "float"}],
+        },
+        "fields": [
+            {
+                "name": field.name,
+                "type": str(field.type),
+                "nullable": False,
+                **(
+                    {"categories": vocabularies[field.name]}
+                    if field.name in vocabularies
+                    else {}
+                ),
+                **(
+                    {"min": NUM_BOUNDS[field.name][0], "max": NUM_BOUNDS[field.name][1]}
+                    if field.name in NUM_BOUNDS
+                    else {}
+                ),
+            }
+            for field in arrow_schema()
+        ],
+    }
+
+
+# Corps Arrow IPC (flux) ou Parquet -> Table, sans copie du buffer de la requête
+def read_table(body, content_type):
+    pa = _pyarrow()
+    buffer = pa.py_buffer(body)
+    try:
+        if content_type in PARQUET_TYPES:
+            import pyarrow.parquet as pq
+
+            return pq.read_table(pa.BufferReader(buffer))
+        return pa.ipc.open_stream(buffer).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise DecodeError(
+            [field_error([], f"Corps Arrow/Parquet illisible : {e}", "arrow_invalid")]
+        )
+
+
+def _column_array(table, name):
+    column = table.column(name)
+    return column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+
+
+# Table -> matrice encodée du moteur compilé : numériques lus sans copie quand
+# le type le permet, catégories traduites une fois par valeur distincte du
+# dictionnaire (pas par ligne)
+def encode_table(engine, table):
+    pa = _pyarrow()
+    import pyarrow.compute as pc
+
+    names = set(table.column_names)
+    errors = [
+        field_error([name], "Colonne requise", "missing")
+        for name in engine.feature_names
+        if name not in names
+    ]
+    if errors:
+        raise DecodeError(errors)
+
+    n_rows = table.num_rows
+    X = np.zeros((n_rows, engine.n_columns), dtype=np.float32)
+    ints = set(INT_FEATURES)
+
+    for i, name in enumerate(engine.num_features):
+        array = _column_array(table, name)
+        if not (pa.types.is_integer(array.type) or pa.types.is_floating(array.type)):
+            errors.append(
+                field_error(
+                    [name], f"Type numérique attendu, reçu {array.type}", "number_type"
+                )
+            )
+            continue
+        if array.null_count:
+            errors.append(field_error([name], "Valeurs nulles", "missing"))
+            continue
+        values = array.to_numpy(zero_copy_only=False)
+        bad = np.zeros(n_rows, dtype=bool)
+        low, high = NUM_BOUNDS.get(name, (None, None))
+        if name in ints and values.dtype.kind == "f":
+            bad |= values != np.floor(values)
+        if low is not None:
+            bad |= values < low
+        if high is not None:
+            bad |= values > high
+        for row in np.flatnonzero(bad)[:MAX_ERRORS].tolist():
+            errors.append(
+                field_error(
+                    [name, row],
+                    "Valeur hors bornes",
+                    "out_of_range",
+                    values[row].item(),
+                    min=low,
+                    max=high,
+                )
+            )
+        mean, scale = engine.num_mean[i], engine.num_scale[i]
+        X[:, engine.num_columns[i]] = (values - mean) / scale
+
+    rows = np.arange(n_rows)
+    for name, lookup, categories in zip(
+        engine.cat_features, engine.cat_lookup, engine.cat_categories
+    ):
+        array = _column_array(table, name)
+        if not pa.types.is_dictionary(array.type):
+            if not (
+                pa.types.is_string(array.type) or pa.types.is_large_string(array.type)
+            ):
+                errors.append(
+                    field_error(
+                        [name], f"Type texte attendu, reçu {array.type}", "string_type"
+                    )
+                )
+                continue
+            array = pc.dictionary_encode(array)
+        if array.null_count:
+            errors.append(field_error([name], "Valeurs nulles", "missing"))
+            continue
+        dictionary = array.dictionary.to_pylist()
+        mapping = np.array([lookup.get(v, -1) for v in dictionary], dtype=np.intp)
+        cols = mapping[array.indices.to_numpy(zero_copy_only=False)]
+        unknown = np.flatnonzero(cols < 0)
+        if len(unknown):
+            for row in unknown[:MAX_ERRORS].tolist():
+                errors.append(
+                    field_error(
+                        [name, row],
+                        f"Catégorie inconnue pour {name}",
+                        "unknown_category",
+                        dictionary[array.indices[row].as_py()],
+                        expected=categories,
+                    )
+                )
+            continue
+        X[rows, cols] = 1.0
+        if len(errors) >= MAX_ERRORS:
+            break
+
+    if errors:
+        raise DecodeError(errors[:MAX_ERRORS])
+    return engine._finalize(X)
+
+
+def empty_stream(schema):
+    pa = _pyarrow()
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema):
+        pass
+    return sink.getvalue().to_pybytes()
+
+
+# Probabilités -> flux Arrow IPC d'une colonne float32 "probability"
+def write_probabilities(probs, model_version):
+    pa = _pyarrow()
+    batch = pa.record_batch(
+        [pa.array(np.asarray(probs, dtype=np.float32))],
+        schema=pa.schema(
+            [pa.field("probability", pa.float32(), nullable=False)],
+            metadata={"model_version": model_version},
+        ),
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
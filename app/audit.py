@@ -0,0 +1,350 @@
+import gzip
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+
+import orjson
+
+logger = logging.getLogger("churn_api")
+
+POLICIES = ("drop", "sample", "block")
+FORMATS = ("jsonl", "parquet")
+
+
+# Fichier d'audit en cours : écrit sous un nom .part puis renommé à la
+# rotation, seuls des fichiers complets portent l'extension finale
+class _JsonlWriter:
+    extension = ".jsonl.gz"
+
+    def __init__(self, path):
+        self.path = path
+        self._file = gzip.open(path, "wb", compresslevel=6)
+
+    def write(self, records):
+        data = b"".join(
+            orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE) for record in records
+        )
+        self._file.write(data)
+        # Bloc gzip complet à chaque lot : lisible jusqu'au dernier lot écrit
+        self._file.flush()
+        return len(data)
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    extension = ".parquet"
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+
+    # Schéma fixe (et non déduit du premier lot, où une colonne peut être
+    # entièrement nulle) : entrées au schéma CustomerFeatures
+    @staticmethod
+    def schema():
+        import pyarrow as pa
+
+        from app.arrow_io import arrow_schema
+
+        return pa.schema(
+            [
+                ("timestamp", pa.float64()),
+                ("route", pa.string()),
+                ("model_version", pa.string()),
+                ("prediction_id", pa.string()),
+                ("inputs", pa.struct(list(arrow_schema()))),
+                ("probability", pa.float64()),
+                ("threshold", pa.float64()),
+                ("churn", pa.bool_()),
+                ("latency_ms", pa.float64()),
+            ]
+        )
+
+    def write(self, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(
+                self.path, self.schema(), compression="zstd"
+            )
+        table = pa.Table.from_pylist(records, schema=self._writer.schema)
+        self._writer.write_table(table)  # un row group par lot
+        return table.nbytes
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+# Journal d'audit des décisions de churn : le handler dépose une entrée (une
+# requête, une ou plusieurs lignes) dans un tampon circulaire borné en lignes,
+# un thread de fond la met en forme et l'écrit par lots dans des fichiers
+# JSONL gzip (ou Parquet) tournants. Tampon plein : politique "drop" (entrée
+# perdue), "sample" (au-delà de la moitié du tampon, seule une fraction
+# sample_rate des entrées est gardée) ou "block" (le handler attend au plus
+# block_timeout_s qu'une place se libère).
+class AuditLog:
+    def __init__(
+        self,
+        directory,
+        capacity=65536,
+        policy="drop",
+        sample_rate=0.1,
+        block_timeout_s=1.0,
+        flush_interval_s=1.0,
+        max_batch=4096,
+        rotate_mb=64.0,
+        rotate_s=3600.0,
+        file_format="jsonl",
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Politique d'audit inconnue : {policy}")
+        if file_format not in FORMATS:
+            raise ValueError(f"Format d'audit inconnu : {file_format}")
+        self.directory = directory
+        self.capacity = capacity
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.block_timeout_s = block_timeout_s
+        self.flush_interval_s = flush_interval_s
+        self.max_batch = max_batch
+        self.rotate_bytes = int(rotate_mb * 1024 * 1024)
+        self.rotate_s = rotate_s
+        self.writer_class = _ParquetWriter if file_format == "parquet" else _JsonlWriter
+
+        self._entries = deque()
+        self._size = 0  # lignes dans le tampon
+        self._waiting = 0  # appels de record en attente d'une place
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._not_empty = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+        self._writer = None
+        self._opened_at = 0.0
+        self._file_bytes = 0
+
+        self.accepted = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.blocked = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.files = 0
+        self.flush_seconds = 0.0
+        self.write_errors = 0
+
+    # --- Chemin de requête : O(1), la mise en forme est faite par le thread ---
+
+    # inputs : une ligne {feature: valeur}, une liste de lignes ou des colonnes
+    # {feature: [valeurs]} ; probabilities : float ou tableau. wait=False
+    # (handlers async) : tampon plein en mode block, renvoie None sans attendre
+    # ni compter, l'appelant réessaie hors de la boucle d'événements
+    def record(
+        self,
+        route,
+        model_version,
+        inputs,
+        probabilities,
+        threshold,
+        latency_s=None,
+        prediction_id=None,
+        wait=True,
+    ):
+        n = 1 if isinstance(probabilities, float) else len(probabilities)
+        entry = (
+            time.time(),
+            route,
+            model_version,
+            inputs,
+            probabilities,
+            threshold,
+            latency_s,
+            prediction_id,
+        )
+        with self._lock:
+            if self._size + n > self.capacity:
+                if self.policy != "block" or n > self.capacity:
+                    self.dropped += n
+                    return False
+                if not wait:
+                    return None
+                self.blocked += 1
+                # Le thread d'écriture vide le tampon sans attendre max_batch
+                self._waiting += 1
+                self._not_empty.notify()
+                try:
+                    room = self._not_full.wait_for(
+                        lambda: self._size + n <= self.capacity,
+                        timeout=self.block_timeout_s,
+                    )
+                finally:
+                    self._waiting -= 1
+                if not room:
+                    self.dropped += n
+                    return False
+            elif (
+                self.policy == "sample"
+                and self._size * 2 >= self.capacity
+                and random.random() >= self.sample_rate
+            ):
+                self.sampled_out += n
+                return False
+            self._entries.append(entry)
+            self._size += n
+            self.accepted += n
+            if self._size >= self.max_batch:
+                self._not_empty.notify()
+        return True
+
+    # --- Thread d'écriture ---
+
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._not_empty.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+        self._flush()
+        self._rotate()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                self._not_empty.wait_for(
+                    lambda: self._size >= self.max_batch
+                    or self._waiting
+                    or self._stop.is_set(),
+                    timeout=self.flush_interval_s,
+                )
+            self._flush()
+            if self._writer is not None and (
+                self._file_bytes >= self.rotate_bytes
+                or time.time() - self._opened_at >= self.rotate_s
+            ):
+                self._rotate()
+
+    def _take(self):
+        entries, n = [], 0
+        with self._lock:
+            while self._entries and n < self.max_batch:
+                entry = self._entries.popleft()
+                entries.append(entry)
+                n += 1 if isinstance(entry[4], float) else len(entry[4])
+            self._size -= n
+            self._not_full.notify_all()
+        return entries
+
+    def _flush(self):
+        while True:
+            entries = self._take()
+            if not entries:
+                return
+            start = time.perf_counter()
+            records = [record for entry in entries for record in _expand(*entry)]
+            try:
+                if self._writer is None:
+                    self._open()
+                n_bytes = self._writer.write(records)
+            except Exception as e:
+                self.write_errors += 1
+                self.dropped += len(records)
+                logger.error(f"Audit : {len(records)} décisions non écrites ({e})")
+                continue
+            self._file_bytes += n_bytes
+            self.bytes_written += n_bytes
+            self.written += len(records)
+            self.flush_seconds += time.perf_counter() - start
+
+    def _open(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = f"audit-{stamp}-{socket.gethostname()}-{os.getpid()}-{self.files}"
+        path = os.path.join(self.directory, name + self.writer_class.extension)
+        self._writer = self.writer_class(path + ".part")
+        self._opened_at = time.time()
+        self._file_bytes = 0
+        self.files += 1
+
+    def _rotate(self):
+        writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        try:
+            writer.close()
+            os.replace(writer.path, writer.path[: -len(".part")])
+        except OSError as e:
+            self.write_errors += 1
+            logger.error(f"Audit : fichier {writer.path} non finalisé ({e})")
+
+    def stats(self):
+        with self._lock:
+            buffered = self._size
+        return {
+            "policy": self.policy,
+            "capacity": self.capacity,
+            "buffered": buffered,
+            "fill_ratio": round(buffered / self.capacity, 4),
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "blocked": self.blocked,
+            "written": self.written,
+            "bytes_written": self.bytes_written,
+            "files": self.files,
+            "write_errors": self.write_errors,
+            "flush_seconds": round(self.flush_seconds, 6),
+            "flush_records_per_s": (
+                round(self.written / self.flush_seconds, 1)
+                if self.flush_seconds
+                else None
+            ),
+        }
+
+
+# Une entrée du tampon -> une décision par ligne
+def _expand(
+    timestamp, route, model_version, inputs, probabilities, threshold, latency_s, pid
+):
+    if isinstance(probabilities, float):
+        rows, probabilities = [inputs], [probabilities]
+    else:
+        if isinstance(inputs, dict):  # forme colonnaire
+            names = list(inputs)
+            rows = [dict(zip(names, values)) for values in zip(*inputs.values())]
+        else:
+            rows = inputs
+        probabilities = [float(p) for p in probabilities]
+    # Un seuil par ligne avec une politique de seuil segmentée
+    thresholds = (
+        threshold if isinstance(threshold, list) else [threshold] * len(probabilities)
+    )
+    return [
+        {
+            "timestamp": timestamp,
+            "route": route,
+            "model_version": model_version,
+            "prediction_id": pid,
+            "inputs": row,
+            "probability": probability,
+            "threshold": threshold,
+            "churn": probability >= threshold,
+            "latency_ms": round(latency_s * 1000, 3) if latency_s is not None else None,
+        }
+        for row, probability, threshold in zip(rows, probabilities, thresholds)
+    ]
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+
+from app.telemetry import Histogram
+
+logger = logging.getLogger("churn_api")
+
+
+def _power_of_two_buckets(max_value):
+    buckets, b = [], 1
+    while b < max_value:
+        buckets.append(b)
+        b *= 2
+    buckets.append(max_value)
+    return buckets
+
+
+# Regroupe les appels concurrents à /predict en un seul predict_proba
+class MicroBatcher:
+    def __init__(
+        self,
+        score_fn,
+        max_batch_size=64,
+        max_wait_ms=5.0,
+        max_in_flight=1,
+        result=float,
+    ):
+        # (liste de dicts, contexte) -> probabilités ; une fonction async (ex.
+        # pool de processus) est attendue directement, sinon exécutée en thread
+        self.score_fn = score_fn
+        # Conversion du résultat de chaque ligne rendu à son appelant
+        self.result = result
+        self.is_async = asyncio.iscoroutinefunction(score_fn)
+        # Lots scorés en parallèle (> 1 seulement utile avec un pool de processus)
+        self.max_in_flight = max_in_flight
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = Histogram(_power_of_two_buckets(max_batch_size))
+        self.queue_depths = Histogram(_power_of_two_buckets(max(1024, max_batch_size)))
+        self._queue = None
+        self._task = None
+        self._slots = None
+        self._pending = set()
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(
+            f"Micro-batching actif (max {self.max_batch_size} lignes / "
+            f"{self.max_wait * 1000:.1f} ms)"
+        )
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # Le contexte (ex. la version du modèle) est transmis à score_fn : les
+    # lignes d'un même lot sont scorées par groupe de contexte
+    async def submit(self, row, context=None):
+        future = asyncio.get_running_loop().create_future()
+        self.queue_depths.observe(self._queue.qsize())
+        self._queue.put_nowait((row, context, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # On vide d'abord ce qui est déjà en file, sans attendre
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Les appelants déjà annulés (client déconnecté) sont ignorés
+            groups = {}
+            for row, context, fut in batch:
+                if not fut.done():
+                    groups.setdefault(context, []).append((row, fut))
+            if not groups:
+                continue
+            self.batch_sizes.observe(sum(len(group) for group in groups.values()))
+            for context, group in groups.items():
+                await self._slots.acquire()
+                task = asyncio.get_running_loop().create_task(
+                    self._score(group, context)
+                )
+                self._pending.add(task)
+                task.add_done_callback(self._pending.discard)
+            if self.max_in_flight == 1:
+                # Comportement séquentiel : le lot suivant attend celui-ci
+                await asyncio.gather(*self._pending)
+
+    async def _score(self, group, context):
+        rows = [row for row, _ in group]
+        try:
+            if self.is_async:
+                probs = await self.score_fn(rows, context)
+            else:
+                probs = await asyncio.get_running_loop().run_in_executor(
+                    None, self.score_fn, rows, context
+                )
+        except Exception as e:
+            for _, fut in group:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        for (_, fut), prob in zip(group, probs):
+            if not fut.done():
+                fut.set_result(self.result(prob))
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size_histogram": self.batch_sizes.to_dict(),
+            "queue_depth_histogram": self.queue_depths.to_dict(),
+        }
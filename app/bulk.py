@@ -0,0 +1,309 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app.schemas import NUM_FEATURES
+
+
+# Scorer colonnaire {feature: valeurs} -> probabilités, moteur compilé si possible
+def make_scorer(model):
+    from app.engine import CompiledEngine
+
+    try:
+        engine = CompiledEngine.from_pipeline(model)
+        return lambda columns: engine.predict_proba(engine.encode_columns(columns))
+    except ValueError:
+        return lambda columns: model.predict_proba(pd.DataFrame(columns))[:, 1]
+
+
+def is_parquet(path):
+    return os.path.splitext(str(path))[1].lower() in (".parquet", ".pq")
+
+
+# Colonnes du fichier (en-tête CSV ou schéma Parquet), sans lire les lignes
+def file_columns(path):
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+# ValueError si une feature attendue manque au fichier
+def check_columns(path, feature_names):
+    columns = set(file_columns(path))
+    missing = [name for name in feature_names if name not in columns]
+    if missing:
+        raise ValueError(f"colonnes manquantes : {', '.join(missing)}")
+
+
+# Lecture par morceaux de taille fixe (CSV ou Parquet)
+def iter_chunks(path, chunksize):
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def feature_columns(df, feature_names):
+    columns = {}
+    for name in feature_names:
+        values = df[name]
+        if name in NUM_FEATURES:
+            # ex. TotalCharges = " " dans le CSV Kaggle -> NaN (valeur manquante)
+            values = pd.to_numeric(values, errors="coerce")
+        columns[name] = values.to_numpy()
+    return columns
+
+
+# Scoring d'un morceau : identifiant éventuel + probabilité + décision
+def score_frame(df, scorer, feature_names, threshold=0.40, id_column=None):
+    probs = np.asarray(scorer(feature_columns(df, feature_names)), dtype=np.float64)
+    out = pd.DataFrame({"probability": np.round(probs, 6), "churn": probs >= threshold})
+    if id_column is not None and id_column in df.columns:
+        out.insert(0, id_column, df[id_column].to_numpy())
+    return out
+
+
+class ChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.parquet = is_parquet(path)
+        self._writer = None
+        self._first = True
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(
+                self.path,
+                mode="w" if self._first else "a",
+                header=self._first,
+                index=False,
+            )
+        self._first = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+# État des processus du pool (chaque worker charge le modèle une fois)
+_worker = {}
+
+
+def _init_worker(model_path, feature_names, threshold, id_column):
+    import joblib
+
+    _worker.update(
+        scorer=make_scorer(joblib.load(model_path)),
+        feature_names=feature_names,
+        threshold=threshold,
+        id_column=id_column,
+    )
+
+
+def _score_in_worker(df):
+    return score_frame(
+        df,
+        _worker["scorer"],
+        _worker["feature_names"],
+        _worker["threshold"],
+        _worker["id_column"],
+    )
+
+
+def score_file(
+    input_path,
+    output_path,
+    model_path,
+    feature_names,
+    chunksize=100_000,
+    workers=1,
+    threshold=0.40,
+    id_column="customerID",
+    progress=None,
+):
+    start = time.perf_counter()
+    n_rows = 0
+    writer = ChunkWriter(output_path)
+
+    def emit(out):
+        nonlocal n_rows
+        writer.write(out)
+        n_rows += len(out)
+        if progress:
+            progress(n_rows, time.perf_counter() - start)
+
+    try:
+        if workers <= 1:
+            _init_worker(model_path, feature_names, threshold, id_column)
+            for chunk in iter_chunks(input_path, chunksize):
+                emit(_score_in_worker(chunk))
+        else:
+            with ProcessPoolExecutor(
+                workers,
+                initializer=_init_worker,
+                initargs=(model_path, feature_names, threshold, id_column),
+            ) as pool:
+                # Au plus 2 morceaux en vol par worker : mémoire constante
+                pending = deque()
+                for chunk in iter_chunks(input_path, chunksize):
+                    pending.append(pool.submit(_score_in_worker, chunk))
+                    if len(pending) >= 2 * workers:
+                        emit(pending.popleft().result())
+                while pending:
+                    emit(pending.popleft().result())
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": n_rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(n_rows / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+# Indices des k plus fortes probabilités (ordre quelconque) : argpartition en
+# O(n), ex aequo au k-ième score départagés par position dans le fichier pour
+# un résultat indépendant du découpage en morceaux et du nombre de workers
+def _select(probs, positions, k):
+    if len(probs) <= k:
+        return np.arange(len(probs))
+    kth = np.partition(probs, len(probs) - k)[len(probs) - k]
+    above = np.flatnonzero(probs > kth)
+    tied = np.flatnonzero(probs == kth)
+    tied = tied[np.argsort(positions[tied], kind="stable")[: k - len(above)]]
+    return np.concatenate([above, tied])
+
+
+# Top-K d'une population scorée par morceaux : seules les k meilleures lignes
+# (probabilité, position, ligne d'entrée) sont gardées, mémoire en O(k + morceau)
+class TopK:
+    def __init__(self, k):
+        self.k = k
+        self.probs = np.empty(0, dtype=np.float64)
+        self.positions = np.empty(0, dtype=np.int64)
+        self.rows = None
+
+    def push(self, probs, positions, rows):
+        keep = _select(probs, positions, self.k)
+        probs, positions, rows = probs[keep], positions[keep], rows.iloc[keep]
+        if self.rows is not None:
+            probs = np.concatenate([self.probs, probs])
+            positions = np.concatenate([self.positions, positions])
+            rows = pd.concat([self.rows, rows])
+            keep = _select(probs, positions, self.k)
+            probs, positions, rows = probs[keep], positions[keep], rows.iloc[keep]
+        self.probs, self.positions, self.rows = probs, positions, rows
+
+    # Fusion du top-K d'un autre morceau ou d'un autre worker
+    def merge(self, other):
+        if other.rows is not None:
+            self.push(other.probs, other.positions, other.rows)
+
+    # Classement final : probabilité décroissante, puis position dans le fichier
+    def frame(self):
+        if self.rows is None:
+            return pd.DataFrame(columns=["rank", "row", "probability"])
+        order = np.lexsort((self.positions, -self.probs))
+        out = self.rows.iloc[order].reset_index(drop=True)
+        out.insert(0, "probability", np.round(self.probs[order], 6))
+        out.insert(0, "row", self.positions[order])
+        out.insert(0, "rank", np.arange(1, len(out) + 1))
+        return out
+
+
+def rank_frame(df, scorer, feature_names, k, offset, id_column=None):
+    probs = np.asarray(scorer(feature_columns(df, feature_names)), dtype=np.float64)
+    kept = [id_column] if id_column is not None and id_column in df.columns else []
+    top = TopK(k)
+    top.push(probs, offset + np.arange(len(df)), df[kept + list(feature_names)])
+    return top
+
+
+def _rank_in_worker(df, k, offset):
+    return rank_frame(
+        df, _worker["scorer"], _worker["feature_names"], k, offset, _worker["id_column"]
+    )
+
+
+# Classement des k clients les plus à risque d'un fichier : chaque morceau est
+# réduit à son top-K (dans le worker qui le score), puis fusionné au top-K global
+def rank_file(
+    input_path,
+    model_path,
+    feature_names,
+    k,
+    chunksize=100_000,
+    workers=1,
+    id_column="customerID",
+    scorer=None,
+    progress=None,
+):
+    start = time.perf_counter()
+    top = TopK(k)
+    n_rows = 0
+
+    def merge(chunk_top, size):
+        nonlocal n_rows
+        top.merge(chunk_top)
+        n_rows += size
+        if progress:
+            progress(n_rows, time.perf_counter() - start)
+
+    if scorer is not None or workers <= 1:
+        if scorer is None:
+            _init_worker(model_path, feature_names, None, id_column)
+            scorer = _worker["scorer"]
+        for chunk in iter_chunks(input_path, chunksize):
+            merge(
+                rank_frame(chunk, scorer, feature_names, k, n_rows, id_column),
+                len(chunk),
+            )
+    else:
+        with ProcessPoolExecutor(
+            workers,
+            initializer=_init_worker,
+            initargs=(model_path, feature_names, None, id_column),
+        ) as pool:
+            # Au plus 2 morceaux en vol par worker : mémoire constante
+            pending, offset = deque(), 0
+            for chunk in iter_chunks(input_path, chunksize):
+                pending.append(
+                    (pool.submit(_rank_in_worker, chunk, k, offset), len(chunk))
+                )
+                offset += len(chunk)
+                if len(pending) >= 2 * workers:
+                    future, size = pending.popleft()
+                    merge(future.result(), size)
+            while pending:
+                future, size = pending.popleft()
+                merge(future.result(), size)
+    elapsed = time.perf_counter() - start
+    return top.frame(), {
+        "rows": n_rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(n_rows / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+# Explications (app.explain.Explainer) des lignes d'un classement
+def explain_frame(explainer, df, feature_names, threshold=0.40, top_k=None):
+    X = explainer.engine.encode_columns(feature_columns(df, feature_names))
+    probs, base, contributions = explainer.explain(X)
+    return explainer.format(probs, base, contributions, threshold, top_k)
@@ -0,0 +1,124 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+
+# Surcoût approximatif d'une entrée (clé, tuple, noeud de l'OrderedDict)
+_ENTRY_OVERHEAD = 200
+
+
+def _sizeof(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_sizeof(v) for v in value)
+    return size
+
+
+# Cache LRU + TTL des résultats de prédiction, borné en nombre d'entrées et
+# en mémoire. Les clés incluent l'identité du modèle chargé (version et
+# empreinte de ses fichiers) : un modèle réentraîné sous le même nom de version
+# ne relit jamais les probabilités de l'ancien
+class PredictionCache:
+    def __init__(
+        self,
+        feature_names,
+        max_entries=100_000,
+        max_bytes=64 * 1024 * 1024,
+        ttl_s=3600.0,
+    ):
+        self.feature_names = list(feature_names)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()  # clé -> (valeur, expiration, taille)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # model : identité du modèle (LoadedModel.cache_id) ; kind distingue les
+    # résultats d'une même ligne (probabilité seule, explication) qui partagent
+    # le cache
+    def key(self, row, model=None, kind=None):
+        return self._digest((row[name] for name in self.feature_names), model, kind)
+
+    def keys(self, columns, model=None, kind=None):
+        columns = [columns[name] for name in self.feature_names]
+        return [self._digest(values, model, kind) for values in zip(*columns)]
+
+    def _digest(self, values, model, kind):
+        # Forme canonique : modèle, ordre fixe des champs, numériques en float
+        values = [model] + [
+            float(v) if isinstance(v, (int, float)) else v for v in values
+        ]
+        if kind is not None:
+            values.append(kind)
+        return hashlib.blake2b(orjson.dumps(values), digest_size=16).digest()
+
+    def _clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+            self.invalidations += 1
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if now >= expires_at:
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = _ENTRY_OVERHEAD + _sizeof(value)
+        expires_at = time.monotonic() + self.ttl_s
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,250 @@
+import operator
+
+import numpy as np
+import orjson
+
+from app.schemas import INT_FEATURES, NUM_BOUNDS
+
+# Nombre max d'erreurs renvoyées pour un même corps de requête
+MAX_ERRORS = 50
+
+# En dessous, une boucle Python sur les lignes coûte moins que le surcoût
+# fixe des opérations NumPy par colonne
+VECTORIZE_MIN_ROWS = 64
+
+
+# Erreurs au format de FastAPI / Pydantic v2 : {"loc", "msg", "type", "input"}
+class DecodeError(ValueError):
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} erreur(s) de validation")
+        self.errors = errors
+
+
+def field_error(loc, msg, type_, value=None, **ctx):
+    error = {"loc": ["body", *loc], "msg": msg, "type": type_, "input": value}
+    if ctx:
+        error["ctx"] = ctx
+    return error
+
+
+# Décodage rapide : corps JSON lu par orjson, validé contre les vocabulaires
+# réellement appris par le OneHotEncoder et les bornes des numériques, puis
+# encodé directement dans la matrice float32 du moteur compilé (sans objet
+# Pydantic ni dict intermédiaire par ligne)
+class FastDecoder:
+    def __init__(self, engine):
+        self.engine = engine
+        self.n_columns = engine.n_columns
+        self.feature_names = engine.feature_names
+        ints = set(INT_FEATURES)
+        self._num_checks = [
+            (name, name in ints, *NUM_BOUNDS.get(name, (None, None)))
+            for name in engine.num_features
+        ]
+        self._num_items = [
+            (name, col, mean, scale, is_int, low, high)
+            for (name, is_int, low, high), col, mean, scale in zip(
+                self._num_checks,
+                engine.num_columns.tolist(),
+                engine.num_mean.tolist(),
+                engine.num_scale.tolist(),
+            )
+        ]
+        self._num_scaling = [
+            (col, mean, scale) for _, col, mean, scale, *_ in self._num_items
+        ]
+        self._getter = operator.itemgetter(*self.feature_names)
+        self._cat_items = list(
+            zip(engine.cat_features, engine.cat_lookup, engine.cat_categories)
+        )
+
+    def loads(self, body):
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError as e:
+            raise DecodeError([field_error([], f"JSON invalide : {e}", "json_invalid")])
+
+    # --- Une ligne {feature: valeur} ---
+
+    def _check_number(self, loc, value, is_int, low, high, errors):
+        kind = type(value)
+        if kind is not int and kind is not float:  # bool exclu
+            errors.append(
+                field_error(loc, "Nombre attendu", "number_type", value)
+                if value is not None
+                else field_error(loc, "Champ requis", "missing")
+            )
+            return False
+        if is_int and kind is float and not value.is_integer():
+            errors.append(field_error(loc, "Entier attendu", "int_from_float", value))
+            return False
+        if (low is not None and value < low) or (high is not None and value > high):
+            errors.append(
+                field_error(
+                    loc, "Valeur hors bornes", "out_of_range", value, min=low, max=high
+                )
+            )
+            return False
+        return True
+
+    # Valeurs numériques brutes et colonnes one-hot d'une ligne, avec le
+    # diagnostic de chaque champ invalide
+    def _read_row(self, row, index, errors):
+        if type(row) is not dict:
+            errors.append(field_error(index, "Objet attendu", "dict_type", row))
+            return None, None
+        nums = []
+        for name, is_int, low, high in self._num_checks:
+            value = row.get(name)
+            # Chemin rapide : nombre du bon type dans les bornes, sinon
+            # diagnostic détaillé (un entier 3.0 est accepté par _check_number)
+            kind = type(value)
+            if (
+                (kind is int or (kind is float and not is_int))
+                and (low is None or value >= low)
+                and (high is None or value <= high)
+            ) or self._check_number(index + [name], value, is_int, low, high, errors):
+                nums.append(value)
+        cols = []
+        for name, lookup, categories in self._cat_items:
+            value = row.get(name)
+            col = lookup.get(value) if type(value) is str else None
+            if col is not None:
+                cols.append(col)
+            elif value is None:
+                errors.append(field_error(index + [name], "Champ requis", "missing"))
+            else:
+                errors.append(
+                    field_error(
+                        index + [name],
+                        f"Catégorie inconnue pour {name}",
+                        "unknown_category",
+                        value,
+                        expected=categories,
+                    )
+                )
+        return nums, cols
+
+    def _fill(self, x, nums, cols):
+        for value, (col, mean, scale) in zip(nums, self._num_scaling):
+            x[col] = (value - mean) / scale
+        for col in cols:
+            x[col] = 1.0
+
+    def encode_row(self, row):
+        errors = []
+        nums, cols = self._read_row(row, [], errors)
+        if errors:
+            raise DecodeError(errors)
+        X = np.zeros((1, self.n_columns), dtype=np.float32)
+        self._fill(X[0], nums, cols)
+        return self.engine._finalize(X)
+
+    def encode_rows(self, rows):
+        if type(rows) is not list:
+            raise DecodeError([field_error([], "Liste attendue", "list_type", None)])
+        if len(rows) >= VECTORIZE_MIN_ROWS:
+            # Transposé en colonnes par itemgetter (boucle C) puis validé et
+            # encodé de façon vectorisée ; en cas d'erreur, les lignes sont
+            # reparcourues une à une pour localiser chaque champ invalide
+            try:
+                values = list(map(self._getter, rows))
+                columns = dict(zip(self.feature_names, map(list, zip(*values))))
+                return self.encode_columns(columns)
+            except (KeyError, TypeError, DecodeError):
+                pass
+        X = np.zeros((len(rows), self.n_columns), dtype=np.float32)
+        errors = []
+        for i, (x, row) in enumerate(zip(X, rows)):
+            nums, cols = self._read_row(row, [i], errors)
+            if errors:
+                if len(errors) >= MAX_ERRORS:
+                    break
+                continue
+            self._fill(x, nums, cols)
+        if errors:
+            raise DecodeError(errors[:MAX_ERRORS])
+        return self.engine._finalize(X)
+
+    # --- Forme colonnaire {feature: [valeurs]} : validation vectorisée ---
+
+    def encode_columns(self, columns):
+        if type(columns) is not dict:
+            raise DecodeError([field_error([], "Objet attendu", "dict_type", None)])
+        errors = []
+        for name in self.feature_names:
+            if type(columns.get(name)) is not list:
+                errors.append(field_error([name], "Liste attendue", "list_type"))
+        if errors:
+            raise DecodeError(errors)
+        lengths = {len(columns[name]) for name in self.feature_names}
+        if len(lengths) > 1:
+            raise DecodeError(
+                [
+                    field_error(
+                        [],
+                        "Toutes les colonnes doivent avoir la même longueur.",
+                        "length_mismatch",
+                    )
+                ]
+            )
+        n_rows = lengths.pop()
+        X = np.zeros((n_rows, self.n_columns), dtype=np.float32)
+
+        for name, col, mean, scale, is_int, low, high in self._num_items:
+            values = columns[name]
+            # Type déduit par NumPy : chaînes, None ou booléens -> diagnostic
+            arr = np.array(values)
+            if arr.dtype.kind not in "iuf":
+                arr = None
+            else:
+                arr = arr.astype(np.float64, copy=False)
+                bad = np.zeros(n_rows, dtype=bool)
+                if is_int:
+                    bad |= arr != np.floor(arr)
+                if low is not None:
+                    bad |= arr < low
+                if high is not None:
+                    bad |= arr > high
+            if arr is None or bad.any():
+                # Diagnostic ligne par ligne, seulement en cas d'erreur
+                n_errors = len(errors)
+                for i, value in enumerate(values):
+                    self._check_number([name, i], value, is_int, low, high, errors)
+                    if len(errors) >= MAX_ERRORS:
+                        raise DecodeError(errors)
+                if len(errors) > n_errors:
+                    continue
+                # Valeurs valides que NumPy n'a pas typées (entier hors int64 :
+                # tableau d'objets) : encodées depuis les valeurs vérifiées
+                arr = np.array(values, dtype=np.float64)
+            X[:, col] = (arr - mean) / scale
+
+        rows = np.arange(n_rows)
+        for name, lookup, categories in self._cat_items:
+            values = columns[name]
+            cols = np.fromiter(
+                (lookup.get(v, -1) if type(v) is str else -1 for v in values),
+                dtype=np.intp,
+                count=n_rows,
+            )
+            known = cols >= 0
+            if not known.all():
+                for i in np.flatnonzero(~known)[: MAX_ERRORS - len(errors)].tolist():
+                    errors.append(
+                        field_error(
+                            [name, i],
+                            f"Catégorie inconnue pour {name}",
+                            "unknown_category",
+                            values[i],
+                            expected=categories,
+                        )
+                    )
+                if len(errors) >= MAX_ERRORS:
+                    raise DecodeError(errors)
+                continue
+            X[rows, cols] = 1.0
+
+        if errors:
+            raise DecodeError(errors)
+        return self.engine._finalize(X)
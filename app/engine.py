@@ -0,0 +1,283 @@
+import struct
+import zipfile
+
+import numpy as np
+
+
+# Moteur d'inférence sans pandas : le ColumnTransformer du pipeline est
+# "compilé" une fois en tables NumPy, puis les features sont encodées
+# directement en vecteur float32 pour Booster.inplace_predict.
+class CompiledEngine:
+    def __init__(
+        self,
+        booster,
+        n_columns,
+        num_features,
+        num_columns,
+        num_mean,
+        num_scale,
+        cat_features,
+        cat_categories,
+        cat_offsets,
+        handle_unknown="ignore",
+        sparse=False,
+        missing=np.nan,
+        iteration_range=(0, 0),
+    ):
+        self.booster = booster
+        self.n_columns = n_columns
+        self.num_features = list(num_features)
+        self.num_columns = np.asarray(num_columns, dtype=np.intp)
+        self.num_mean = np.asarray(num_mean, dtype=np.float64)
+        self.num_scale = np.asarray(num_scale, dtype=np.float64)
+        self.cat_features = list(cat_features)
+        self.cat_categories = [list(c) for c in cat_categories]
+        self.cat_offsets = list(cat_offsets)
+        self.handle_unknown = handle_unknown
+        self.sparse = sparse
+        self.missing = missing
+        self.iteration_range = iteration_range
+        self.trees = None  # FlatEnsemble, voir compile_trees
+        self.trees_max_rows = 0
+        self.feature_names = self.num_features + self.cat_features
+
+        # Tables catégorie -> index de colonne, une par feature catégorielle
+        self.cat_lookup = [
+            {cat: offset + j for j, cat in enumerate(categories)}
+            for categories, offset in zip(self.cat_categories, self.cat_offsets)
+        ]
+        # Feature d'origine de chaque colonne encodée (pour agréger par champ)
+        self.column_feature = np.empty(n_columns, dtype=np.intp)
+        self.column_feature[self.num_columns] = np.arange(len(self.num_features))
+        for i, (categories, offset) in enumerate(
+            zip(self.cat_categories, self.cat_offsets)
+        ):
+            self.column_feature[offset : offset + len(categories)] = (
+                len(self.num_features) + i
+            )
+        # Itérables précalculés pour la boucle chaude de encode_row
+        self._num_items = list(
+            zip(
+                self.num_features,
+                self.num_columns.tolist(),
+                self.num_mean.tolist(),
+                self.num_scale.tolist(),
+            )
+        )
+        self._cat_items = list(zip(self.cat_features, self.cat_lookup))
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        from sklearn.compose import ColumnTransformer
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+        preprocessor = pipeline.named_steps["preprocessor"]
+        classifier = pipeline.named_steps["classifier"]
+        if not isinstance(preprocessor, ColumnTransformer):
+            raise ValueError("Préprocesseur non supporté (ColumnTransformer attendu)")
+
+        num_features, num_columns, num_mean, num_scale = [], [], [], []
+        cat_features, cat_categories, cat_offsets = [], [], []
+        handle_unknown = "ignore"
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == "drop" or name == "remainder":
+                if transformer != "drop":
+                    raise ValueError("remainder='passthrough' non supporté")
+                continue
+            start = preprocessor.output_indices_[name].start
+            if isinstance(transformer, StandardScaler):
+                n = len(columns)
+                mean = transformer.mean_ if transformer.with_mean else np.zeros(n)
+                scale = transformer.scale_ if transformer.with_std else np.ones(n)
+                num_features += list(columns)
+                num_columns += list(range(start, start + n))
+                num_mean += list(mean)
+                num_scale += list(scale)
+            elif isinstance(transformer, OneHotEncoder):
+                if transformer.drop is not None:
+                    raise ValueError("OneHotEncoder(drop=...) non supporté")
+                handle_unknown = transformer.handle_unknown
+                offset = start
+                for column, categories in zip(columns, transformer.categories_):
+                    cat_features.append(column)
+                    cat_categories.append(categories.tolist())
+                    cat_offsets.append(offset)
+                    offset += len(categories)
+            else:
+                raise ValueError(f"Transformer non supporté : {transformer!r}")
+
+        try:
+            iteration_range = (0, classifier.best_iteration + 1)
+        except AttributeError:
+            iteration_range = (0, 0)
+
+        return cls(
+            booster=classifier.get_booster(),
+            n_columns=max(s.stop for s in preprocessor.output_indices_.values()),
+            num_features=num_features,
+            num_columns=num_columns,
+            num_mean=num_mean,
+            num_scale=num_scale,
+            cat_features=cat_features,
+            cat_categories=cat_categories,
+            cat_offsets=cat_offsets,
+            handle_unknown=handle_unknown,
+            sparse=bool(preprocessor.sparse_output_),
+            missing=classifier.missing,
+            iteration_range=iteration_range,
+        )
+
+    # --- Artefact binaire (booster UBJSON + tables NumPy), chargeable sans sklearn ---
+
+    def save(self, booster_path, preprocessing_path):
+        if not all(isinstance(v, str) for c in self.cat_categories for v in c):
+            raise ValueError("Seules les catégories textuelles sont exportables")
+        self.booster.save_model(booster_path)
+        sizes = [len(c) for c in self.cat_categories]
+        np.savez(  # non compressé : les tableaux restent mappables en mémoire
+            preprocessing_path,
+            n_columns=np.array(self.n_columns),
+            num_features=np.array(self.num_features, dtype=str),
+            num_columns=self.num_columns,
+            num_mean=self.num_mean,
+            num_scale=self.num_scale,
+            cat_features=np.array(self.cat_features, dtype=str),
+            cat_values=np.array(
+                [str(v) for c in self.cat_categories for v in c], dtype=str
+            ),
+            cat_sizes=np.array(sizes, dtype=np.intp),
+            cat_offsets=np.array(self.cat_offsets, dtype=np.intp),
+            handle_unknown=np.array(self.handle_unknown),
+            sparse=np.array(self.sparse),
+            missing=np.array(self.missing, dtype=np.float64),
+            iteration_range=np.array(self.iteration_range, dtype=np.intp),
+        )
+
+    @classmethod
+    def load(cls, booster_path, preprocessing_path):
+        import xgboost
+
+        booster = xgboost.Booster(model_file=booster_path)
+        a = load_npz_mmap(preprocessing_path)
+        bounds = np.concatenate([[0], np.cumsum(a["cat_sizes"])])
+        values = a["cat_values"].tolist()
+        return cls(
+            booster=booster,
+            n_columns=int(a["n_columns"]),
+            num_features=a["num_features"].tolist(),
+            num_columns=a["num_columns"],
+            num_mean=a["num_mean"],
+            num_scale=a["num_scale"],
+            cat_features=a["cat_features"].tolist(),
+            cat_categories=[
+                values[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])
+            ],
+            cat_offsets=a["cat_offsets"].tolist(),
+            handle_unknown=str(a["handle_unknown"]),
+            sparse=bool(a["sparse"]),
+            missing=float(a["missing"]),
+            iteration_range=tuple(int(i) for i in a["iteration_range"]),
+        )
+
+    def _unknown(self, feature, value):
+        raise ValueError(f"Catégorie inconnue pour {feature} : {value!r}")
+
+    def _fill_row(self, x, row):
+        for name, col, mean, scale in self._num_items:
+            x[col] = (row[name] - mean) / scale
+        for name, lookup in self._cat_items:
+            col = lookup.get(row[name])
+            if col is not None:
+                x[col] = 1.0
+            elif self.handle_unknown == "error":
+                self._unknown(name, row[name])
+
+    def encode_row(self, row):
+        x = np.zeros((1, self.n_columns), dtype=np.float32)
+        self._fill_row(x[0], row)
+        return self._finalize(x)
+
+    def encode_rows(self, rows):
+        X = np.zeros((len(rows), self.n_columns), dtype=np.float32)
+        for x, row in zip(X, rows):
+            self._fill_row(x, row)
+        return self._finalize(X)
+
+    def encode_columns(self, columns):
+        n_rows = len(columns[self.feature_names[0]])
+        X = np.zeros((n_rows, self.n_columns), dtype=np.float32)
+        for i, name in enumerate(self.num_features):
+            values = np.asarray(columns[name], dtype=np.float64)
+            X[:, self.num_columns[i]] = (values - self.num_mean[i]) / self.num_scale[i]
+        rows = np.arange(n_rows)
+        for name, lookup in self._cat_items:
+            col = np.fromiter(
+                (lookup.get(v, -1) for v in columns[name]), dtype=np.intp, count=n_rows
+            )
+            known = col >= 0
+            if self.handle_unknown == "error" and not known.all():
+                self._unknown(name, np.asarray(columns[name], dtype=object)[~known][0])
+            X[rows[known], col[known]] = 1.0
+        return self._finalize(X)
+
+    def _finalize(self, X):
+        # Sortie creuse du ColumnTransformer : XGBoost traite les zéros absents
+        # comme des valeurs manquantes, on reproduit ce comportement
+        if self.sparse:
+            X[X == 0] = np.nan
+        return X
+
+    # Évaluateur d'arbres aplati (app.trees) pour les lots d'au plus max_rows
+    # lignes, où le coût fixe d'un appel au booster domine
+    def compile_trees(self, backend, max_rows=None):
+        from app.trees import MAX_ROWS, FlatEnsemble
+
+        self.trees = FlatEnsemble.from_booster(
+            self.booster, self.iteration_range, self.missing, backend=backend
+        )
+        self.trees_max_rows = MAX_ROWS[backend] if max_rows is None else max_rows
+
+    def predict_proba(self, X):
+        if self.trees is not None and len(X) <= self.trees_max_rows:
+            return self.trees.predict_proba(X)
+        return self.booster.inplace_predict(
+            X, iteration_range=self.iteration_range, missing=self.missing
+        )
+
+    def predict_row(self, row):
+        return float(self.predict_proba(self.encode_row(row))[0])
+
+
+# np.load ignore mmap_mode pour un .npz : on localise chaque .npy stocké
+# (non compressé) dans l'archive et on le mappe directement, pour que
+# plusieurs workers partagent les mêmes pages
+def load_npz_mmap(path):
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename.removesuffix(".npy")
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[name] = np.load(archive.open(info))
+                continue
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"Tableau objet non mappable : {name}")
+            if 0 in shape:
+                arrays[name] = np.empty(shape, dtype=dtype)
+                continue
+            arrays[name] = np.memmap(
+                path,
+                dtype=dtype,
+                mode="r",
+                shape=shape,
+                order="F" if fortran else "C",
+                offset=f.tell(),
+            )
+    return arrays
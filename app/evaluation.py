@@ -0,0 +1,79 @@
+import numpy as np
+
+
+# Index trié des scores du jeu de test : les métriques à n'importe quel seuil
+# se lisent par recherche dichotomique dans les cumuls de vrais/faux positifs,
+# sans repasser sur tout le jeu (ni appeler classification_report).
+class ThresholdIndex:
+    def __init__(self, y_true, y_score):
+        y_true = np.asarray(y_true).astype(np.int64)
+        y_score = np.asarray(y_score)
+        order = np.argsort(y_score, kind="mergesort")[::-1]
+        self.scores_desc = y_score[order]
+        self.scores_asc = self.scores_desc[::-1]
+        # cum_tp[k] = nombre de positifs parmi les k meilleurs scores
+        self.cum_tp = np.concatenate([[0], np.cumsum(y_true[order])])
+        self.n = len(y_true)
+        self.n_pos = int(self.cum_tp[-1])
+        self.n_neg = self.n - self.n_pos
+        self.pr_auc = self._average_precision()
+
+    def _average_precision(self):
+        # Même calcul que sklearn.metrics.average_precision_score
+        if self.n_pos == 0:
+            return 0.0
+        distinct = np.where(np.diff(self.scores_desc))[0]
+        ends = np.r_[distinct, self.n - 1] + 1
+        tps = self.cum_tp[ends]
+        precision = tps / ends
+        recall = tps / self.n_pos
+        return float(np.sum(np.diff(np.r_[0.0, recall]) * precision))
+
+    def counts(self, thresholds):
+        # Nombre de prédits positifs (score >= seuil) et de vrais positifs
+        thresholds = np.asarray(thresholds, dtype=self.scores_asc.dtype)
+        k = self.n - np.searchsorted(self.scores_asc, thresholds, side="left")
+        return k, self.cum_tp[k]
+
+    def at(self, thresholds):
+        k, tp = self.counts(thresholds)
+        fp = k - tp
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(k > 0, tp / k, 0.0)
+            recall = tp / self.n_pos if self.n_pos else np.zeros_like(tp, dtype=float)
+            f1 = np.where(
+                precision + recall > 0,
+                2 * precision * recall / (precision + recall),
+                0.0,
+            )
+        accuracy = (tp + self.n_neg - fp) / self.n
+        return {
+            "precision": precision,
+            "recall": recall,
+            "f1_score": f1,
+            "accuracy": accuracy,
+        }
+
+    def metrics(self, threshold):
+        values = self.at([threshold])
+        return {name: float(v[0]) for name, v in values.items()}
+
+    def curve(self, thresholds, decimals=3):
+        values = {
+            name: np.round(v, decimals).tolist()
+            for name, v in self.at(thresholds).items()
+        }
+        k, tp = self.counts(thresholds)
+        k, tp = k.tolist(), tp.tolist()
+        return [
+            {
+                "threshold": float(t),
+                "precision": values["precision"][i],
+                "recall": values["recall"][i],
+                "f1_score": values["f1_score"][i],
+                "accuracy": values["accuracy"][i],
+                "predicted_positive": k[i],
+                "true_positive": tp[i],
+            }
+            for i, t in enumerate(thresholds)
+        ]
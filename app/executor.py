@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger("churn_api")
+
+# Modèles chargés par chaque processus du pool, depuis leurs dossiers
+_models = {}
+
+
+# Contexte forkserver : les workers sont forkés depuis un serveur lancé par
+# exec, sans les threads (registre, audit, threadpool) ni les verrous du
+# process principal ; un fork depuis le thread de surveillance pourrait
+# hériter d'un verrou tenu et bloquer le worker. Les modules lourds sont
+# importés une fois par le serveur.
+def _context():
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["app.registry", "app.monitoring"])
+    return context
+
+
+# sources : (version, dossier, empreinte) des versions publiées ; loader :
+# réglages de load_model du registre
+def _init_worker(nthread, sources, loader, monitor_factory):
+    from app.registry import load_model
+
+    _models.clear()
+    for version, directory, fingerprint in sources:
+        try:
+            loaded = load_model(version, directory, *loader)
+        except Exception as e:
+            logger.error(f"Worker : modèle {version} non chargé ({e})")
+            continue
+        # Fichiers remplacés depuis le chargement par le registre : la version
+        # n'est pas annoncée, le parent la score lui-même
+        if loaded.fingerprint != fingerprint:
+            continue
+        # Un thread XGBoost par worker (ou cpu_count // workers) : pas de
+        # sursouscription des cœurs quand tous les workers scorent en même temps
+        if loaded.engine is not None:
+            loaded.engine.booster.set_param({"nthread": nthread})
+        if loaded.model is not None:
+            loaded.model.steps[-1][1].set_params(n_jobs=nthread)
+        # Suivi de dérive propre au worker, qui écrit son dernier instantané
+        # à l'arrêt
+        if monitor_factory is not None:
+            loaded.monitor = monitor_factory(loaded)
+            if loaded.monitor is not None:
+                multiprocessing.util.Finalize(
+                    None, loaded.monitor.flush, exitpriority=10
+                )
+        _models[version] = loaded
+
+
+def _fingerprints():
+    return {version: loaded.fingerprint for version, loaded in _models.items()}
+
+
+def _score_rows(version, rows):
+    return _models[version].score_rows(rows)
+
+
+def _score_columns(version, columns, monitored=True):
+    return _models[version].score_columns(columns, monitored=monitored)
+
+
+# Pool de processus de scoring, découplé de la boucle d'événements : les
+# handlers async y envoient leurs lots sans bloquer la boucle ni se disputer
+# le GIL. Le pool est recréé à chaque publication de version ; l'ancien
+# termine les lots déjà soumis. Un pool cassé (worker tué) est recréé et le
+# lot renvoyé une fois.
+class InferenceExecutor:
+    def __init__(self, registry, workers=0, nthread=0, observe=None):
+        self.registry = registry
+        self.workers = workers or os.cpu_count()
+        self.nthread = nthread or max(1, os.cpu_count() // self.workers)
+        self.observe = observe
+        # (pool, {version: LoadedModel présent dans ses workers}), publié d'un
+        # bloc : une requête ne voit jamais un pool avec les versions d'un autre
+        self._state = None
+        self._spawn_lock = threading.Lock()
+
+    def start(self):
+        self._state = self._spawn()
+        logger.info(
+            f"Exécuteur d'inférence : {self.workers} processus x "
+            f"{self.nthread} thread(s) XGBoost"
+        )
+
+    def _spawn(self):
+        published = {v: self.registry.get(v) for v in self.registry.versions()}
+        registry = self.registry
+        pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=_context(),
+            initializer=_init_worker,
+            initargs=(
+                self.nthread,
+                [(v, m.directory, m.fingerprint) for v, m in published.items()],
+                (
+                    registry.inference_engine,
+                    registry.tree_backend,
+                    registry.tree_max_rows,
+                ),
+                registry.monitor_factory,
+            ),
+        )
+        # Démarre tous les workers maintenant plutôt qu'à la première requête ;
+        # seules les versions chargées à l'identique par chacun sont routées
+        # vers le pool
+        loaded = [pool.submit(_fingerprints) for _ in range(self.workers)]
+        forked = dict(published)
+        for future in loaded:
+            fingerprints = future.result()
+            forked = {
+                v: m for v, m in forked.items() if fingerprints.get(v) == m.fingerprint
+            }
+        return pool, forked
+
+    def reload(self, _active=None):
+        if self._state is None:  # pas encore démarré : start() créera le pool
+            return
+        with self._spawn_lock:
+            old, self._state = self._state, self._spawn()
+        if old is not None:
+            old[0].shutdown(wait=False)
+
+    # Un worker mort (OOM, signal) casse tout le pool : le premier lot qui le
+    # constate le recrée, les suivants trouvent déjà le nouveau
+    def _recover(self, broken):
+        with self._spawn_lock:
+            if self._state is None or self._state[0] is not broken:
+                return
+            logger.error("Pool d'inférence cassé : workers relancés")
+            self._state = self._spawn()
+        broken.shutdown(wait=False)
+
+    def stop(self):
+        if self._state is not None:
+            self._state[0].shutdown(wait=True, cancel_futures=True)
+            self._state = None
+
+    # Une version publiée pendant que le nouveau pool démarre n'est pas encore
+    # dans les workers : elle est scorée dans le process principal (None)
+    def _pool_for(self, loaded):
+        pool, forked = self._state
+        return pool if forked.get(loaded.version) is loaded else None
+
+    def _timed(self, loaded, start):
+        if self.observe is not None:
+            self.observe("executor", time.perf_counter() - start, loaded.version)
+
+    # Depuis un handler async
+    async def score_rows(self, loaded, rows, retry=True):
+        loop = asyncio.get_running_loop()
+        pool = self._pool_for(loaded)
+        if pool is None:
+            return await loop.run_in_executor(None, loaded.score_rows, rows)
+        start = time.perf_counter()
+        try:
+            probs = await asyncio.wrap_future(
+                pool.submit(_score_rows, loaded.version, rows)
+            )
+        except BrokenProcessPool:
+            if not retry:
+                raise
+            await loop.run_in_executor(None, self._recover, pool)
+            return await self.score_rows(loaded, rows, retry=False)
+        self._timed(loaded, start)
+        return probs
+
+    # Depuis un thread (handlers sync, génération en flux)
+    def run_columns(self, loaded, columns, monitored=True, retry=True):
+        pool = self._pool_for(loaded)
+        if pool is None:
+            return loaded.score_columns(columns, monitored=monitored)
+        start = time.perf_counter()
+        try:
+            probs = pool.submit(
+                _score_columns, loaded.version, columns, monitored
+            ).result()
+        except BrokenProcessPool:
+            if not retry:
+                raise
+            self._recover(pool)
+            return self.run_columns(loaded, columns, monitored, retry=False)
+        self._timed(loaded, start)
+        return probs
@@ -0,0 +1,72 @@
+import numpy as np
+
+# Lignes par appel à pred_contribs : borne la mémoire des contributions par
+# colonne encodée (n x (colonnes + 1) float32)
+CHUNK_ROWS = 4096
+
+
+# Explications locales : contributions TreeSHAP natives de XGBoost
+# (pred_contribs, en log-odds) par colonne encodée, ramenées aux champs de
+# CustomerFeatures (somme des colonnes one-hot d'une même feature)
+class Explainer:
+    def __init__(self, engine):
+        self.engine = engine
+        self.feature_names = list(engine.feature_names)
+        self._aggregate = np.zeros(
+            (engine.n_columns, len(self.feature_names)), dtype=np.float32
+        )
+        self._aggregate[np.arange(engine.n_columns), engine.column_feature] = 1.0
+
+    # Matrice encodée -> (probabilités, valeur de base, contributions par champ)
+    def explain(self, X):
+        import xgboost
+
+        engine = self.engine
+        probs, base, contributions = [], [], []
+        for start in range(0, len(X), CHUNK_ROWS):
+            chunk = X[start : start + CHUNK_ROWS]
+            contribs = engine.booster.predict(
+                xgboost.DMatrix(chunk, missing=engine.missing),
+                pred_contribs=True,
+                iteration_range=engine.iteration_range,
+            )
+            probs.append(engine.predict_proba(chunk))
+            base.append(contribs[:, -1])
+            contributions.append(contribs[:, :-1] @ self._aggregate)
+        if not probs:
+            n = len(self.feature_names)
+            return np.zeros(0), np.zeros(0), np.zeros((0, n), dtype=np.float32)
+        return (
+            np.concatenate(probs),
+            np.concatenate(base),
+            np.concatenate(contributions),
+        )
+
+    # Réponse par ligne : contributions triées par valeur absolue décroissante,
+    # limitées aux top_k premières (le reste est sommé dans "others")
+    def format(self, probs, base, contributions, threshold, top_k=None, decimals=4):
+        contributions = np.asarray(contributions, dtype=np.float64)
+        order = np.argsort(-np.abs(contributions), axis=1, kind="stable")
+        n_features = len(self.feature_names)
+        k = n_features if top_k is None else min(top_k, n_features)
+        kept = np.take_along_axis(contributions, order[:, :k], axis=1)
+        others = contributions.sum(axis=1) - kept.sum(axis=1)
+        names = self.feature_names
+        probs = np.asarray(probs, dtype=np.float64)
+        rows = zip(
+            probs.tolist(),
+            np.round(np.asarray(base, dtype=np.float64), decimals).tolist(),
+            order[:, :k].tolist(),
+            np.round(kept, decimals).tolist(),
+            np.round(others, decimals).tolist(),
+        )
+        return [
+            {
+                "churn": prob >= threshold,
+                "probability": round(prob, 3),
+                "base_value": b,
+                "contributions": {names[j]: v for j, v in zip(indices, values)},
+                **({"others": rest} if top_k is not None else {}),
+            }
+            for prob, b, indices, values, rest in rows
+        ]
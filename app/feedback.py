@@ -0,0 +1,279 @@
+import logging
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger("churn_api")
+
+# Résolution des agrégats de scores (bins de 0.001) : précision, rappel et
+# PR-AUC se lisent à ce pas de seuil près
+SCORE_BINS = 1000
+DAY_S = 86400
+# Limite de paramètres d'une requête SQLite (IN (...))
+CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    prediction_id TEXT PRIMARY KEY,
+    customer_id TEXT,
+    model_version TEXT NOT NULL,
+    probability REAL NOT NULL,
+    threshold REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    prediction_id TEXT PRIMARY KEY,
+    customer_id TEXT,
+    churn INTEGER NOT NULL,
+    matched INTEGER NOT NULL,
+    received_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS score_bins (
+    day INTEGER NOT NULL,
+    model_version TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    positives INTEGER NOT NULL,
+    negatives INTEGER NOT NULL,
+    PRIMARY KEY (day, model_version, bin)
+);
+"""
+
+
+def score_bin(probability):
+    return min(int(probability * SCORE_BINS), SCORE_BINS - 1)
+
+
+# Précision, rappel et PR-AUC à partir des effectifs positifs/négatifs par bin
+# de score (bins de même score = ex aequo, comme average_precision_score)
+def binned_metrics(positives, negatives, threshold):
+    positives = np.asarray(positives, dtype=np.int64)
+    negatives = np.asarray(negatives, dtype=np.int64)
+    n_pos, n = int(positives.sum()), int(positives.sum() + negatives.sum())
+    result = {"n_labeled": n, "n_positive": n_pos}
+    if not n:
+        return {**result, "precision": None, "recall": None, "pr_auc": None}
+    # Cumuls du plus haut score au plus bas
+    tp = np.cumsum(positives[::-1])
+    predicted = np.cumsum((positives + negatives)[::-1])
+    # Un seuil dans le dernier bin (> 0.999) garde ce bin : seuil lu à 0.001 près
+    first = min(max(math.ceil(threshold * SCORE_BINS - 1e-9), 0), SCORE_BINS - 1)
+    k = SCORE_BINS - first - 1  # index du bin du seuil dans l'ordre décroissant
+    tp_at, predicted_at = (int(tp[k]), int(predicted[k])) if k >= 0 else (0, 0)
+    occupied = (positives + negatives)[::-1] > 0
+    if n_pos:
+        precision = tp[occupied] / predicted[occupied]
+        recall = tp[occupied] / n_pos
+        pr_auc = float(np.sum(np.diff(np.r_[0.0, recall]) * precision))
+    else:
+        pr_auc = 0.0
+    return {
+        **result,
+        "precision": round(tp_at / predicted_at, 4) if predicted_at else 0.0,
+        "recall": round(tp_at / n_pos, 4) if n_pos else 0.0,
+        "pr_auc": round(pr_auc, 4),
+    }
+
+
+# Journal des prédictions et retours terrain (churn constaté), en SQLite
+# append-only. Chaque retour rapproché d'une prédiction incrémente un agrégat
+# (jour, version, bin de score) : les métriques d'une fenêtre glissante se
+# calculent sur ces agrégats, pas sur tout l'historique.
+class FeedbackStore:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # lecteurs et écrivains concurrents
+            conn.executescript(SCHEMA)
+
+    # Une connexion par opération (threads du serveur, thread du journal,
+    # autres workers) : validée puis fermée en sortie
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def log_predictions(self, records):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO predictions VALUES (?, ?, ?, ?, ?, ?)", records
+            )
+
+    # labels : itérable de (prediction_id, customer_id, churn). Un retour déjà
+    # reçu pour une prédiction est ignoré (le premier fait foi).
+    def ingest(self, labels, received_at=None):
+        received_at = time.time() if received_at is None else received_at
+        stats = Counter(received=0, inserted=0, duplicates=0, unmatched=0)
+        labels = iter(labels)
+        with self._connect() as conn:
+            while True:
+                chunk = [label for _, label in zip(range(CHUNK), labels)]
+                if not chunk:
+                    break
+                self._ingest_chunk(conn, chunk, received_at, stats)
+        return dict(stats)
+
+    def _ingest_chunk(self, conn, chunk, received_at, stats):
+        ids = [prediction_id for prediction_id, _, _ in chunk]
+        predictions = {
+            row[0]: row[1:]
+            for row in conn.execute(
+                "SELECT prediction_id, model_version, probability, created_at "
+                f"FROM predictions WHERE prediction_id IN ({','.join('?' * len(ids))})",
+                ids,
+            )
+        }
+        bins = Counter()
+        for prediction_id, customer_id, churn in chunk:
+            stats["received"] += 1
+            prediction = predictions.get(prediction_id)
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO feedback VALUES (?, ?, ?, ?, ?)",
+                (
+                    prediction_id,
+                    customer_id,
+                    int(churn),
+                    prediction is not None,
+                    received_at,
+                ),
+            )
+            if not cursor.rowcount:
+                stats["duplicates"] += 1
+                continue
+            stats["inserted"] += 1
+            if prediction is None:
+                stats["unmatched"] += 1
+                continue
+            version, probability, created_at = prediction
+            key = (int(created_at // DAY_S), version, score_bin(probability))
+            bins[key + (bool(churn),)] += 1
+        conn.executemany(
+            "INSERT INTO score_bins VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (day, model_version, bin) DO UPDATE SET "
+            "positives = positives + excluded.positives, "
+            "negatives = negatives + excluded.negatives",
+            [
+                (day, version, b, n if churn else 0, 0 if churn else n)
+                for (day, version, b, churn), n in bins.items()
+            ],
+        )
+
+    # Métriques par fenêtre glissante (en jours, sur la date de prédiction)
+    def metrics(self, windows, threshold, model_version=None, now=None):
+        today = int((time.time() if now is None else now) // DAY_S)
+        results = {}
+        with self._connect() as conn:
+            for days in windows:
+                query = (
+                    "SELECT bin, SUM(positives), SUM(negatives) FROM score_bins "
+                    "WHERE day > ?"
+                )
+                params = [today - days]
+                if model_version is not None:
+                    query += " AND model_version = ?"
+                    params.append(model_version)
+                positives = np.zeros(SCORE_BINS, dtype=np.int64)
+                negatives = np.zeros(SCORE_BINS, dtype=np.int64)
+                for b, pos, neg in conn.execute(query + " GROUP BY bin", params):
+                    positives[b], negatives[b] = pos, neg
+                results[f"{days}d"] = binned_metrics(positives, negatives, threshold)
+        return results
+
+    def counts(self):
+        with self._connect() as conn:
+            return {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("predictions", "feedback")
+            }
+
+
+# Journal des prédictions hors du chemin de requête : file bornée (put sans
+# attente, la prédiction est perdue si la file est pleine) vidée par lots par
+# un thread d'écriture
+class PredictionLog:
+    def __init__(self, store, max_queue=10000, max_batch=1000, flush_interval_s=0.5):
+        self.store = store
+        self.max_batch = max_batch
+        self.flush_interval_s = flush_interval_s
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self.logged = 0
+        self.dropped = 0
+
+    def record(self, prediction_id, customer_id, model_version, probability, threshold):
+        try:
+            self._queue.put_nowait(
+                (
+                    prediction_id,
+                    customer_id,
+                    model_version,
+                    probability,
+                    threshold,
+                    time.time(),
+                )
+            )
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="prediction-log", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval_s + 5)
+            self._thread = None
+        self._drain()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                continue
+            self._drain([first])
+
+    def _drain(self, batch=None):
+        batch = batch or []
+        while True:
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            try:
+                self.store.log_predictions(batch)
+                self.logged += len(batch)
+            except sqlite3.Error as e:
+                self.dropped += len(batch)
+                logger.error(f"Journal des prédictions : {len(batch)} perdues ({e})")
+            if len(batch) < self.max_batch:
+                return
+            batch = []
+
+    def stats(self):
+        return {
+            "logged": self.logged,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+        }
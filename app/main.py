@@ -1,12 +1,39 @@
 import time
 import logging
-from fastapi import FastAPI, Query, Request
-from fastapi.responses import ORJSONResponse
-from pydantic import BaseModel
-import pandas as pd
-import joblib
+from functools import lru_cache, partial
+from typing import List, Optional, Union
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import numpy as np
 import os
-from sklearn.metrics import classification_report, average_precision_score
+import tempfile
+import uuid
+
+from app import arrow_io
+from app.arrow_io import ARROW_STREAM, PARQUET_TYPES
+from app.audit import AuditLog
+from app.batching import MicroBatcher
+from app.cache import PredictionCache
+from app.schemas import FEATURE_NAMES, ColumnarBatch, CustomerFeatures, FeedbackItem
+from app.decoding import DecodeError
+from app.evaluation import ThresholdIndex
+from app.feedback import FeedbackStore, PredictionLog
+from app.executor import InferenceExecutor
+from app.monitoring import DriftMonitor
+from app.registry import (
+    BOOSTER_FILE,
+    PIPELINE_FILE,
+    LoadedModel,
+    ModelRegistry,
+    require_sklearn,
+)
+from app.telemetry import (
+    TelemetryMiddleware,
+    TimedORJSONResponse,
+    format_labels,
+    telemetry,
+)
 
 # Config logs
 logging.basicConfig(
@@ -14,152 +41,1263 @@ logging.basicConfig(
 )
 logger = logging.getLogger("churn_api")
 
-# Chargement du modèle
-MODEL_PATH = "app/model/xgb_churn_pipeline.pkl"
-if not os.path.exists(MODEL_PATH):
-    raise FileNotFoundError(
-        f"Modèle introuvable : {MODEL_PATH}. Exécutez train.py au préalable."
+# Fraction des requêtes loguées en INFO (0 = aucune, 1 = toutes) : la latence
+# de chaque requête est déjà agrégée dans /metrics/prometheus
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0"))
+
+# Taille maximale d'un lot pour /predict_batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+
+# Taille maximale d'un lot binaire pour /predict_arrow
+MAX_ARROW_ROWS = int(os.getenv("MAX_ARROW_ROWS", "1000000"))
+
+# Micro-batching de /predict (opt-in)
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "0") == "1"
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "64"))
+
+# Cache des prédictions /predict (LRU + TTL)
+PREDICTION_CACHE = os.getenv("PREDICTION_CACHE", "1") == "1"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "100000"))
+CACHE_MAX_MB = float(os.getenv("CACHE_MAX_MB", "64"))
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "3600"))
+
+# Exécution du scoring : "inline" (boucle d'événements / threadpool) ou
+# "process" (pool de processus, forkserver, qui chargent les modèles publiés)
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "inline")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))  # 0 = nb de cœurs
+INFERENCE_NTHREAD = int(os.getenv("INFERENCE_NTHREAD", "0"))  # 0 = cœurs / workers
+
+# Moteur d'inférence : "compiled" (NumPy + Booster, sans pandas) ou "pipeline"
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "compiled")
+# Évaluation des arbres du moteur compilé pour les petits lots : "xgboost"
+# (Booster), "numpy" ou "numba" (arbres aplatis, voir bench_trees.py) ;
+# TREE_BACKEND_MAX_ROWS = taille de lot maximale (0 = valeur mesurée du backend)
+TREE_BACKEND = os.getenv("TREE_BACKEND", "xgboost")
+TREE_BACKEND_MAX_ROWS = int(os.getenv("TREE_BACKEND_MAX_ROWS", "0")) or None
+
+# Registre des modèles : app/model/ (version "default") et app/model/versions/<version>/,
+# surveillé toutes les MODEL_POLL_S secondes (0 = pas de rechargement à chaud)
+MODEL_DIR = os.getenv("MODEL_DIR", "app/model")
+MODEL_POLL_S = float(os.getenv("MODEL_POLL_S", "5"))
+MODEL_MAX_LOADED = int(os.getenv("MODEL_MAX_LOADED", "3"))
+# Démarrage : LAZY_STARTUP=1 ouvre le serveur sans attendre le modèle (chargé
+# et préchauffé en tâche de fond, /ready vaut 503 d'ici là) et ne lit le jeu
+# de test qu'au premier appel de /metrics ; 0 charge tout au démarrage
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "0") == "1"
+
+# Suivi de dérive du trafic : instantanés de chaque process (workers uvicorn,
+# pool d'inférence) dans MONITORING_DIR, fusionnés par /monitoring/drift
+MONITORING = os.getenv("MONITORING", "1") == "1"
+MONITORING_DIR = os.getenv(
+    "MONITORING_DIR", os.path.join(tempfile.gettempdir(), "churn-monitoring")
+)
+MONITORING_FLUSH_S = float(os.getenv("MONITORING_FLUSH_S", "10"))
+
+# Journal des prédictions de /predict et retours terrain (SQLite, dans le
+# volume du modèle par défaut)
+PREDICTION_LOG = os.getenv("PREDICTION_LOG", "1") == "1"
+PREDICTION_LOG_QUEUE = int(os.getenv("PREDICTION_LOG_QUEUE", "10000"))
+FEEDBACK_DB = os.getenv("FEEDBACK_DB", os.path.join(MODEL_DIR, "feedback.sqlite"))
+
+# Journal d'audit des décisions (entrées, probabilité, seuil, version, latence)
+# écrit en tâche de fond dans des fichiers JSONL gzip ou Parquet tournants
+AUDIT_LOG = os.getenv("AUDIT_LOG", "0") == "1"
+AUDIT_DIR = os.getenv("AUDIT_DIR", os.path.join(MODEL_DIR, "audit"))
+AUDIT_FORMAT = os.getenv("AUDIT_FORMAT", "jsonl")  # jsonl | parquet
+AUDIT_POLICY = os.getenv("AUDIT_POLICY", "drop")  # drop | sample | block
+AUDIT_CAPACITY = int(os.getenv("AUDIT_CAPACITY", "65536"))  # lignes en mémoire
+AUDIT_SAMPLE_RATE = float(os.getenv("AUDIT_SAMPLE_RATE", "0.1"))
+AUDIT_BLOCK_TIMEOUT_S = float(os.getenv("AUDIT_BLOCK_TIMEOUT_S", "1"))
+AUDIT_ROTATE_MB = float(os.getenv("AUDIT_ROTATE_MB", "64"))
+AUDIT_ROTATE_S = float(os.getenv("AUDIT_ROTATE_S", "3600"))
+MODEL_PATH = os.path.join(MODEL_DIR, PIPELINE_FILE)
+BOOSTER_PATH = os.path.join(MODEL_DIR, BOOSTER_FILE)
+
+# Ligne de préchauffage : chaque version est scorée une fois avant d'être publiée
+WARMUP_SAMPLE = {
+    "gender": "Male",
+    "SeniorCitizen": 0,
+    "Partner": "Yes",
+    "Dependents": "No",
+    "tenure": 1,
+    "PhoneService": "Yes",
+    "MultipleLines": "No",
+    "InternetService": "DSL",
+    "OnlineSecurity": "No",
+    "OnlineBackup": "No",
+    "DeviceProtection": "No",
+    "TechSupport": "No",
+    "StreamingTV": "No",
+    "StreamingMovies": "No",
+    "Contract": "Month-to-month",
+    "PaperlessBilling": "Yes",
+    "PaymentMethod": "Electronic check",
+    "MonthlyCharges": 50.0,
+    "TotalCharges": 50.0,
+}
+
+
+def warmup_model(loaded):
+    try:
+        loaded.predict_row(WARMUP_SAMPLE)
+        loaded.score_rows([WARMUP_SAMPLE])
+        logger.info(f"Warm-up terminé ({loaded.version})")
+    except Exception as e:
+        logger.error(f"Warm-up échoué ({loaded.version}) : {e}")
+
+
+registry = ModelRegistry(
+    MODEL_DIR,
+    inference_engine=INFERENCE_ENGINE,
+    tree_backend=TREE_BACKEND,
+    tree_max_rows=TREE_BACKEND_MAX_ROWS,
+    warmup=warmup_model,
+    poll_interval_s=MODEL_POLL_S,
+    max_loaded=MODEL_MAX_LOADED,
+    monitor_factory=(
+        partial(
+            DriftMonitor.for_model,
+            directory=MONITORING_DIR,
+            flush_interval_s=MONITORING_FLUSH_S,
+        )
+        if MONITORING
+        else None
+    ),
+)
+
+TEST_PATH = os.path.join(MODEL_DIR, "test_set.csv")
+
+
+# Jeu de test de /metrics, lu au premier appel (pandas importé à ce moment-là)
+# et gardé en mémoire : (X_test, y_test), ou (None, None) s'il est absent
+_test_set = None
+
+
+def test_set():
+    global _test_set
+    if _test_set is None:
+        import pandas as pd
+
+        try:
+            df_test = pd.read_csv(TEST_PATH)
+        except Exception:
+            logger.warning("⚠️ Aucun jeu de test trouvé pour /metrics")
+            return None, None
+        _test_set = df_test.drop(columns=["Churn"]), df_test["Churn"]
+        logger.info(f"✅ Jeu de test chargé depuis {TEST_PATH} ({df_test.shape})")
+    return _test_set
+
+
+prediction_cache = (
+    PredictionCache(
+        FEATURE_NAMES,
+        max_entries=CACHE_MAX_ENTRIES,
+        max_bytes=int(CACHE_MAX_MB * 1024 * 1024),
+        ttl_s=CACHE_TTL_S,
     )
-model = joblib.load(MODEL_PATH)
-logger.info("✅ Modèle chargé avec succès")
-
-# Chargement du jeu de test (si disponible)
-try:
-    TEST_PATH = "app/model/test_set.csv"
-    df_test = pd.read_csv(TEST_PATH)
-    X_test = df_test.drop(columns=["Churn"])
-    y_test = df_test["Churn"]
-    logger.info(f"✅ Jeu de test chargé depuis {TEST_PATH} ({X_test.shape})")
-except Exception:
-    df_test, X_test, y_test = None, None, None
-    logger.warning("⚠️ Aucun jeu de test trouvé pour /metrics")
-
-
-# Schéma d'entrée
-class CustomerFeatures(BaseModel):
-    gender: str
-    SeniorCitizen: int
-    Partner: str
-    Dependents: str
-    tenure: int
-    PhoneService: str
-    MultipleLines: str
-    InternetService: str
-    OnlineSecurity: str
-    OnlineBackup: str
-    DeviceProtection: str
-    TechSupport: str
-    StreamingTV: str
-    StreamingMovies: str
-    Contract: str
-    PaperlessBilling: str
-    PaymentMethod: str
-    MonthlyCharges: float
-    TotalCharges: float
+    if PREDICTION_CACHE
+    else None
+)
 
+executor = (
+    InferenceExecutor(
+        registry,
+        workers=INFERENCE_WORKERS,
+        nthread=INFERENCE_NTHREAD,
+        observe=telemetry.observe_stage,
+    )
+    if INFERENCE_EXECUTOR == "process"
+    else None
+)
+if executor is not None:
+    registry.on_swap(executor.reload)
+# Entrées des modèles remplacés libérées à chaque publication
+if prediction_cache is not None:
+    registry.on_swap(lambda _active: prediction_cache.clear())
 
-# Création de l'app
-app = FastAPI(default_response_class=ORJSONResponse)
 
+async def score_batch_in_pool(rows, loaded):
+    return await executor.score_rows(loaded, rows)
 
-# Middleware pour loguer la latence
-@app.middleware("http")
-async def log_latency(request: Request, call_next):
-    start = time.perf_counter()
-    response = await call_next(request)
-    duration = (time.perf_counter() - start) * 1000
-    logger.info(
-        f"{request.method} {request.url.path} - {duration:.2f} ms - status {response.status_code}"
+
+batcher = (
+    MicroBatcher(
+        (
+            score_batch_in_pool
+            if executor is not None
+            else lambda rows, loaded: loaded.score_rows(rows, telemetry.observe_stage)
+        ),
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        # Un micro-lot en cours par processus du pool
+        max_in_flight=executor.workers if executor is not None else 1,
     )
-    return response
+    if MICRO_BATCHING
+    else None
+)
 
+# Explications unitaires regroupées de la même façon : un appel pred_contribs
+# par micro-lot (process principal, le pool ne sert que les probabilités)
+explain_batcher = (
+    MicroBatcher(
+        lambda rows, loaded: explain_columns(loaded, rows_to_columns(rows)),
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        result=lambda explanation: explanation,
+    )
+    if MICRO_BATCHING
+    else None
+)
 
-# Warm-up
-@app.on_event("startup")
-def warmup():
-    sample = pd.DataFrame(
-        [
-            {
-                "gender": "Male",
-                "SeniorCitizen": 0,
-                "Partner": "Yes",
-                "Dependents": "No",
-                "tenure": 1,
-                "PhoneService": "Yes",
-                "MultipleLines": "No",
-                "InternetService": "DSL",
-                "OnlineSecurity": "No",
-                "OnlineBackup": "No",
-                "DeviceProtection": "No",
-                "TechSupport": "No",
-                "StreamingTV": "No",
-                "StreamingMovies": "No",
-                "Contract": "Month-to-month",
-                "PaperlessBilling": "Yes",
-                "PaymentMethod": "Electronic check",
-                "MonthlyCharges": 50.0,
-                "TotalCharges": 50.0,
-            }
-        ]
+
+# Ouverts au démarrage (open_feedback_store) : l'import n'écrit rien sur disque
+feedback_store = None
+prediction_log = None
+
+audit_log = (
+    AuditLog(
+        AUDIT_DIR,
+        capacity=AUDIT_CAPACITY,
+        policy=AUDIT_POLICY,
+        sample_rate=AUDIT_SAMPLE_RATE,
+        block_timeout_s=AUDIT_BLOCK_TIMEOUT_S,
+        rotate_mb=AUDIT_ROTATE_MB,
+        rotate_s=AUDIT_ROTATE_S,
+        file_format=AUDIT_FORMAT,
     )
+    if AUDIT_LOG
+    else None
+)
+
+
+# Journal d'audit depuis un handler async : avec AUDIT_POLICY=block et un
+# tampon plein, l'attente d'une place se fait dans le threadpool et ne bloque
+# pas la boucle d'événements
+async def audit(*args):
+    if audit_log.record(*args, wait=False) is None:
+        await run_in_threadpool(audit_log.record, *args)
+
+
+# Décisions d'un fichier (/score_file, /rank), par tranches qui tiennent dans
+# le tampon : un morceau plus grand que AUDIT_CAPACITY serait perdu en entier
+def audit_frame(route, loaded, frame, probs, threshold):
+    columns = frame[FEATURE_NAMES]
+    for start in range(0, len(frame), audit_log.capacity):
+        stop = start + audit_log.capacity
+        audit_log.record(
+            route,
+            loaded.version,
+            columns.iloc[start:stop].to_dict(orient="list"),
+            probs[start:stop],
+            threshold,
+        )
+
+
+# Scoring colonnaire depuis un thread : pool de processus ou process principal
+# monitored=False : fichiers scorés en masse (/score_file, /rank), hors du
+# profil de dérive du trafic en ligne
+def columns_scorer(loaded, monitored=True):
+    if executor is not None:
+        return partial(executor.run_columns, loaded, monitored=monitored)
+    return partial(
+        loaded.score_columns, observe=telemetry.observe_stage, monitored=monitored
+    )
+
+
+# Création de l'app
+app = FastAPI(default_response_class=TimedORJSONResponse)
+app.add_middleware(TelemetryMiddleware, log_sample_rate=LOG_SAMPLE_RATE)
+
+
+# INFERENCE_ENGINE=pipeline sur une image sans scikit-learn : arrêt immédiat
+# plutôt qu'une erreur au chargement de chaque version
+@app.on_event("startup")
+def check_inference_engine():
+    if INFERENCE_ENGINE == "pipeline":
+        require_sklearn("INFERENCE_ENGINE=pipeline")
+
+
+# Premier chargement des modèles, avant le fork du pool ; un modèle absent
+# n'empêche pas le démarrage (/ready reste à 503, le registre le chargera dès
+# qu'il apparaîtra). Avec LAZY_STARTUP=1, fait par le thread du registre.
+@app.on_event("startup")
+def load_models():
+    if LAZY_STARTUP:
+        return
     try:
-        _ = model.predict_proba(sample)
-        logger.info("Warm-up terminé")
-    except Exception as e:
-        logger.error(f"Warm-up échoué : {e}")
+        registry.refresh()
+    except FileNotFoundError as e:
+        logger.error(f"❌ {e}")
+    test_set()
+
+
+# Le pool est forké en premier, avant le démarrage des autres threads
+@app.on_event("startup")
+def start_executor():
+    if executor is not None:
+        executor.start()
+
+
+@app.on_event("startup")
+async def start_batcher():
+    if batcher is not None:
+        batcher.start()
+    if explain_batcher is not None:
+        explain_batcher.start()
+
+
+@app.on_event("startup")
+def start_registry():
+    registry.start(load=LAZY_STARTUP)
+
+
+@app.on_event("startup")
+def open_feedback_store():
+    global feedback_store, prediction_log
+    feedback_store = FeedbackStore(FEEDBACK_DB)
+    if PREDICTION_LOG:
+        prediction_log = PredictionLog(feedback_store, max_queue=PREDICTION_LOG_QUEUE)
+
+
+@app.on_event("startup")
+def start_prediction_log():
+    if prediction_log is not None:
+        prediction_log.start()
+
+
+@app.on_event("startup")
+def start_audit_log():
+    if audit_log is not None:
+        audit_log.start()
+
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    if batcher is not None:
+        await batcher.stop()
+    if explain_batcher is not None:
+        await explain_batcher.stop()
+
+
+@app.on_event("shutdown")
+def stop_registry():
+    registry.stop()
+
+
+@app.on_event("shutdown")
+def stop_executor():
+    if executor is not None:
+        executor.stop()
+
+
+@app.on_event("shutdown")
+def stop_prediction_log():
+    if prediction_log is not None:
+        prediction_log.stop()
+
+
+@app.on_event("shutdown")
+def stop_audit_log():
+    if audit_log is not None:
+        audit_log.stop()
 
 
-# Endpoint santé
+@app.on_event("shutdown")
+def flush_monitoring():
+    for version in registry.versions():
+        monitor = registry.get(version).monitor
+        if monitor is not None:
+            monitor.flush()
+
+
+# Version du modèle pour la requête : en-tête X-Model-Version ou paramètre
+# model_version, sinon la version active. La référence obtenue est gardée
+# jusqu'à la fin de la requête, même si une nouvelle version est publiée.
+def resolve_model(
+    request: Request, model_version: Optional[str] = Query(None)
+) -> LoadedModel:
+    version = model_version or request.headers.get("x-model-version")
+    try:
+        loaded = registry.get(version)
+    except KeyError:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Version de modèle inconnue : {version} "
+            f"(disponibles : {', '.join(registry.versions())}).",
+        )
+    if loaded is None:
+        raise HTTPException(
+            status_code=503, detail="Aucun modèle chargé pour l'instant (voir /ready)."
+        )
+    return loaded
+
+
+# Politiques de seuil du modèle (policies.json écrit par train.py) ; 404 avec
+# la liste des politiques disponibles si le nom est inconnu
+def model_policies(loaded, policy):
+    policies = loaded.policies
+    if policies is None or policy not in policies:
+        available = ", ".join(policies.names()) if policies is not None else "aucune"
+        raise HTTPException(
+            status_code=404,
+            detail=f"Politique de seuil inconnue pour {loaded.version} : {policy} "
+            f"(disponibles : {available}).",
+        )
+    return policies
+
+
+# Seuils d'un lot : le seuil fixe, ou un seuil par ligne selon la politique ;
+# values(segment) renvoie les valeurs de la feature de segmentation du lot
+def batch_thresholds(loaded, policy, threshold, values, n_rows):
+    if policy is None:
+        return threshold
+    policies = model_policies(loaded, policy)
+    segment = policies.segment(policy)
+    return policies.thresholds(policy, values(segment) if segment else (), n_rows)
+
+
+# Réponse d'un lot ; "threshold" par prédiction avec une politique segmentée
+def batch_response(loaded, probs, threshold, policy, n_rows):
+    churn = (probs >= threshold).tolist()
+    rounded = np.round(probs.astype(np.float64), 3).tolist()
+    if policy is None:
+        predictions = [{"churn": c, "probability": p} for c, p in zip(churn, rounded)]
+    else:
+        predictions = [
+            {"churn": c, "probability": p, "threshold": t}
+            for c, p, t in zip(churn, rounded, np.asarray(threshold).tolist())
+        ]
+    return {
+        "threshold": threshold if policy is None else None,
+        **({"policy": policy} if policy is not None else {}),
+        "count": n_rows,
+        "model_version": loaded.version,
+        "predictions": predictions,
+    }
+
+
+# Endpoint santé (liveness) : le process répond, modèle chargé ou non
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
-# Endpoint prédiction
+# Disponibilité (readiness) : 503 tant qu'aucun modèle préchauffé n'est publié
+@app.get("/ready")
+def ready():
+    active = registry.active
+    if active is None:
+        raise HTTPException(status_code=503, detail="Modèle en cours de chargement.")
+    return {"status": "ready", "model_version": active.version}
+
+
+# Versions chargées et version active
+@app.get("/models")
+def models():
+    active = registry.active
+    return {
+        "active": active.version if active is not None else None,
+        "loaded": registry.versions(),
+    }
+
+
+# Politiques de seuil précalculées du modèle (GET /policies), utilisables
+# par nom dans le paramètre policy des endpoints de prédiction
+@app.get("/policies")
+def policies(loaded: LoadedModel = Depends(resolve_model)):
+    if loaded.policies is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Aucune politique de seuil pour {loaded.version} "
+            "(relancez train.py).",
+        )
+    return {"model_version": loaded.version, **loaded.policies.description}
+
+
+# Endpoint prédiction ; policy remplace threshold par le seuil de la politique
+# (selon le segment du client pour une politique segmentée)
 @app.post("/predict")
-def predict(features: CustomerFeatures, threshold: float = Query(0.40, ge=0.0, le=1.0)):
-    input_df = pd.DataFrame([features.dict()])
-    prob = float(model.predict_proba(input_df)[0][1])
+async def predict(
+    features: CustomerFeatures,
+    threshold: float = Query(0.40, ge=0.0, le=1.0),
+    policy: Optional[str] = Query(None),
+    customer_id: Optional[str] = Query(None),
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    telemetry.enter_handler("/predict", loaded.version)
+    row = features.__dict__
+    if policy is not None:
+        threshold = model_policies(loaded, policy).threshold(policy, row)
+    cache_key = prob = None
+    if prediction_cache is not None:
+        cache_key = prediction_cache.key(row, loaded.cache_id)
+        prob = prediction_cache.get(cache_key)
+    if prob is None:
+        if batcher is not None:
+            prob = await batcher.submit(features.dict(), loaded)
+        elif executor is not None:
+            prob = float((await executor.score_rows(loaded, [features.dict()]))[0])
+        elif loaded.engine is not None:
+            # Quelques dizaines de µs : exécuté directement, sans passer par le threadpool
+            prob = loaded.predict_row(row, telemetry.observe_stage)
+        else:
+            prob = await run_in_threadpool(
+                loaded.predict_row, features.dict(), telemetry.observe_stage
+            )
+        if cache_key is not None:
+            prediction_cache.put(cache_key, prob)
+    elif loaded.monitor is not None:
+        # Client déjà scoré : compté quand même dans le profil de dérive
+        if loaded.engine is not None:
+            loaded.track_row(row, prob)
+        else:
+            await run_in_threadpool(loaded.track_row, features.dict(), prob)
+    telemetry.count_rows("/predict", loaded.version, 1)
+    # Identifiant à renvoyer avec le churn constaté sur /feedback ; l'écriture
+    # du journal se fait en tâche de fond
+    prediction_id = uuid.uuid4().hex
+    if prediction_log is not None:
+        prediction_log.record(
+            prediction_id, customer_id, loaded.version, prob, threshold
+        )
+    if audit_log is not None:
+        await audit(
+            "/predict",
+            loaded.version,
+            row,
+            prob,
+            threshold,
+            telemetry.elapsed(),
+            prediction_id,
+        )
     return {
         "churn": bool(prob >= threshold),
         "probability": round(prob, 3),
         "threshold": threshold,
+        **({"policy": policy} if policy is not None else {}),
+        "model_version": loaded.version,
+        "prediction_id": prediction_id,
     }
 
 
+# Endpoint prédiction par lot (un seul appel predict_proba)
+@app.post("/predict_batch")
+def predict_batch(
+    batch: Union[List[CustomerFeatures], ColumnarBatch],
+    threshold: float = Query(0.40, ge=0.0, le=1.0),
+    policy: Optional[str] = Query(None),
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    if isinstance(batch, list):
+        columns = {
+            name: [getattr(row, name) for row in batch] for name in FEATURE_NAMES
+        }
+    else:
+        columns = {name: getattr(batch, name) for name in FEATURE_NAMES}
+        if len({len(values) for values in columns.values()}) > 1:
+            raise HTTPException(
+                status_code=422,
+                detail="Toutes les colonnes doivent avoir la même longueur.",
+            )
+
+    n_rows = len(columns[FEATURE_NAMES[0]])
+    if n_rows > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lot trop volumineux : {n_rows} lignes (max {MAX_BATCH_SIZE}).",
+        )
+    telemetry.enter_handler("/predict_batch", loaded.version)
+    threshold = batch_thresholds(loaded, policy, threshold, columns.__getitem__, n_rows)
+    if n_rows == 0:
+        return batch_response(loaded, np.zeros(0), threshold, policy, 0)
+
+    probs = columns_scorer(loaded)(columns)
+    telemetry.count_rows("/predict_batch", loaded.version, n_rows)
+    if audit_log is not None:
+        audit_log.record(
+            "/predict_batch",
+            loaded.version,
+            columns,
+            probs,
+            threshold if policy is None else threshold.tolist(),
+            telemetry.elapsed(),
+        )
+    return batch_response(loaded, probs, threshold, policy, n_rows)
+
+
+# Décodage rapide (orjson, validation contre les vocabulaires du modèle,
+# encodage direct en NumPy) : même réponse que /predict et /predict_batch,
+# erreurs 422 au format FastAPI ({"detail": [{"loc", "msg", "type", ...}]})
+def fast_decoder(loaded):
+    try:
+        return loaded.decoder
+    except ValueError as e:
+        raise HTTPException(
+            status_code=501, detail=f"Décodage rapide indisponible : {e}"
+        )
+
+
+def fast_predict(loaded, encode, data):
+    start = time.perf_counter()
+    try:
+        X = encode(data)
+    except DecodeError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    t1 = time.perf_counter()
+    probs = loaded.decoder.engine.predict_proba(X)
+    telemetry.observe_stage("decode", t1 - start, loaded.version)
+    telemetry.observe_stage("predict", time.perf_counter() - t1, loaded.version)
+    loaded.track(X, probs)
+    return probs
+
+
+ROW_SCHEMA = CustomerFeatures.model_json_schema()
+
+
+@app.post(
+    "/predict_fast",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": ROW_SCHEMA}},
+        }
+    },
+)
+async def predict_fast(
+    request: Request,
+    threshold: float = Query(0.40, ge=0.0, le=1.0),
+    policy: Optional[str] = Query(None),
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    telemetry.enter_handler("/predict_fast", loaded.version)
+    decoder = fast_decoder(loaded)
+    try:
+        row = decoder.loads(await request.body())
+    except DecodeError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    policies = model_policies(loaded, policy) if policy is not None else None
+    prob = float(fast_predict(loaded, decoder.encode_row, row)[0])
+    telemetry.count_rows("/predict_fast", loaded.version, 1)
+    if policies is not None:  # après l'encodage : ligne validée
+        threshold = policies.threshold(policy, row)
+    if audit_log is not None:
+        await audit(
+            "/predict_fast", loaded.version, row, prob, threshold, telemetry.elapsed()
+        )
+    return {
+        "churn": prob >= threshold,
+        "probability": round(prob, 3),
+        "threshold": threshold,
+        **({"policy": policy} if policy is not None else {}),
+        "model_version": loaded.version,
+    }
+
+
+@app.post(
+    "/predict_batch_fast",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "anyOf": [
+                            {"type": "array", "items": ROW_SCHEMA},
+                            ColumnarBatch.model_json_schema(),
+                        ]
+                    }
+                }
+            },
+        }
+    },
+)
+async def predict_batch_fast(
+    request: Request,
+    threshold: float = Query(0.40, ge=0.0, le=1.0),
+    policy: Optional[str] = Query(None),
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    decoder = fast_decoder(loaded)
+    try:
+        batch = decoder.loads(await request.body())
+    except DecodeError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    columnar = isinstance(batch, dict)
+    if columnar:
+        first = batch.get(FEATURE_NAMES[0])
+        n_rows = len(first) if isinstance(first, list) else 0
+    else:
+        n_rows = len(batch) if isinstance(batch, list) else 0
+    if n_rows > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lot trop volumineux : {n_rows} lignes (max {MAX_BATCH_SIZE}).",
+        )
+    telemetry.enter_handler("/predict_batch_fast", loaded.version)
+    encode = decoder.encode_columns if columnar else decoder.encode_rows
+    # Encodage et predict hors de la boucle d'événements
+    probs = await run_in_threadpool(fast_predict, loaded, encode, batch)
+    telemetry.count_rows("/predict_batch_fast", loaded.version, n_rows)
+    # Après l'encodage : le lot est validé (lignes et colonnes complètes)
+    threshold = batch_thresholds(
+        loaded,
+        policy,
+        threshold,
+        lambda segment: (
+            batch[segment] if columnar else (row[segment] for row in batch)
+        ),
+        n_rows,
+    )
+    if audit_log is not None:
+        await audit(
+            "/predict_batch_fast",
+            loaded.version,
+            batch,
+            probs,
+            threshold if policy is None else threshold.tolist(),
+            telemetry.elapsed(),
+        )
+    return batch_response(loaded, probs, threshold, policy, n_rows)
+
+
+# Lots binaires Arrow IPC (flux) ou Parquet au schéma CustomerFeatures,
+# réponse en flux Arrow (colonne float32 "probability"). Hors du journal
+# d'audit : probabilités seules, sans seuil ni décision
+@app.post(
+    "/predict_arrow",
+    response_class=Response,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                ARROW_STREAM: {"schema": {"type": "string", "format": "binary"}},
+                PARQUET_TYPES[0]: {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+)
+async def predict_arrow(request: Request, loaded: LoadedModel = Depends(resolve_model)):
+    if not arrow_io.available():
+        raise HTTPException(status_code=501, detail="pyarrow n'est pas installé.")
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in (ARROW_STREAM, *PARQUET_TYPES):
+        raise HTTPException(
+            status_code=415,
+            detail=f"Content-Type attendu : {ARROW_STREAM} ou {PARQUET_TYPES[0]}.",
+        )
+    engine = fast_decoder(loaded).engine
+    body = await request.body()
+    telemetry.enter_handler("/predict_arrow", loaded.version)
+
+    def score():
+        start = time.perf_counter()
+        table = arrow_io.read_table(body, content_type)
+        if table.num_rows > MAX_ARROW_ROWS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Lot trop volumineux : {table.num_rows} lignes "
+                f"(max {MAX_ARROW_ROWS}).",
+            )
+        X = arrow_io.encode_table(engine, table)
+        t1 = time.perf_counter()
+        probs = engine.predict_proba(X)
+        telemetry.observe_stage("decode", t1 - start, loaded.version)
+        telemetry.observe_stage("predict", time.perf_counter() - t1, loaded.version)
+        telemetry.count_rows("/predict_arrow", loaded.version, len(probs))
+        loaded.track(X, probs)
+        return arrow_io.write_probabilities(probs, loaded.version)
+
+    try:
+        content = await run_in_threadpool(score)
+    except DecodeError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    return Response(
+        content, media_type=ARROW_STREAM, headers={"X-Model-Version": loaded.version}
+    )
+
+
+# Schéma d'entrée pour construire des record batches compatibles : JSON
+# (types, catégories apprises, bornes) ou flux Arrow vide (?format=arrow)
+@app.get("/schema")
+def schema(
+    format: str = Query("json", pattern="^(json|arrow)$"),
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    if not arrow_io.available():
+        raise HTTPException(status_code=501, detail="pyarrow n'est pas installé.")
+    if format == "arrow":
+        return Response(
+            arrow_io.empty_stream(arrow_io.arrow_schema()), media_type=ARROW_STREAM
+        )
+    return {
+        "model_version": loaded.version,
+        **arrow_io.schema_description(fast_decoder(loaded).engine),
+    }
+
+
+def rows_to_columns(rows):
+    return {name: [row[name] for row in rows] for name in FEATURE_NAMES}
+
+
+def model_explainer(loaded):
+    try:
+        return loaded.explainer
+    except ValueError as e:
+        raise HTTPException(status_code=501, detail=f"Explications indisponibles : {e}")
+
+
+# Explications (probabilité, valeur de base, contributions par champ) d'un lot
+# colonnaire. Cache partagé avec /predict : seules les lignes absentes sont
+# calculées, et leur probabilité alimente aussi le cache des prédictions.
+def explain_columns(loaded, columns):
+    explainer = loaded.explainer
+    n_rows = len(columns[FEATURE_NAMES[0]])
+    explanations = [None] * n_rows
+    keys = None
+    if prediction_cache is not None:
+        keys = prediction_cache.keys(columns, loaded.cache_id, kind="explain")
+        explanations = [prediction_cache.get(key) for key in keys]
+    missing = [i for i, explanation in enumerate(explanations) if explanation is None]
+    if not missing:
+        return explanations
+    if len(missing) < n_rows:
+        columns = {
+            name: [values[i] for i in missing] for name, values in columns.items()
+        }
+    start = time.perf_counter()
+    X = explainer.engine.encode_columns(columns)
+    t1 = time.perf_counter()
+    probs, base, contributions = explainer.explain(X)
+    telemetry.observe_stage("encode", t1 - start, loaded.version)
+    telemetry.observe_stage("explain", time.perf_counter() - t1, loaded.version)
+    computed = list(
+        zip(probs.astype(np.float64).tolist(), base.tolist(), contributions.tolist())
+    )
+    for i, explanation in zip(missing, computed):
+        explanations[i] = explanation
+    if keys is not None:
+        for i, explanation in zip(missing, computed):
+            prediction_cache.put(keys[i], explanation)
+        for key, explanation in zip(
+            prediction_cache.keys(columns, loaded.cache_id), computed
+        ):
+            prediction_cache.put(key, explanation[0])
+    return explanations
+
+
+def explanation_response(loaded, explanations, threshold, top_k):
+    if explanations:
+        probs, base, contributions = zip(*explanations)
+    else:
+        probs, base, contributions = (), (), np.zeros((0, len(FEATURE_NAMES)))
+    return loaded.explainer.format(probs, base, contributions, threshold, top_k)
+
+
+# Explication locale d'une prédiction : contributions TreeSHAP (log-odds) de
+# chaque champ, triées par importance ; top_k ne garde que les k premières
+@app.post("/explain")
+async def explain(
+    features: CustomerFeatures,
+    threshold: float = Query(0.40, ge=0.0, le=1.0),
+    top_k: Optional[int] = Query(None, ge=1, le=len(FEATURE_NAMES)),
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    telemetry.enter_handler("/explain", loaded.version)
+    model_explainer(loaded)
+    row = features.dict()
+    if explain_batcher is not None:
+        explanation = await explain_batcher.submit(row, loaded)
+    else:
+        explanation = (
+            await run_in_threadpool(explain_columns, loaded, rows_to_columns([row]))
+        )[0]
+    telemetry.count_rows("/explain", loaded.version, 1)
+    (result,) = explanation_response(loaded, [explanation], threshold, top_k)
+    return {
+        **result,
+        "threshold": threshold,
+        "model_version": loaded.version,
+        "units": "log-odds",
+    }
+
+
+# Explications d'un lot (lignes ou colonnes, comme /predict_batch)
+@app.post("/explain_batch")
+def explain_batch(
+    batch: Union[List[CustomerFeatures], ColumnarBatch],
+    threshold: float = Query(0.40, ge=0.0, le=1.0),
+    top_k: Optional[int] = Query(None, ge=1, le=len(FEATURE_NAMES)),
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    model_explainer(loaded)
+    if isinstance(batch, list):
+        columns = rows_to_columns([row.__dict__ for row in batch])
+    else:
+        columns = {name: getattr(batch, name) for name in FEATURE_NAMES}
+        if len({len(values) for values in columns.values()}) > 1:
+            raise HTTPException(
+                status_code=422,
+                detail="Toutes les colonnes doivent avoir la même longueur.",
+            )
+
+    n_rows = len(columns[FEATURE_NAMES[0]])
+    if n_rows > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lot trop volumineux : {n_rows} lignes (max {MAX_BATCH_SIZE}).",
+        )
+    telemetry.enter_handler("/explain_batch", loaded.version)
+    explanations = explain_columns(loaded, columns) if n_rows else []
+    telemetry.count_rows("/explain_batch", loaded.version, n_rows)
+    return {
+        "threshold": threshold,
+        "count": n_rows,
+        "model_version": loaded.version,
+        "units": "log-odds",
+        "explanations": explanation_response(loaded, explanations, threshold, top_k),
+    }
+
+
+# Scoring d'un fichier CSV envoyé en flux : lu, scoré et renvoyé par morceaux
+@app.post("/score_file")
+async def score_file(
+    request: Request,
+    threshold: float = Query(0.40, ge=0.0, le=1.0),
+    chunksize: int = Query(10_000, ge=1, le=1_000_000),
+    id_column: str = "customerID",
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    telemetry.enter_handler("/score_file", loaded.version)
+    # Le corps est écrit sur disque au fil de l'envoi (mémoire constante),
+    # puis relu et scoré morceau par morceau pendant l'envoi de la réponse
+    parquet = "parquet" in request.headers.get("content-type", "")
+    upload = tempfile.NamedTemporaryFile(
+        suffix=".parquet" if parquet else ".csv", delete=False
+    )
+    with upload:
+        async for data in request.stream():
+            upload.write(data)
+
+    from app.bulk import check_columns, iter_chunks, score_frame
+
+    # En-tête validé avant d'envoyer le statut 200 : une erreur dans le flux
+    # ne donnerait au client qu'un CSV tronqué
+    try:
+        await run_in_threadpool(check_columns, upload.name, FEATURE_NAMES)
+    except Exception as e:
+        os.unlink(upload.name)
+        raise HTTPException(status_code=422, detail=f"Fichier invalide : {e}")
+
+    scorer = columns_scorer(loaded, monitored=False)
+
+    def generate():
+        start, n_rows = time.perf_counter(), 0
+        try:
+            for chunk in iter_chunks(upload.name, chunksize):
+                out = score_frame(chunk, scorer, FEATURE_NAMES, threshold, id_column)
+                if audit_log is not None:
+                    audit_frame(
+                        "/score_file",
+                        loaded,
+                        chunk,
+                        out["probability"].to_numpy(),
+                        threshold,
+                    )
+                yield out.to_csv(index=False, header=n_rows == 0)
+                n_rows += len(out)
+        finally:
+            os.unlink(upload.name)
+            telemetry.count_rows("/score_file", loaded.version, n_rows)
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"/score_file : {n_rows} lignes en {elapsed:.2f} s "
+            f"({n_rows / max(elapsed, 1e-9):.0f} lignes/s)"
+        )
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv",
+        headers={"X-Model-Version": loaded.version},
+    )
+
+
+# Top-K des clients les plus à risque d'un fichier envoyé en flux : chaque
+# morceau est réduit à son top-K puis fusionné, mémoire proportionnelle à k.
+# explain=N ajoute les N champs qui contribuent le plus à chaque score.
+@app.post("/rank")
+async def rank(
+    request: Request,
+    k: int = Query(100, ge=1, le=MAX_BATCH_SIZE),
+    chunksize: int = Query(10_000, ge=1, le=1_000_000),
+    id_column: str = "customerID",
+    explain: int = Query(0, ge=0, le=len(FEATURE_NAMES)),
+    threshold: float = Query(0.40, ge=0.0, le=1.0),
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    telemetry.enter_handler("/rank", loaded.version)
+    if explain:
+        model_explainer(loaded)
+    parquet = "parquet" in request.headers.get("content-type", "")
+    upload = tempfile.NamedTemporaryFile(
+        suffix=".parquet" if parquet else ".csv", delete=False
+    )
+    with upload:
+        async for data in request.stream():
+            upload.write(data)
+
+    from app.bulk import check_columns, explain_frame, rank_file
+
+    def run():
+        try:
+            # Même validation de l'en-tête que /score_file
+            check_columns(upload.name, FEATURE_NAMES)
+            top, stats = rank_file(
+                upload.name,
+                None,
+                FEATURE_NAMES,
+                k,
+                chunksize=chunksize,
+                id_column=id_column,
+                scorer=columns_scorer(loaded, monitored=False),
+            )
+        finally:
+            os.unlink(upload.name)
+        telemetry.count_rows("/rank", loaded.version, stats["rows"])
+        if audit_log is not None and len(top):
+            audit_frame("/rank", loaded, top, top["probability"].to_numpy(), threshold)
+        explanations = (
+            explain_frame(loaded.explainer, top, FEATURE_NAMES, threshold, explain)
+            if explain and len(top)
+            else None
+        )
+        return top, stats, explanations
+
+    try:
+        top, stats, explanations = await run_in_threadpool(run)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Fichier invalide : {e}")
+    kept = ["rank", "row", "probability"] + (
+        [id_column] if id_column in top.columns else []
+    )
+    customers = top[kept].to_dict(orient="records")
+    if explanations is not None:
+        for customer, explanation in zip(customers, explanations):
+            customer["contributions"] = explanation["contributions"]
+    return {
+        "k": k,
+        "rows": stats["rows"],
+        "count": len(customers),
+        "model_version": loaded.version,
+        "customers": customers,
+    }
+
+
+# Statistiques du micro-batching
+@app.get("/batching/stats")
+def batching_stats():
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+
+# Débit d'écriture, remplissage du tampon et pertes du journal d'audit
+@app.get("/audit/stats")
+def audit_stats():
+    if audit_log is None:
+        return {"enabled": False}
+    return {"enabled": True, **audit_log.stats()}
+
+
+# Statistiques du cache de prédictions
+@app.get("/cache/stats")
+def cache_stats():
+    if prediction_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_cache.stats()}
+
+
+# Export au format texte Prometheus : latences par route, étapes de la
+# prédiction, requêtes en cours, versions chargées, micro-batching et cache
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+def metrics_prometheus():
+    lines = telemetry.render()
+    lines += [
+        "# HELP churn_model_info Versions de modèle chargées "
+        "(active=1 pour la version servie par défaut)",
+        "# TYPE churn_model_info gauge",
+    ]
+    active = registry.active
+    for version in registry.versions():
+        labels = format_labels(model_version=version)
+        lines.append(f"churn_model_info{{{labels}}} {int(version == active.version)}")
+    lines += [
+        "# HELP churn_ready Modèle préchauffé publié (1) ou en cours de chargement (0)",
+        "# TYPE churn_ready gauge",
+        f"churn_ready {int(active is not None)}",
+    ]
+
+    if batcher is not None:
+        stats = batcher.stats()
+        lines += [
+            "# HELP churn_batch_size Lignes par micro-lot",
+            "# TYPE churn_batch_size histogram",
+            *batcher.batch_sizes.render("churn_batch_size"),
+            "# HELP churn_batch_queue_depth Profondeur de la file à la soumission",
+            "# TYPE churn_batch_queue_depth histogram",
+            *batcher.queue_depths.render("churn_batch_queue_depth"),
+            "# TYPE churn_batch_queue_size gauge",
+            f"churn_batch_queue_size {stats['queue_depth']}",
+        ]
+
+    if prediction_cache is not None:
+        stats = prediction_cache.stats()
+        for name in ("hits", "misses", "evictions", "expirations", "invalidations"):
+            lines += [
+                f"# TYPE churn_cache_{name}_total counter",
+                f"churn_cache_{name}_total {stats[name]}",
+            ]
+        for name in ("entries", "bytes"):
+            lines += [
+                f"# TYPE churn_cache_{name} gauge",
+                f"churn_cache_{name} {stats[name]}",
+            ]
+
+    if audit_log is not None:
+        stats = audit_log.stats()
+        for name in ("accepted", "dropped", "sampled_out", "blocked", "written"):
+            lines += [
+                f"# TYPE churn_audit_{name}_total counter",
+                f"churn_audit_{name}_total {stats[name]}",
+            ]
+        lines += [
+            "# TYPE churn_audit_bytes_written_total counter",
+            f"churn_audit_bytes_written_total {stats['bytes_written']}",
+            "# TYPE churn_audit_flush_seconds_total counter",
+            f"churn_audit_flush_seconds_total {stats['flush_seconds']}",
+            "# HELP churn_audit_buffer_fill_ratio Remplissage du tampon d'audit",
+            "# TYPE churn_audit_buffer_fill_ratio gauge",
+            f"churn_audit_buffer_fill_ratio {stats['fill_ratio']}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+# Probabilités du jeu de test et index des seuils, calculés une fois par version
+@lru_cache(maxsize=MODEL_MAX_LOADED + 1)
+def evaluate(loaded):
+    X_test, y_test = test_set()
+    y_proba = loaded.score_columns(
+        {name: X_test[name] for name in FEATURE_NAMES}, monitored=False
+    )
+    return y_proba, ThresholdIndex(y_test.to_numpy(), y_proba)
+
+
 # Endpoint métriques globales
 @app.get("/metrics")
-def metrics(threshold: float = Query(0.40, ge=0.0, le=1.0)):
-    if X_test is None or y_test is None:
+def metrics(
+    threshold: float = Query(0.40, ge=0.0, le=1.0),
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    if test_set()[0] is None:
         return {
             "error": "Aucun jeu de test n'est disponible pour calculer les métriques."
         }
 
-    y_proba = model.predict_proba(X_test)[:, 1]
-    y_pred = (y_proba >= threshold).astype(int)
-
-    report = classification_report(y_test, y_pred, output_dict=True)
-    pr_auc = average_precision_score(y_test, y_proba)
+    _, index = evaluate(loaded)
+    values = index.metrics(threshold)
 
     return {
         "threshold": threshold,
-        "precision": round(float(report["1"]["precision"]), 3),
-        "recall": round(float(report["1"]["recall"]), 3),
-        "f1_score": round(float(report["1"]["f1-score"]), 3),
-        "accuracy": round(float(report["accuracy"]), 3),
-        "pr_auc": round(float(pr_auc), 3),
+        "precision": round(values["precision"], 3),
+        "recall": round(values["recall"], 3),
+        "f1_score": round(values["f1_score"], 3),
+        "accuracy": round(values["accuracy"], 3),
+        "pr_auc": round(index.pr_auc, 3),
+        "model_version": loaded.version,
+    }
+
+
+# Balayage complet des seuils en une seule réponse
+@app.get("/metrics/curve")
+def metrics_curve(
+    step: float = Query(0.01, gt=0.0, le=0.5),
+    loaded: LoadedModel = Depends(resolve_model),
+):
+    if test_set()[0] is None:
+        return {
+            "error": "Aucun jeu de test n'est disponible pour calculer les métriques."
+        }
+
+    _, index = evaluate(loaded)
+    thresholds = np.round(np.arange(0.0, 1.0 + step / 2, step), 6)
+    return {
+        "pr_auc": round(index.pr_auc, 3),
+        "n_samples": index.n,
+        "n_positive": index.n_pos,
+        "curve": index.curve(thresholds),
     }
 
 
 # Endpoint pour renvoyer toutes les probabilités du jeu de test
 @app.get("/predict_proba_all")
-def predict_proba_all():
-    if X_test is None or model is None:
+def predict_proba_all(loaded: LoadedModel = Depends(resolve_model)):
+    if test_set()[0] is None:
         return {"error": "Le jeu de test ou le modèle n'est pas disponible."}
 
     try:
         # Probabilité de churn (classe positive = 1)
-        y_proba = model.predict_proba(X_test)[:, 1]
+        y_proba, _ = evaluate(loaded)
         return y_proba.tolist()  # conversion en liste pour JSON
     except Exception as e:
         return {"error": str(e)}
+
+
+# Dérive du trafic par rapport au profil de référence de train.py : PSI et KS
+# (sur histogrammes) par feature et sur la probabilité, tous process fusionnés
+@app.get("/monitoring/drift")
+def monitoring_drift(loaded: LoadedModel = Depends(resolve_model)):
+    if loaded.monitor is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Suivi de dérive indisponible pour {loaded.version} "
+            "(MONITORING=0 ou profil de référence absent, relancez train.py).",
+        )
+    return loaded.monitor.report()
+
+
+# Retours terrain (churn constaté des semaines après la prédiction), par lot
+@app.post("/feedback")
+def feedback(items: List[FeedbackItem]):
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lot trop volumineux : {len(items)} retours (max {MAX_BATCH_SIZE}).",
+        )
+    return feedback_store.ingest(
+        (item.prediction_id, item.customer_id, item.churn) for item in items
+    )
+
+
+# Précision, rappel et PR-AUC sur les prédictions des N derniers jours dont le
+# churn réel est connu, lus dans les agrégats mis à jour à chaque retour
+@app.get("/metrics/live")
+def metrics_live(
+    windows: str = Query("7,30,90", pattern=r"^\d+(,\d+)*$"),
+    threshold: float = Query(0.40, ge=0.0, le=1.0),
+    model_version: Optional[str] = Query(None),
+):
+    return {
+        "threshold": threshold,
+        "model_version": model_version,
+        "windows": feedback_store.metrics(
+            [int(days) for days in windows.split(",")], threshold, model_version
+        ),
+    }
+
+
+@app.get("/feedback/stats")
+def feedback_stats():
+    return {
+        **feedback_store.counts(),
+        "log": prediction_log.stats() if prediction_log is not None else None,
+    }
@@ -0,0 +1,553 @@
+import bisect
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import weakref
+
+import numpy as np
+
+logger = logging.getLogger("churn_api")
+
+# Profil de référence écrit par train.py à côté du modèle
+REFERENCE_FILE = "drift_reference.json"
+
+# Buckets des numériques (quantiles du jeu d'entraînement) et des probabilités
+NUM_BUCKETS = 10
+PROBA_BUCKETS = 20
+
+# Seuils usuels du PSI : < 0.1 stable, < 0.25 dérive modérée, au-delà forte
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+PSI_FLOOR = 1e-4  # proportion minimale d'un bucket (évite log(0))
+
+
+# Moniteurs du process, écrits périodiquement par un thread de fond (un par
+# process : relancé après un fork). Références faibles : une version retirée
+# du registre cesse d'être écrite.
+_monitors = weakref.WeakSet()
+_flusher_lock = threading.Lock()
+_flusher_pid = None
+
+
+def _register(monitor):
+    global _flusher_pid
+    with _flusher_lock:
+        _monitors.add(monitor)
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(
+                target=_flush_loop, name="drift-monitor", daemon=True
+            ).start()
+
+
+def _flush_loop():
+    while True:
+        monitors = list(_monitors)
+        time.sleep(min((m.flush_interval_s for m in monitors), default=1.0))
+        now = time.monotonic()
+        for monitor in monitors:
+            if now >= monitor._next_flush:
+                monitor.flush()
+
+
+# Index de bucket d'une valeur : bucket k = [edges[k-1], edges[k]), le premier
+# et le dernier bucket recueillant les valeurs hors de la plage de référence
+def bucketize(edges, values):
+    return np.searchsorted(edges, values, side="right")
+
+
+def proba_edges(n_buckets=PROBA_BUCKETS):
+    return np.linspace(0.0, 1.0, n_buckets + 1)[1:-1]
+
+
+def _moments(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {"mean": float(values.mean()), "var": float(values.var())}
+
+
+# Profil de référence (JSON) : histogrammes des numériques sur des quantiles
+# du jeu d'entraînement, fréquences des catégories apprises par le
+# OneHotEncoder, histogramme des probabilités sur un jeu hors échantillon
+def build_reference(engine, X, probs):
+    profile = {"numeric": {}, "categorical": {}}
+    for name in engine.num_features:
+        values = X[name].to_numpy(dtype=np.float64)
+        quantiles = np.linspace(0.0, 1.0, NUM_BUCKETS + 1)[1:-1]
+        edges = np.unique(np.quantile(values, quantiles))
+        counts = np.bincount(bucketize(edges, values), minlength=len(edges) + 1)
+        profile["numeric"][name] = {
+            "edges": edges.tolist(),
+            "counts": counts.tolist(),
+            **_moments(values),
+        }
+    for name, categories in zip(engine.cat_features, engine.cat_categories):
+        frequencies = X[name].value_counts()
+        counts = [int(frequencies.get(c, 0)) for c in categories]
+        profile["categorical"][name] = {
+            "categories": categories,
+            "counts": counts + [len(X) - sum(counts)],  # dernière case : autres
+        }
+    probs = np.asarray(probs, dtype=np.float64)
+    edges = proba_edges()
+    profile["probability"] = {
+        "edges": edges.tolist(),
+        "counts": np.bincount(
+            bucketize(edges, probs), minlength=len(edges) + 1
+        ).tolist(),
+        **_moments(probs),
+    }
+    profile["n_rows"] = len(X)
+    return profile
+
+
+def save_reference(profile, path):
+    with open(path, "w") as f:
+        json.dump(profile, f)
+
+
+def load_reference(directory):
+    path = os.path.join(directory, REFERENCE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+# Statistiques de flux de taille fixe (indépendante du trafic) : histogrammes,
+# moyenne/variance courantes (Welford) et fréquences des catégories.
+# Deux états se fusionnent par addition des compteurs et formule de Chan.
+class DriftState:
+    def __init__(self, num_sizes, cat_sizes, proba_size):
+        self.num_counts = [np.zeros(k, dtype=np.int64) for k in num_sizes]
+        self.num_n = np.zeros(len(num_sizes), dtype=np.int64)
+        self.num_mean = np.zeros(len(num_sizes))
+        self.num_m2 = np.zeros(len(num_sizes))
+        self.cat_counts = [np.zeros(k, dtype=np.int64) for k in cat_sizes]
+        self.proba_counts = np.zeros(proba_size, dtype=np.int64)
+        self.proba_moments = np.zeros(3)  # n, moyenne, M2
+
+    def shape(self):
+        return (
+            [len(c) for c in self.num_counts],
+            [len(c) for c in self.cat_counts],
+            len(self.proba_counts),
+        )
+
+    @property
+    def n(self):
+        return int(self.proba_moments[0])
+
+    def merge(self, other):
+        for mine, theirs in zip(self.num_counts, other.num_counts):
+            mine += theirs
+        for mine, theirs in zip(self.cat_counts, other.cat_counts):
+            mine += theirs
+        self.proba_counts += other.proba_counts
+        self.num_n, self.num_mean, self.num_m2 = _chan(
+            self.num_n,
+            self.num_mean,
+            self.num_m2,
+            other.num_n,
+            other.num_mean,
+            other.num_m2,
+        )
+        self.proba_moments = np.array(_chan(*self.proba_moments, *other.proba_moments))
+        return self
+
+    def to_arrays(self):
+        arrays = {
+            "num_n": self.num_n,
+            "num_mean": self.num_mean,
+            "num_m2": self.num_m2,
+            "proba_counts": self.proba_counts,
+            "proba_moments": self.proba_moments,
+        }
+        for i, counts in enumerate(self.num_counts):
+            arrays[f"num_counts_{i}"] = counts
+        for i, counts in enumerate(self.cat_counts):
+            arrays[f"cat_counts_{i}"] = counts
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, shape):
+        state = cls(*shape)
+        state.num_n = arrays["num_n"].astype(np.int64)
+        state.num_mean = arrays["num_mean"].astype(np.float64)
+        state.num_m2 = arrays["num_m2"].astype(np.float64)
+        state.proba_counts = arrays["proba_counts"].astype(np.int64)
+        state.proba_moments = arrays["proba_moments"].astype(np.float64)
+        state.num_counts = [
+            arrays[f"num_counts_{i}"].astype(np.int64) for i in range(len(shape[0]))
+        ]
+        state.cat_counts = [
+            arrays[f"cat_counts_{i}"].astype(np.int64) for i in range(len(shape[1]))
+        ]
+        if state.shape() != tuple(shape):
+            raise ValueError("Instantané incompatible avec le profil de référence")
+        return state
+
+
+# Fusion de deux (effectif, moyenne, M2), scalaires ou vecteurs
+def _chan(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    n = n_a + n_b
+    safe_n = np.maximum(n, 1)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / safe_n
+    m2 = m2_a + m2_b + delta**2 * n_a * n_b / safe_n
+    return n, mean, m2
+
+
+def _psi(live, reference):
+    p = np.maximum(live / max(live.sum(), 1), PSI_FLOOR)
+    q = np.maximum(reference / max(reference.sum(), 1), PSI_FLOOR)
+    return float(np.sum((p - q) * np.log(p / q)))
+
+
+# KS sur histogrammes : écart max des fonctions de répartition aux bornes
+# des buckets (borne inférieure du KS exact sur les valeurs brutes)
+def _ks(live, reference):
+    p = np.cumsum(live) / max(live.sum(), 1)
+    q = np.cumsum(reference) / max(reference.sum(), 1)
+    return float(np.max(np.abs(p - q)))
+
+
+def _status(psi):
+    if psi is None:
+        return None
+    if psi < PSI_MODERATE:
+        return "stable"
+    return "moderate" if psi < PSI_SIGNIFICANT else "significant"
+
+
+def _summary(n, mean, m2):
+    n = int(n)
+    return {
+        "n": n,
+        "mean": round(float(mean), 6) if n else None,
+        "std": round(float(np.sqrt(m2 / n)), 6) if n else None,
+    }
+
+
+# Suivi du trafic d'une version de modèle, mis à jour à partir de la matrice
+# encodée (colonnes du ColumnTransformer) et des probabilités renvoyées.
+# Chaque process (worker uvicorn, processus du pool) écrit périodiquement son
+# état dans directory/<version>/<hôte>-<pid>.npz ; /monitoring/drift fusionne
+# l'état en mémoire avec ceux des autres process encore actifs.
+class DriftMonitor:
+    def __init__(
+        self, reference, engine, version, directory=None, flush_interval_s=10.0
+    ):
+        self.reference = reference
+        self.version = version
+        self.directory = (
+            os.path.join(directory, version) if directory is not None else None
+        )
+        self.flush_interval_s = flush_interval_s
+        # Instantanés d'un process arrêté (ou d'un pool remplacé), qui ne sont
+        # plus réécrits, ignorés
+        self.stale_after_s = max(3 * flush_interval_s, 30.0)
+        self.num_features = list(engine.num_features)
+        self.cat_features = list(engine.cat_features)
+        if set(reference["numeric"]) != set(self.num_features) or any(
+            reference["categorical"].get(name, {}).get("categories") != categories
+            for name, categories in zip(self.cat_features, engine.cat_categories)
+        ):
+            raise ValueError("Profil de référence incompatible avec le modèle")
+        self.num_columns = engine.num_columns
+        self.num_mean = engine.num_mean
+        self.num_scale = engine.num_scale
+        self.num_edges = [
+            np.asarray(reference["numeric"][name]["edges"], dtype=np.float64)
+            for name in self.num_features
+        ]
+        # Bornes transposées dans l'espace standardisé de la matrice encodée,
+        # calculées comme l'encodeur ((v - moyenne) / écart-type en float64
+        # puis arrondi au type de la matrice) : une valeur égale à une borne
+        # tombe dans le même bucket qu'à l'entraînement
+        scaled = [
+            (edges - mean) / scale
+            for edges, mean, scale in zip(self.num_edges, self.num_mean, self.num_scale)
+        ]
+        self.scaled_edges = {
+            np.dtype(np.float64): scaled,
+            np.dtype(np.float32): [edges.astype(np.float32) for edges in scaled],
+        }
+        self.proba_edges = np.asarray(
+            reference["probability"]["edges"], dtype=np.float64
+        )
+        # Colonnes one-hot de chaque feature catégorielle, contiguës
+        self.cat_columns = np.concatenate(
+            [
+                np.arange(offset, offset + len(categories))
+                for offset, categories in zip(engine.cat_offsets, engine.cat_categories)
+            ]
+        )
+        self.cat_starts = np.cumsum([0] + [len(c) for c in engine.cat_categories])[:-1]
+        # Itérables précalculés pour le chemin d'une seule ligne
+        self._num_items = {
+            dtype: list(
+                zip(
+                    range(len(self.num_features)),
+                    self.num_columns.tolist(),
+                    self.num_mean.tolist(),
+                    self.num_scale.tolist(),
+                    [e.tolist() for e in edges],
+                )
+            )
+            for dtype, edges in self.scaled_edges.items()
+        }
+        self._cat_items = [
+            (i, offset, offset + len(categories))
+            for i, (offset, categories) in enumerate(
+                zip(engine.cat_offsets, engine.cat_categories)
+            )
+        ]
+        self._proba_edges = self.proba_edges.tolist()
+        self.reset()
+
+    @classmethod
+    def for_model(cls, loaded, directory=None, flush_interval_s=10.0):
+        reference = load_reference(loaded.directory)
+        if reference is None:
+            logger.warning(
+                f"⚠️ Pas de profil de référence pour {loaded.version} "
+                f"({REFERENCE_FILE}) : suivi de dérive désactivé"
+            )
+            return None
+        try:
+            engine = loaded.engine or loaded.decoder.engine
+            return cls(reference, engine, loaded.version, directory, flush_interval_s)
+        except ValueError as e:
+            logger.warning(f"⚠️ Suivi de dérive désactivé ({loaded.version}) : {e}")
+            return None
+
+    def _empty_state(self):
+        return DriftState(
+            [len(edges) + 1 for edges in self.num_edges],
+            [len(c) + 1 for c in self.reference_categories()],
+            len(self.proba_edges) + 1,
+        )
+
+    def reference_categories(self):
+        return [
+            self.reference["categorical"][name]["categories"]
+            for name in self.cat_features
+        ]
+
+    # Aussi après un fork : l'état hérité est déjà compté par le parent, et le
+    # verrou hérité a pu être copié pris par un autre thread
+    def reset(self):
+        self._lock = threading.Lock()
+        self.state = self._empty_state()
+        self._rows = self._row_state()
+        self._next_flush = time.monotonic() + self.flush_interval_s
+        if self.directory is not None:
+            _register(self)
+
+    # --- Mise à jour (chemin de requête) : état préalloué, modifié en place ---
+
+    def update(self, X, probs):
+        if hasattr(X, "toarray"):  # sortie creuse du pipeline sklearn
+            X = X.toarray()
+        if X.dtype not in self.scaled_edges:
+            X = X.astype(np.float64)
+        if len(X) == 1:
+            self._update_row(self._num_items[X.dtype], X[0].tolist(), float(probs[0]))
+        elif len(X):
+            self._update_batch(X, probs)
+
+    # Une ligne : O(1), boucles Python sur des listes précalculées plutôt que
+    # le coût fixe d'une dizaine d'opérations NumPy
+    def _update_row(self, num_items, x, prob):
+        with self._lock:
+            num_counts, num_moments, cat_counts, proba_counts, proba = self._rows
+            for i, col, mean, scale, edges in num_items:
+                num_counts[i][bisect.bisect_right(edges, x[col])] += 1
+                value = x[col] * scale + mean
+                moments = num_moments[i]
+                moments[0] += 1
+                delta = value - moments[1]
+                moments[1] += delta / moments[0]
+                moments[2] += delta * (value - moments[1])
+            for i, start, stop in self._cat_items:
+                # Catégorie inconnue (colonnes à zéro) : dernière case
+                k = stop - start
+                for j in range(start, stop):
+                    if x[j] == 1.0:
+                        k = j - start
+                        break
+                cat_counts[i][k] += 1
+            proba_counts[bisect.bisect_right(self._proba_edges, prob)] += 1
+            proba[0] += 1
+            delta = prob - proba[1]
+            proba[1] += delta / proba[0]
+            proba[2] += delta * (prob - proba[1])
+
+    # Accumulateur des lignes isolées en listes Python (un incrément de liste
+    # coûte ~5x moins qu'un incrément d'élément NumPy), versé dans l'état
+    # NumPy à chaque lecture
+    def _row_state(self):
+        shape = self.state.shape()
+        return (
+            [[0] * k for k in shape[0]],
+            [[0, 0.0, 0.0] for _ in shape[0]],
+            [[0] * k for k in shape[1]],
+            [0] * shape[2],
+            [0, 0.0, 0.0],
+        )
+
+    def _fold(self):
+        num_counts, num_moments, cat_counts, proba_counts, proba = self._rows
+        if not proba[0]:
+            return
+        rows = self._empty_state()
+        rows.num_counts = [np.array(c, dtype=np.int64) for c in num_counts]
+        rows.num_n, rows.num_mean, rows.num_m2 = (
+            np.array(column) for column in zip(*num_moments)
+        )
+        rows.cat_counts = [np.array(c, dtype=np.int64) for c in cat_counts]
+        rows.proba_counts = np.array(proba_counts, dtype=np.int64)
+        rows.proba_moments = np.array(proba, dtype=np.float64)
+        self.state.merge(rows)
+        self._rows = self._row_state()
+
+    def _update_batch(self, X, probs):
+        scaled = np.nan_to_num(X[:, self.num_columns])
+        values = scaled * self.num_scale + self.num_mean
+        onehot = X[:, self.cat_columns] == 1
+        known = np.add.reduceat(onehot.sum(axis=0), self.cat_starts)
+        batch = self._empty_state()
+        for i, edges in enumerate(self.scaled_edges[X.dtype]):
+            batch.num_counts[i] += np.bincount(
+                bucketize(edges, scaled[:, i]), minlength=len(edges) + 1
+            )
+        for i, (start, stop) in enumerate(
+            zip(self.cat_starts, [*self.cat_starts[1:], onehot.shape[1]])
+        ):
+            batch.cat_counts[i][:-1] = onehot[:, start:stop].sum(axis=0)
+            batch.cat_counts[i][-1] = len(X) - known[i]
+        batch.num_n[:] = len(X)
+        batch.num_mean = values.mean(axis=0)
+        batch.num_m2 = ((values - batch.num_mean) ** 2).sum(axis=0)
+        probs = np.asarray(probs, dtype=np.float64)
+        batch.proba_counts += np.bincount(
+            bucketize(self.proba_edges, probs), minlength=len(self.proba_edges) + 1
+        )
+        mean = probs.mean()
+        batch.proba_moments = np.array([len(probs), mean, ((probs - mean) ** 2).sum()])
+        with self._lock:
+            self.state.merge(batch)
+
+    # --- Partage entre process ---
+
+    def _snapshot_path(self):
+        name = f"{socket.gethostname()}-{os.getpid()}.npz"
+        return os.path.join(self.directory, name)
+
+    def snapshot(self):
+        with self._lock:
+            self._fold()
+            return DriftState(*self.state.shape()).merge(self.state)
+
+    # Écriture atomique (fichier temporaire puis rename)
+    def flush(self):
+        self._next_flush = time.monotonic() + self.flush_interval_s
+        if self.directory is None:
+            return
+        path = self._snapshot_path()
+        tmp = f"{path}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.savez(f, **self.snapshot().to_arrays())
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Instantané de dérive non écrit ({path}) : {e}")
+
+    def merged_state(self):
+        state = self.snapshot()
+        if self.directory is None or not os.path.isdir(self.directory):
+            return state, 1
+        own, now, n_processes = self._snapshot_path(), time.time(), 1
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".npz") or path == own:
+                continue
+            try:
+                if now - os.path.getmtime(path) > self.stale_after_s:
+                    continue
+                with np.load(path) as arrays:
+                    state.merge(DriftState.from_arrays(arrays, state.shape()))
+                n_processes += 1
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Instantané de dérive ignoré ({name}) : {e}")
+        return state, n_processes
+
+    # --- Rapport ---
+
+    def report(self):
+        state, n_processes = self.merged_state()
+        live = state.n
+        reference = self.reference
+
+        def drift(live_counts, ref_counts, with_ks):
+            ref_counts = np.asarray(ref_counts, dtype=np.float64)
+            if not live:
+                return {"psi": None, "ks": None} if with_ks else {"psi": None}
+            result = {"psi": round(_psi(live_counts, ref_counts), 6)}
+            if with_ks:
+                result["ks"] = round(_ks(live_counts, ref_counts), 6)
+            return result
+
+        features = {}
+        for i, name in enumerate(self.num_features):
+            ref = reference["numeric"][name]
+            features[name] = {
+                "type": "numeric",
+                **drift(state.num_counts[i], ref["counts"], True),
+                "live": _summary(state.num_n[i], state.num_mean[i], state.num_m2[i]),
+                "reference": {
+                    "mean": round(ref["mean"], 6),
+                    "std": round(float(np.sqrt(ref["var"])), 6),
+                },
+            }
+        for i, name in enumerate(self.cat_features):
+            ref = reference["categorical"][name]
+            counts = state.cat_counts[i]
+            features[name] = {
+                "type": "categorical",
+                **drift(counts, ref["counts"], False),
+                "live": dict(zip([*ref["categories"], "__other__"], counts.tolist())),
+            }
+        for values in features.values():
+            values["status"] = _status(values["psi"])
+
+        ref = reference["probability"]
+        n, mean, m2 = state.proba_moments
+        probability = {
+            **drift(state.proba_counts, ref["counts"], True),
+            "live": _summary(n, mean, m2),
+            "reference": {
+                "mean": round(ref["mean"], 6),
+                "std": round(float(np.sqrt(ref["var"])), 6),
+            },
+        }
+        probability["status"] = _status(probability["psi"])
+
+        return {
+            "model_version": self.version,
+            "n_live": live,
+            "n_reference": reference["n_rows"],
+            "n_processes": n_processes,
+            "thresholds": {"moderate": PSI_MODERATE, "significant": PSI_SIGNIFICANT},
+            "probability": probability,
+            "drifted_features": sorted(
+                name
+                for name, values in features.items()
+                if values["status"] == "significant"
+            ),
+            "features": features,
+        }
@@ -0,0 +1,166 @@
+import json
+import os
+
+import numpy as np
+
+from app.evaluation import ThresholdIndex
+
+POLICIES_FILE = "policies.json"
+
+
+# Points de fonctionnement atteignables sur un jeu annoté : un par score
+# distinct (prédire churn si score >= seuil), plus "aucun positif".
+# Renvoie seuils, prédits positifs et vrais positifs, seuils décroissants.
+def operating_points(index):
+    scores = index.scores_desc
+    ends = np.r_[np.where(np.diff(scores))[0], index.n - 1] + 1
+    thresholds = np.r_[np.nextafter(np.float64(scores[0]), np.inf), scores[ends - 1]]
+    k = np.r_[0, ends]
+    return thresholds.astype(np.float64), k, index.cum_tp[k]
+
+
+def _point(index, thresholds, k, tp, i):
+    return {
+        "threshold": float(thresholds[i]),
+        "precision": round(float(tp[i] / k[i]), 4) if k[i] else 0.0,
+        "recall": round(float(tp[i] / index.n_pos), 4) if index.n_pos else 0.0,
+        "predicted_positive_rate": round(float(k[i] / index.n), 4),
+    }
+
+
+# Rappel maximal sous contrainte de précision minimale (None si aucun seuil
+# n'atteint la précision demandée)
+def max_recall_at_precision(y_true, y_score, precision_floor):
+    index = ThresholdIndex(y_true, y_score)
+    thresholds, k, tp = operating_points(index)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(k > 0, tp / np.maximum(k, 1), 0.0)
+    feasible = np.flatnonzero((precision >= precision_floor) & (k > 0))
+    if not len(feasible) or not index.n_pos:
+        return None
+    # Rappel maximal ; à rappel égal, le seuil le plus haut (meilleure précision)
+    best = feasible[np.argmax(tp[feasible])]
+    return _point(index, thresholds, k, tp, best)
+
+
+# Seuil de coût total minimal : cost_fn par churner manqué, cost_fp par
+# client fidèle ciblé à tort
+def min_cost(y_true, y_score, cost_fn, cost_fp):
+    index = ThresholdIndex(y_true, y_score)
+    thresholds, k, tp = operating_points(index)
+    cost = cost_fn * (index.n_pos - tp) + cost_fp * (k - tp)
+    best = int(np.argmin(cost))
+    return {
+        **_point(index, thresholds, k, tp, best),
+        "cost_per_customer": round(float(cost[best] / index.n), 4),
+    }
+
+
+# Politiques de seuil précalculées sur le jeu de test : globales et par
+# segment (une valeur de seuil par modalité, seuil global pour les modalités
+# trop rares ou absentes)
+def build_policies(
+    y_true,
+    y_score,
+    segments,
+    precision_floors=(0.5,),
+    cost_fn=5.0,
+    cost_fp=1.0,
+    min_segment_size=50,
+):
+    y_true = np.asarray(y_true).astype(np.int64)
+    y_score = np.asarray(y_score, dtype=np.float64)
+    rules = {
+        f"max_recall_p{round(floor * 100):02d}": (
+            {"kind": "max_recall", "precision_floor": floor},
+            lambda y, s, floor=floor: max_recall_at_precision(y, s, floor),
+        )
+        for floor in precision_floors
+    }
+    rules["min_cost"] = (
+        {"kind": "min_cost", "cost_fn": cost_fn, "cost_fp": cost_fp},
+        lambda y, s: min_cost(y, s, cost_fn, cost_fp),
+    )
+
+    policies = {}
+    for name, (params, rule) in rules.items():
+        point = rule(y_true, y_score)
+        if point is None:
+            continue
+        policies[name] = {**params, **point}
+        for segment, values in segments.items():
+            values = np.asarray(values, dtype=object)
+            thresholds = {}
+            for value in sorted(set(values.tolist()), key=str):
+                mask = values == value
+                if mask.sum() < min_segment_size or not y_true[mask].any():
+                    continue
+                segment_point = rule(y_true[mask], y_score[mask])
+                if segment_point is not None:
+                    thresholds[str(value)] = {
+                        **segment_point,
+                        "n_samples": int(mask.sum()),
+                    }
+            policies[f"{name}_by_{segment}"] = {
+                **params,
+                "segment": segment,
+                "threshold": point["threshold"],
+                "segments": thresholds,
+            }
+    return {"n_samples": len(y_true), "policies": policies}
+
+
+def save_policies(policies, path):
+    with open(path, "w") as f:
+        json.dump(policies, f, indent=2)
+
+
+# Politiques chargées : le seuil d'une requête se lit en deux accès dict
+# (politique, puis modalité du segment), sans balayage
+class ThresholdPolicies:
+    def __init__(self, policies):
+        self.description = policies
+        self._rules = {}
+        for name, policy in policies["policies"].items():
+            by_value = {
+                value: point["threshold"]
+                for value, point in policy.get("segments", {}).items()
+            }
+            self._rules[name] = (policy.get("segment"), by_value, policy["threshold"])
+
+    @classmethod
+    def load(cls, directory):
+        path = os.path.join(directory, POLICIES_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def __contains__(self, name):
+        return name in self._rules
+
+    def names(self):
+        return sorted(self._rules)
+
+    # Feature de segmentation de la politique (None pour une politique globale)
+    def segment(self, name):
+        return self._rules[name][0]
+
+    # KeyError si la politique est inconnue
+    def threshold(self, name, row):
+        segment, by_value, default = self._rules[name]
+        if segment is None:
+            return default
+        return by_value.get(str(row[segment]), default)
+
+    # Seuils d'un lot, à partir des valeurs de la feature de segmentation
+    # (ignorées pour une politique globale)
+    def thresholds(self, name, values, n_rows):
+        segment, by_value, default = self._rules[name]
+        if segment is None:
+            return np.full(n_rows, default)
+        return np.fromiter(
+            (by_value.get(str(v), default) for v in values),
+            dtype=np.float64,
+            count=n_rows,
+        )
@@ -0,0 +1,431 @@
+import logging
+import os
+import threading
+import time
+
+from app.engine import CompiledEngine
+from app.policies import POLICIES_FILE, ThresholdPolicies
+from app.schemas import FEATURE_NAMES
+from app.variants import VARIANTS_DIR
+
+logger = logging.getLogger("churn_api")
+
+# Fichiers d'un modèle (à la racine de app/model/ ou dans versions/<version>/)
+PIPELINE_FILE = "xgb_churn_pipeline.pkl"
+BOOSTER_FILE = "xgb_churn_booster.ubj"
+PREPROCESSING_FILE = "preprocessing.npz"
+# policies.json fait partie de l'empreinte : le modifier recharge la version
+MODEL_FILES = (PIPELINE_FILE, BOOSTER_FILE, PREPROCESSING_FILE, POLICIES_FILE)
+
+# Version des fichiers posés directement à la racine de app/model/
+DEFAULT_VERSION = "default"
+# Noms des versions de app/model/versions/ (train.py --version)
+VERSION_FORMAT = "%Y%m%d-%H%M%S"
+
+
+# Un modèle chargé et prêt à scorer. Les requêtes en gardent une référence
+# du début à la fin : un échange de version ne les affecte pas.
+class LoadedModel:
+    def __init__(self, version, directory, fingerprint, engine=None, model=None):
+        self.version = version
+        self.directory = directory
+        self.fingerprint = fingerprint
+        # Clé du cache de prédictions : change si les fichiers de la version
+        # sont remplacés sous le même nom
+        self.cache_id = f"{version}@{hash(fingerprint):x}"
+        self.engine = engine
+        self.model = model
+        self.monitor = None  # DriftMonitor, attaché par le registre après warm-up
+        # Politiques de seuil précalculées par train.py (None si absentes)
+        self.policies = ThresholdPolicies.load(directory)
+        self._decoder = None
+        self._explainer = None
+
+    # Décodage rapide (orjson + vocabulaires du OneHotEncoder), construit au
+    # premier usage ; ValueError si le pipeline n'est pas compilable
+    @property
+    def decoder(self):
+        if self._decoder is None:
+            from app.decoding import FastDecoder
+
+            engine = self.engine or CompiledEngine.from_pipeline(self.model)
+            self._decoder = FastDecoder(engine)
+        return self._decoder
+
+    # Explications TreeSHAP par champ, même moteur que le décodage rapide
+    @property
+    def explainer(self):
+        if self._explainer is None:
+            from app.explain import Explainer
+
+            self._explainer = Explainer(self.decoder.engine)
+        return self._explainer
+
+    # Scoring d'un lot de lignes (dicts) en un seul appel predict_proba.
+    # observe(étape, secondes, version), optionnel, reçoit la durée de chaque
+    # étape : construction des features, préprocessing, predict du booster
+    def score_rows(self, rows, observe=None):
+        if self.engine is not None:
+            return self._score_encoded(self.engine.encode_rows, rows, observe)
+        import pandas as pd
+
+        t0 = time.perf_counter()
+        X = pd.DataFrame(rows, columns=FEATURE_NAMES)
+        if observe is not None:
+            observe("features", time.perf_counter() - t0, self.version)
+        return self._score_frame(X, observe)
+
+    # Idem pour un lot en forme colonnaire {feature: [valeurs]} ; monitored=False
+    # pour un scoring hors trafic (jeu de test) exclu du suivi de dérive
+    def score_columns(self, columns, observe=None, monitored=True):
+        if self.engine is not None:
+            return self._score_encoded(
+                self.engine.encode_columns, columns, observe, monitored
+            )
+        import pandas as pd
+
+        t0 = time.perf_counter()
+        X = pd.DataFrame(columns)
+        if observe is not None:
+            observe("features", time.perf_counter() - t0, self.version)
+        return self._score_frame(X, observe, monitored)
+
+    def predict_row(self, row, observe=None):
+        if self.engine is not None:
+            return float(self._score_encoded(self.engine.encode_row, row, observe)[0])
+        return float(self.score_rows([row], observe)[0])
+
+    # Moteur compilé : l'encodage NumPy construit directement la matrice
+    # préprocessée, il n'y a pas d'étape "features" distincte
+    def _score_encoded(self, encode, data, observe, monitored=True):
+        if observe is None:
+            X = encode(data)
+            probs = self.engine.predict_proba(X)
+        else:
+            t0 = time.perf_counter()
+            X = encode(data)
+            t1 = time.perf_counter()
+            probs = self.engine.predict_proba(X)
+            observe("preprocessing", t1 - t0, self.version)
+            observe("predict", time.perf_counter() - t1, self.version)
+        if monitored:
+            self.track(X, probs)
+        return probs
+
+    def _score_frame(self, X, observe, monitored=True):
+        t0 = time.perf_counter()
+        for _, step in self.model.steps[:-1]:
+            X = step.transform(X)
+        t1 = time.perf_counter()
+        probs = self.model.steps[-1][1].predict_proba(X)[:, 1]
+        if observe is not None:
+            observe("preprocessing", t1 - t0, self.version)
+            observe("predict", time.perf_counter() - t1, self.version)
+        if monitored:
+            self.track(X, probs)
+        return probs
+
+    # Suivi de dérive : matrice préprocessée et probabilités d'un lot scoré
+    def track(self, X, probs):
+        if self.monitor is not None:
+            self.monitor.update(X, probs)
+
+    # Ligne servie sans appel au modèle (cache de prédictions) : réencodée
+    # pour le suivi de dérive, sans predict
+    def track_row(self, row, prob):
+        if self.monitor is None:
+            return
+        if self.engine is not None:
+            X = self.engine.encode_row(row)
+        else:
+            import pandas as pd
+
+            X = pd.DataFrame([row], columns=FEATURE_NAMES)
+            for _, step in self.model.steps[:-1]:
+                X = step.transform(X)
+        self.monitor.update(X, [prob])
+
+
+def _fingerprint(directory):
+    fingerprint = []
+    for name in MODEL_FILES:
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        fingerprint.append((name, st.st_mtime_ns, st.st_size))
+    return tuple(fingerprint)
+
+
+# Date de publication d'une version : son nom horodaté (train.py), sinon la
+# date de modification de son dossier, pour qu'un nom libre posé à la main ne
+# passe pas devant les versions datées par simple ordre alphabétique
+def _published_at(name, directory):
+    try:
+        return time.mktime(time.strptime(name, VERSION_FORMAT)), name
+    except ValueError:
+        return os.stat(directory).st_mtime, name
+
+
+def _has_model(fingerprint):
+    names = {name for name, _, _ in fingerprint}
+    return PIPELINE_FILE in names or {BOOSTER_FILE, PREPROCESSING_FILE} <= names
+
+
+# Le pipeline joblib ne se charge qu'avec scikit-learn, absent de l'image API
+def require_sklearn(reason):
+    try:
+        import sklearn  # noqa: F401
+    except ImportError:
+        raise RuntimeError(
+            f"scikit-learn n'est pas installé ({reason}) : utilisez le moteur "
+            "compilé et l'artefact compact de train.py, ou installez requirements.txt"
+        ) from None
+
+
+# Chargement d'une version : artefact compact (sans sklearn) si le moteur
+# compilé est demandé, sinon pipeline joblib
+def load_model(
+    version,
+    directory,
+    inference_engine="compiled",
+    tree_backend="xgboost",
+    tree_max_rows=None,
+):
+    fingerprint = _fingerprint(directory)
+    booster_path = os.path.join(directory, BOOSTER_FILE)
+    preprocessing_path = os.path.join(directory, PREPROCESSING_FILE)
+    pipeline_path = os.path.join(directory, PIPELINE_FILE)
+
+    if (
+        inference_engine == "compiled"
+        and os.path.exists(booster_path)
+        and os.path.exists(preprocessing_path)
+    ):
+        engine = CompiledEngine.load(booster_path, preprocessing_path)
+        _compile_trees(engine, version, tree_backend, tree_max_rows)
+        logger.info(f"✅ Modèle {version} : moteur compilé chargé depuis {directory}")
+        return LoadedModel(version, directory, fingerprint, engine=engine)
+
+    if not os.path.exists(pipeline_path):
+        raise FileNotFoundError(
+            f"Modèle introuvable : {pipeline_path}. Exécutez train.py au préalable."
+        )
+    require_sklearn(f"{version} : seul {PIPELINE_FILE} est disponible")
+    import joblib
+
+    model = joblib.load(pipeline_path)
+    engine = None
+    if inference_engine == "compiled":
+        try:
+            engine = CompiledEngine.from_pipeline(model)
+        except Exception as e:
+            logger.warning(f"⚠️ Moteur compilé indisponible ({version}) : {e}")
+        else:
+            _compile_trees(engine, version, tree_backend, tree_max_rows)
+    logger.info(f"✅ Modèle {version} : pipeline chargé depuis {pipeline_path}")
+    return LoadedModel(version, directory, fingerprint, engine=engine, model=model)
+
+
+# Évaluateur d'arbres aplati pour les petits lots ; le booster reste utilisé
+# si le modèle ou le backend n'est pas supporté
+def _compile_trees(engine, version, tree_backend, tree_max_rows):
+    if tree_backend == "xgboost":
+        return
+    try:
+        engine.compile_trees(tree_backend, tree_max_rows)
+    except ValueError as e:
+        logger.warning(
+            f"⚠️ Backend d'arbres {tree_backend} indisponible ({version}) : {e}"
+        )
+
+
+# Registre multi-versions : surveille app/model/ (et app/model/versions/),
+# charge et préchauffe les nouvelles versions en tâche de fond puis les
+# publie par simple réassignation (atomique) du dictionnaire des versions
+class ModelRegistry:
+    def __init__(
+        self,
+        model_dir,
+        inference_engine="compiled",
+        tree_backend="xgboost",
+        tree_max_rows=None,
+        warmup=None,
+        poll_interval_s=5.0,
+        max_loaded=3,
+        monitor_factory=None,
+    ):
+        self.model_dir = model_dir
+        self.versions_dir = os.path.join(model_dir, "versions")
+        self.inference_engine = inference_engine
+        self.tree_backend = tree_backend
+        self.tree_max_rows = tree_max_rows
+        self.warmup = warmup
+        self.poll_interval_s = poll_interval_s
+        self.max_loaded = max_loaded
+        self.monitor_factory = monitor_factory
+        self._models = {}  # version -> LoadedModel, jamais modifié en place
+        self._active = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self._last_error = None
+        self._failed = {}  # version -> empreinte des fichiers en échec
+
+    # --- Lecture (chemin chaud) ---
+
+    @property
+    def active(self):
+        return self._active
+
+    def get(self, version=None):
+        if version is None:
+            return self._active
+        return self._models[version]  # KeyError si version non chargée
+
+    def versions(self):
+        return sorted(self._models)
+
+    def on_swap(self, callback):
+        self._listeners.append(callback)
+
+    # --- Découverte et chargement ---
+
+    def discover(self):
+        found = {}
+        fingerprint = _fingerprint(self.model_dir)
+        if _has_model(fingerprint):
+            found[DEFAULT_VERSION] = (self.model_dir, fingerprint)
+        if os.path.isdir(self.versions_dir):
+            for name in os.listdir(self.versions_dir):
+                # Les dossiers cachés sont des versions en cours d'écriture
+                directory = os.path.join(self.versions_dir, name)
+                if name.startswith(".") or not os.path.isdir(directory):
+                    continue
+                fingerprint = _fingerprint(directory)
+                if _has_model(fingerprint):
+                    found[name] = (directory, fingerprint)
+        # Variantes allégées de chaque version (train.py), nommées "<version>/<nom>"
+        for version, (directory, _) in list(found.items()):
+            variants_dir = os.path.join(directory, VARIANTS_DIR)
+            if not os.path.isdir(variants_dir):
+                continue
+            for name in os.listdir(variants_dir):
+                directory = os.path.join(variants_dir, name)
+                if name.startswith(".") or not os.path.isdir(directory):
+                    continue
+                fingerprint = _fingerprint(directory)
+                if _has_model(fingerprint):
+                    found[f"{version}/{name}"] = (directory, fingerprint)
+        return found
+
+    def _wanted(self, found):
+        # Les max_loaded versions les plus récentes, la version racine n'étant
+        # gardée que s'il n'y a pas de versions datées
+        versions = [v for v in found if "/" not in v and v != DEFAULT_VERSION]
+        dated = sorted(versions, key=lambda v: _published_at(v, found[v][0]))
+        dated = dated[-self.max_loaded :]
+        if not dated and DEFAULT_VERSION in found:
+            return [DEFAULT_VERSION]
+        return dated
+
+    def refresh(self):
+        found = self.discover()
+        wanted = self._wanted(found)
+        if not wanted:
+            raise FileNotFoundError(
+                f"Aucun modèle dans {self.model_dir}. Exécutez train.py au préalable."
+            )
+        # Variantes des versions gardées, jamais actives par défaut ; elles
+        # n'existent qu'en artefact compact (moteur compilé)
+        variants = (
+            sorted(v for v in found if v.split("/")[0] in wanted and "/" in v)
+            if self.inference_engine == "compiled"
+            else []
+        )
+        models = {}
+        # Une version illisible est ignorée (erreur journalisée une fois, pas
+        # de nouvel essai tant que ses fichiers ne changent pas) sans empêcher
+        # le chargement des autres
+        self._failed = {v: f for v, f in self._failed.items() if v in found}
+        for version in wanted + variants:
+            directory, fingerprint = found[version]
+            current = self._models.get(version)
+            if current is not None and current.fingerprint == fingerprint:
+                models[version] = current
+                continue
+            if self._failed.get(version) == fingerprint:
+                continue
+            try:
+                loaded = load_model(
+                    version,
+                    directory,
+                    self.inference_engine,
+                    self.tree_backend,
+                    self.tree_max_rows,
+                )
+                if self.warmup is not None:
+                    self.warmup(loaded)
+                # Après le warm-up, qui ne doit pas compter dans le trafic suivi
+                if self.monitor_factory is not None:
+                    loaded.monitor = self.monitor_factory(loaded)
+            except Exception as e:
+                logger.error(f"Version {version} ignorée : {e}")
+                self._failed[version] = fingerprint
+                continue
+            models[version] = loaded
+
+        loadable = [v for v in wanted if v in models]
+        if not loadable:
+            raise RuntimeError(
+                f"Aucune version chargeable parmi {', '.join(wanted)} dans {self.model_dir}"
+            )
+        active = models[loadable[-1]]
+        changed = models != self._models or active is not self._active
+        # Publication atomique : les lecteurs voient l'ancien ou le nouvel état
+        self._models = models
+        self._active = active
+        if changed:
+            logger.info(
+                f"Modèle actif : {active.version} (chargés : {', '.join(sorted(models))})"
+            )
+            for callback in self._listeners:
+                callback(active)
+        return changed
+
+    # --- Surveillance en tâche de fond ---
+
+    # load=True : premier chargement dans le thread de surveillance (le
+    # serveur démarre sans attendre le modèle, active reste None d'ici là)
+    def start(self, load=False):
+        if self._thread is not None or (self.poll_interval_s <= 0 and not load):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, args=(load,), name="model-registry", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval_s + 1)
+            self._thread = None
+
+    def _watch(self, load=False):
+        if load:
+            self._try_refresh()
+        while self.poll_interval_s > 0 and not self._stop.wait(self.poll_interval_s):
+            self._try_refresh()
+
+    def _try_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Une version illisible ou absente n'interrompt pas le service ;
+            # la même erreur n'est journalisée qu'une fois
+            if str(e) != self._last_error:
+                logger.error(f"Rechargement du modèle échoué : {e}")
+            self._last_error = str(e)
+        else:
+            self._last_error = None
@@ -0,0 +1,62 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, create_model
+
+
+# Schéma d'entrée
+class CustomerFeatures(BaseModel):
+    gender: str
+    SeniorCitizen: int
+    Partner: str
+    Dependents: str
+    tenure: int
+    PhoneService: str
+    MultipleLines: str
+    InternetService: str
+    OnlineSecurity: str
+    OnlineBackup: str
+    DeviceProtection: str
+    TechSupport: str
+    StreamingTV: str
+    StreamingMovies: str
+    Contract: str
+    PaperlessBilling: str
+    PaymentMethod: str
+    MonthlyCharges: float
+    TotalCharges: float
+
+
+FEATURE_NAMES = list(CustomerFeatures.__annotations__)
+
+
+# Retour terrain : churn constaté pour une prédiction servie par /predict
+class FeedbackItem(BaseModel):
+    prediction_id: str
+    customer_id: Optional[str] = None
+    churn: bool
+
+
+# Forme colonnaire : une liste de valeurs par feature
+ColumnarBatch = create_model(
+    "ColumnarBatch",
+    **{name: (List[tp], ...) for name, tp in CustomerFeatures.__annotations__.items()},
+)
+
+
+# Features numériques (les autres sont catégorielles)
+NUM_FEATURES = [
+    name for name, tp in CustomerFeatures.__annotations__.items() if tp in (int, float)
+]
+
+# Features entières (les autres numériques sont des float)
+INT_FEATURES = [
+    name for name, tp in CustomerFeatures.__annotations__.items() if tp is int
+]
+
+# Bornes (min, max) des features numériques, vérifiées par le décodage rapide
+NUM_BOUNDS = {
+    "SeniorCitizen": (0, 1),
+    "tenure": (0, None),
+    "MonthlyCharges": (0.0, None),
+    "TotalCharges": (0.0, None),
+}
@@ -0,0 +1,235 @@
+import bisect
+import contextvars
+import logging
+import random
+import threading
+import time
+from itertools import accumulate
+
+from fastapi.responses import ORJSONResponse
+
+logger = logging.getLogger("churn_api")
+
+# Bornes des histogrammes, en secondes
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+STAGE_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.1,
+)
+
+
+# Histogramme à buckets fixes (bornes supérieures inclusives)
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # dernier bucket = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()  # observé depuis la boucle et les threads
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def to_dict(self):
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "buckets": dict(zip(bounds, self.counts)),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+    # Lignes au format texte Prometheus (buckets cumulés)
+    def render(self, name, labels=""):
+        sep = "," if labels else ""
+        bounds = [repr(float(b)) for b in self.buckets] + ["+Inf"]
+        with self._lock:
+            counts, total, count = list(accumulate(self.counts)), self.sum, self.count
+        lines = [
+            f'{name}_bucket{{{labels}{sep}le="{le}"}} {n}'
+            for le, n in zip(bounds, counts)
+        ]
+        lines.append(f"{name}_sum{{{labels}}} {total}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+        return lines
+
+
+def format_labels(**labels):
+    return ",".join(f'{k}="{v}"' for k, v in labels.items())
+
+
+# Requête en cours : créée par le middleware, complétée par le handler
+# (version du modèle) et lue par la sérialisation de la réponse
+class RequestContext:
+    __slots__ = ("start", "model_version")
+
+    def __init__(self, start):
+        self.start = start
+        self.model_version = ""
+
+
+_current = contextvars.ContextVar("churn_request", default=None)
+
+
+# Compteurs agrégés du process, exportés par /metrics/prometheus
+class Telemetry:
+    def __init__(self):
+        self.requests = {}  # (méthode, route, statut, version) -> Histogram
+        self.stages = {}  # (étape, version) -> Histogram
+        self.rows = {}  # (route, version) -> lignes scorées
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _histogram(self, table, key, buckets):
+        hist = table.get(key)
+        if hist is None:
+            with self._lock:
+                hist = table.setdefault(key, Histogram(buckets))
+        return hist
+
+    def observe_request(self, method, route, status, version, seconds):
+        key = (method, route, status, version)
+        self._histogram(self.requests, key, LATENCY_BUCKETS).observe(seconds)
+
+    def observe_stage(self, stage, seconds, version=""):
+        self._histogram(self.stages, (stage, version), STAGE_BUCKETS).observe(seconds)
+
+    def count_rows(self, route, version, n):
+        with self._lock:
+            self.rows[route, version] = self.rows.get((route, version), 0) + n
+
+    # Début du handler : fin de la validation (routage, lecture et
+    # validation du corps), version du modèle attachée à la requête. Les
+    # lignes sont comptées à part (count_rows), une fois scorées
+    def enter_handler(self, route, version):
+        ctx = _current.get()
+        if ctx is not None:
+            ctx.model_version = version
+            self.observe_stage("validation", time.perf_counter() - ctx.start, version)
+
+    # Temps écoulé depuis l'arrivée de la requête en cours (None hors requête)
+    def elapsed(self):
+        ctx = _current.get()
+        return time.perf_counter() - ctx.start if ctx is not None else None
+
+    def render(self):
+        with self._lock:
+            requests = sorted(self.requests.items())
+            stages = sorted(self.stages.items())
+            rows = sorted(self.rows.items())
+        lines = [
+            "# HELP churn_http_request_duration_seconds Latence des requêtes HTTP",
+            "# TYPE churn_http_request_duration_seconds histogram",
+        ]
+        for (method, route, status, version), hist in requests:
+            labels = format_labels(
+                method=method, route=route, status=status, model_version=version
+            )
+            lines += hist.render("churn_http_request_duration_seconds", labels)
+        lines += [
+            "# HELP churn_stage_duration_seconds Durée par étape de la prédiction",
+            "# TYPE churn_stage_duration_seconds histogram",
+        ]
+        for (stage, version), hist in stages:
+            labels = format_labels(stage=stage, model_version=version)
+            lines += hist.render("churn_stage_duration_seconds", labels)
+        lines += [
+            "# HELP churn_predictions_total Lignes scorées",
+            "# TYPE churn_predictions_total counter",
+        ]
+        for (route, version), n in rows:
+            labels = format_labels(route=route, model_version=version)
+            lines.append(f"churn_predictions_total{{{labels}}} {n}")
+        lines += [
+            "# HELP churn_http_requests_in_flight Requêtes HTTP en cours",
+            "# TYPE churn_http_requests_in_flight gauge",
+            f"churn_http_requests_in_flight {self.in_flight}",
+        ]
+        return lines
+
+
+telemetry = Telemetry()
+
+
+# Middleware ASGI pur (sans BaseHTTPMiddleware ni objet Request) : latence par
+# route, requêtes en cours, et log INFO d'une fraction des requêtes seulement
+class TelemetryMiddleware:
+    def __init__(self, app, log_sample_rate=0.0):
+        self.app = app
+        self.log_sample_rate = log_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        ctx = RequestContext(time.perf_counter())
+        token = _current.set(ctx)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        telemetry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            telemetry.in_flight -= 1
+            _current.reset(token)
+            duration = time.perf_counter() - ctx.start
+            # Route déclarée (ex. /metrics/curve) et non le chemin brut :
+            # cardinalité bornée
+            route = scope.get("route")
+            path = route.path if route is not None else "other"
+            telemetry.observe_request(
+                scope["method"], path, str(status), ctx.model_version, duration
+            )
+            if self.log_sample_rate and random.random() < self.log_sample_rate:
+                logger.info(
+                    f"{scope['method']} {scope['path']} - {duration * 1000:.2f} ms"
+                    f" - status {status}"
+                )
+
+
+# Réponse JSON dont la sérialisation est chronométrée
+class TimedORJSONResponse(ORJSONResponse):
+    def render(self, content):
+        start = time.perf_counter()
+        body = super().render(content)
+        ctx = _current.get()
+        telemetry.observe_stage(
+            "serialization",
+            time.perf_counter() - start,
+            ctx.model_version if ctx is not None else "",
+        )
+        return body
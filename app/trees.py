@@ -0,0 +1,187 @@
+import json
+import math
+
+import numpy as np
+
+BACKENDS = ("xgboost", "numpy", "numba")
+# Taille de lot au-delà de laquelle Booster.inplace_predict (parcours vectorisé
+# et multithread) redevient plus rapide, mesurée par bench_trees.py
+MAX_ROWS = {"numpy": 16, "numba": 128}
+# Lignes évaluées à la fois par le backend NumPy : borne les tableaux
+# (lignes x arbres) des noeuds courants
+CHUNK_ROWS = 8192
+
+
+# Ensemble d'arbres XGBoost "aplati" : tous les noeuds de tous les arbres dans
+# des tableaux contigus (feature, seuil, fils gauche/droit, direction par
+# défaut des valeurs manquantes, valeur des feuilles). Les feuilles pointent
+# sur elles-mêmes : max_depth pas de descente suffisent pour tous les arbres.
+# Évite le coût fixe d'un appel à l'API C de XGBoost (DMatrix, threads) qui
+# domine pour une ligne ou un petit lot.
+class FlatEnsemble:
+    def __init__(
+        self,
+        feature,
+        threshold,
+        left,
+        right,
+        default_left,
+        value,
+        roots,
+        depth,
+        base_margin,
+        missing=np.nan,
+        backend="numpy",
+    ):
+        if backend not in BACKENDS[1:]:
+            raise ValueError(f"Backend d'arbres inconnu : {backend}")
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.default_left = np.asarray(default_left, dtype=np.bool_)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = depth
+        self.base_margin = base_margin
+        self.missing = missing
+        self.backend = backend
+        if backend == "numba":
+            self._kernel = _numba_kernel()
+
+    # Arbres du booster (format JSON de XGBoost) dans iteration_range
+    @classmethod
+    def from_booster(cls, booster, iteration_range=(0, 0), missing=np.nan, **kwargs):
+        model = json.loads(booster.save_raw("json"))
+        learner = model["learner"]
+        objective = learner["objective"]["name"]
+        if objective != "binary:logistic":
+            raise ValueError(f"Objectif non supporté : {objective}")
+        gbtree = learner["gradient_booster"]
+        if gbtree["name"] != "gbtree":
+            raise ValueError(f"Booster non supporté : {gbtree['name']}")
+        trees = gbtree["model"]["trees"]
+        start, stop = iteration_range
+        trees = trees[start : stop or len(trees)]  # une classe : un arbre par tour
+
+        feature, threshold, left, right, default_left, value, roots = (
+            [] for _ in range(7)
+        )
+        depth = 0
+        for tree in trees:
+            if any(tree["split_type"]):
+                raise ValueError("Splits catégoriels non supportés")
+            offset = len(feature)
+            roots.append(offset)
+            children = list(zip(tree["left_children"], tree["right_children"]))
+            for node, (lchild, rchild) in enumerate(children):
+                leaf = lchild == -1
+                feature.append(0 if leaf else tree["split_indices"][node])
+                # Pour une feuille, split_conditions contient sa valeur
+                threshold.append(0.0 if leaf else tree["split_conditions"][node])
+                value.append(tree["split_conditions"][node] if leaf else 0.0)
+                left.append(offset + (node if leaf else lchild))
+                right.append(offset + (node if leaf else rchild))
+                default_left.append(bool(tree["default_left"][node]))
+            depth = max(depth, _tree_depth(children))
+
+        # base_score est une probabilité : marge initiale = logit(base_score)
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+        return cls(
+            feature,
+            threshold,
+            left,
+            right,
+            default_left,
+            value,
+            roots,
+            depth,
+            math.log(base_score / (1 - base_score)),
+            missing=missing,
+            **kwargs,
+        )
+
+    # Même sortie que Booster.inplace_predict (float32)
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if not (isinstance(self.missing, float) and math.isnan(self.missing)):
+            X = np.where(X == self.missing, np.float32(np.nan), X)
+        if self.backend == "numba":
+            out = np.empty(len(X), dtype=np.float32)
+            self._kernel(
+                X,
+                self.feature,
+                self.threshold,
+                self.left,
+                self.right,
+                self.default_left,
+                self.value,
+                self.roots,
+                self.depth,
+                self.base_margin,
+                out,
+            )
+            return out
+        margin = np.concatenate(
+            [
+                self._margin_numpy(X[start : start + CHUNK_ROWS])
+                for start in range(0, len(X), CHUNK_ROWS)
+            ]
+            or [np.zeros(0)]
+        )
+        return (1.0 / (1.0 + np.exp(-margin))).astype(np.float32)
+
+    # Descente simultanée de toutes les lignes dans tous les arbres
+    def _margin_numpy(self, X):
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            x = X[rows, self.feature[node]]
+            go_left = np.where(
+                np.isnan(x), self.default_left[node], x < self.threshold[node]
+            )
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node].sum(axis=1) + self.base_margin
+
+
+def _tree_depth(children):
+    depth, level = 0, [0]
+    while True:
+        level = [c for node in level for c in children[node] if c != -1]
+        if not level:
+            return depth
+        depth += 1
+
+
+# Noyau Numba (dépendance optionnelle), compilé au premier appel : une ligne
+# à la fois, depth pas de descente sans branchement par arbre (le choix du fils
+# est calculé, pas testé : pas de mauvaise prédiction de branchement)
+_compiled = None
+
+
+def _numba_kernel():
+    global _compiled
+    if _compiled is not None:
+        return _compiled
+    try:
+        import numba
+    except ImportError:
+        raise ValueError("numba n'est pas installé (pip install numba)")
+
+    @numba.njit(nogil=True)
+    def kernel(
+        X, feature, threshold, left, right, default_left, value, roots, depth, base, out
+    ):
+        for i in range(X.shape[0]):
+            margin = base
+            for root in roots:
+                node = root
+                for _ in range(depth):
+                    x = X[i, feature[node]]
+                    go_left = (x < threshold[node]) | (np.isnan(x) & default_left[node])
+                    node = right[node] + go_left * (left[node] - right[node])
+                margin += value[node]
+            out[i] = 1.0 / (1.0 + np.exp(-margin))
+
+    _compiled = kernel
+    return kernel
@@ -0,0 +1,173 @@
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+
+from app.engine import CompiledEngine
+from app.evaluation import ThresholdIndex
+
+# Sous-dossier des variantes d'une version (app/model/variants/<nom>/ ou
+# app/model/versions/<version>/variants/<nom>/), servies par le registre sous
+# le nom "<version>/<nom>"
+VARIANTS_DIR = "variants"
+REPORT_FILE = "variants_report.csv"
+
+
+# Même préprocessing, autre booster (toujours utilisé en entier)
+def with_booster(engine, booster):
+    return CompiledEngine(
+        booster=booster,
+        n_columns=engine.n_columns,
+        num_features=engine.num_features,
+        num_columns=engine.num_columns,
+        num_mean=engine.num_mean,
+        num_scale=engine.num_scale,
+        cat_features=engine.cat_features,
+        cat_categories=engine.cat_categories,
+        cat_offsets=engine.cat_offsets,
+        handle_unknown=engine.handle_unknown,
+        sparse=engine.sparse,
+        missing=engine.missing,
+    )
+
+
+# Les n_trees premiers arbres (dans iteration_range) : coût d'évaluation
+# proportionnel au nombre d'arbres
+def truncate(engine, n_trees):
+    start, stop = engine.iteration_range
+    stop = stop or engine.booster.num_boosted_rounds()
+    return with_booster(engine, engine.booster[start : min(start + n_trees, stop)])
+
+
+# Seuils et valeurs des feuilles arrondis en précision réduite (float16 par
+# défaut). Simulation de précision seulement : XGBoost les stocke et les évalue
+# en float32, taille et latence sont celles du modèle complet
+def quantize(engine, dtype=np.float16):
+    import xgboost
+
+    start, stop = engine.iteration_range
+    booster = engine.booster[start:stop] if stop else engine.booster
+    model = json.loads(booster.save_raw("json"))
+    for tree in model["learner"]["gradient_booster"]["model"]["trees"]:
+        values = np.asarray(tree["split_conditions"], dtype=np.float32)
+        tree["split_conditions"] = values.astype(dtype).astype(np.float32).tolist()
+    quantized = xgboost.Booster()
+    quantized.load_model(bytearray(json.dumps(model).encode()))
+    return with_booster(engine, quantized)
+
+
+# Colonnes encodées les moins importantes : au-delà de la part `coverage` de
+# l'importance cumulée (feature_importances.csv de train.py, trié décroissant)
+def low_importance_columns(importances, column_names, coverage=0.99):
+    importances = importances.sort_values("importance", ascending=False)
+    total = importances["importance"].sum()
+    cumulative = importances["importance"].cumsum() / (total or 1.0)
+    # Première colonne qui fait atteindre la couverture incluse
+    kept = set(importances["feature"][cumulative.shift(fill_value=0.0) < coverage])
+    return [i for i, name in enumerate(column_names) if name not in kept]
+
+
+# Colonnes encodées lues par au moins un split du booster
+def used_columns(engine):
+    scores = engine.booster.get_score(importance_type="weight")
+    names = engine.booster.feature_names
+    if names is None:
+        return len(scores)
+    return sum(1 for name in names if name in scores)
+
+
+def _p50(fn, batches):
+    fn(batches[0])  # compilation JIT éventuelle
+    lat = []
+    for batch in batches:
+        t0 = time.perf_counter()
+        fn(batch)
+        lat.append(time.perf_counter() - t0)
+    return statistics.median(lat)
+
+
+# Qualité (rappel et précision au seuil, PR-AUC) et latence p50 d'une variante
+# sur le jeu de test encodé : une ligne et un lot complet avec le booster, une
+# ligne avec chaque évaluateur d'arbres aplati disponible (app/trees.py)
+def measure(
+    engine, X, y, threshold=0.40, tree_backends=("numba",), n_rows=300, n_batches=30
+):
+    probs = engine.predict_proba(X)
+    index = ThresholdIndex(y, probs)
+    values = index.metrics(threshold)
+    rng = np.random.default_rng(0)
+    rows = [X[i : i + 1] for i in rng.integers(0, len(X), n_rows)]
+    result = {
+        "n_trees": engine.booster.num_boosted_rounds(),
+        "n_columns": used_columns(engine),
+        "model_kb": round(len(engine.booster.save_raw("ubj")) / 1024, 1),
+        "recall": round(values["recall"], 4),
+        "precision": round(values["precision"], 4),
+        "pr_auc": round(index.pr_auc, 4),
+        "row_us_xgboost": round(_p50(engine.predict_proba, rows) * 1e6, 1),
+        "batch_ms_xgboost": round(_p50(engine.predict_proba, [X] * n_batches) * 1e3, 3),
+    }
+    for backend in tree_backends:
+        try:
+            engine.compile_trees(backend)
+        except ValueError:
+            continue
+        result[f"row_us_{backend}"] = round(_p50(engine.predict_proba, rows) * 1e6, 1)
+        engine.trees = None
+    return result
+
+
+# Tableau comparatif. accuracy_only : variantes qui ne simulent que l'effet
+# sur la qualité (float16 stocké en float32, colonnes retirées mais toujours
+# encodées), sans gain réel de taille ni de latence
+def report(results, recall_target=None, accuracy_only=()):
+    import pandas as pd
+
+    df = pd.DataFrame.from_dict(results, orient="index")
+    df.index.name = "variant"
+    df["accuracy_only"] = df.index.isin(list(accuracy_only))
+    if recall_target is not None:
+        df["meets_target"] = df["recall"] >= recall_target
+    return df
+
+
+# Latences qui dépendent vraiment de la variante : une ligne avec l'évaluateur
+# d'arbres aplati, sinon un lot complet avec le Booster (une ligne avec le
+# Booster coûte ~115 µs quelle que soit la variante)
+LATENCY_COLUMNS = ("row_us_numba", "row_us_numpy", "batch_ms_xgboost")
+
+
+# Variante recommandée : la plus rapide parmi celles qui atteignent le rappel
+# cible et gagnent au moins `margin` (part de la latence) sur le modèle
+# complet ; None si aucune. Une simulation n'est jamais retenue.
+def cheapest(df, margin=0.1):
+    column = next((c for c in LATENCY_COLUMNS if c in df), None)
+    if column is None or "full" not in df.index:
+        return None
+    eligible = df.drop(index="full")
+    if "meets_target" in eligible:
+        eligible = eligible[eligible["meets_target"]]
+    if "accuracy_only" in eligible:
+        eligible = eligible[~eligible["accuracy_only"]]
+    eligible = eligible[eligible[column] <= df.at["full", column] * (1 - margin)]
+    if eligible.empty:
+        return None
+    return eligible[column].idxmin()
+
+
+def save_variant(engine, directory, reference=None, policies=None):
+    from app.monitoring import REFERENCE_FILE, save_reference
+    from app.policies import POLICIES_FILE, save_policies
+    from app.registry import BOOSTER_FILE, PREPROCESSING_FILE
+
+    os.makedirs(directory, exist_ok=True)
+    engine.save(
+        os.path.join(directory, BOOSTER_FILE),
+        os.path.join(directory, PREPROCESSING_FILE),
+    )
+    if reference is not None:
+        save_reference(reference, os.path.join(directory, REFERENCE_FILE))
+    if policies is not None:
+        save_policies(policies, os.path.join(directory, POLICIES_FILE))
@@ -0,0 +1,42 @@
+# assert_live_metrics.py
+# Vérifie que les métriques de /metrics/live (agrégats par bin de score de
+# app/feedback.py) reproduisent scikit-learn, seuils extrêmes compris
+import numpy as np
+from sklearn.metrics import average_precision_score, precision_score, recall_score
+
+from app.feedback import SCORE_BINS, binned_metrics, score_bin
+
+TOL = 1e-4
+THRESHOLDS = (0.0, 0.1, 0.4, 0.5, 0.9, 0.999, 0.9995)
+
+rng = np.random.default_rng(0)
+n = 20_000
+# Scores au milieu de leur bin (tous les scores d'un bin sont ex aequo, les
+# seuils multiples de 0.001 tombent entre deux bins), dernier bin peuplé
+scores = (rng.integers(0, SCORE_BINS, n) + 0.5) / SCORE_BINS
+scores[:200] = (SCORE_BINS - 0.5) / SCORE_BINS
+y = (rng.random(n) < scores).astype(np.int64)
+
+bins = np.array([score_bin(p) for p in scores])
+positives = np.bincount(bins[y == 1], minlength=SCORE_BINS)
+negatives = np.bincount(bins[y == 0], minlength=SCORE_BINS)
+
+for threshold in THRESHOLDS:
+    got = binned_metrics(positives, negatives, threshold)
+    predicted = scores >= threshold
+    expected = {
+        "precision": precision_score(y, predicted, zero_division=0),
+        "recall": recall_score(y, predicted, zero_division=0),
+    }
+    for name, value in expected.items():
+        assert (
+            abs(got[name] - value) <= TOL
+        ), f"{name} au seuil {threshold} : {got[name]} au lieu de {value:.4f}"
+    print(
+        f"Seuil {threshold:<6} OK · précision {got['precision']:.4f}"
+        f" · rappel {got['recall']:.4f}"
+    )
+
+pr_auc = average_precision_score(y, scores)
+assert abs(got["pr_auc"] - pr_auc) <= TOL, f"PR-AUC {got['pr_auc']} au lieu de {pr_auc}"
+print(f"PR-AUC OK · {got['pr_auc']:.4f}")
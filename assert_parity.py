@@ -0,0 +1,49 @@
+# assert_parity.py
+# Vérifie que le moteur compilé reproduit model.predict_proba sur test_set.csv
+import statistics as stats
+import time
+import joblib
+import numpy as np
+import pandas as pd
+
+from app.engine import CompiledEngine
+
+MODEL_PATH = "app/model/xgb_churn_pipeline.pkl"
+TEST_PATH = "app/model/test_set.csv"
+TOL = 1e-6
+N_TIMING = 500
+
+model = joblib.load(MODEL_PATH)
+engine = CompiledEngine.from_pipeline(model)
+X_test = pd.read_csv(TEST_PATH).drop(columns=["Churn"])
+
+expected = model.predict_proba(X_test)[:, 1]
+rows = X_test.to_dict(orient="records")
+
+# Ligne par ligne, en lot (dicts) et en forme colonnaire
+per_row = np.array([engine.predict_row(row) for row in rows])
+by_rows = engine.predict_proba(engine.encode_rows(rows))
+by_columns = engine.predict_proba(engine.encode_columns(X_test.to_dict(orient="list")))
+
+for name, got in [("row", per_row), ("rows", by_rows), ("columns", by_columns)]:
+    diff = float(np.max(np.abs(got - expected)))
+    assert diff <= TOL, f"Écart {name} trop grand : {diff:.2e}"
+    print(f"Parité {name:<8} OK · écart max {diff:.2e}")
+
+
+# Latence d'une prédiction unitaire : pipeline pandas vs moteur compilé
+def p50(fn):
+    lat = []
+    for row in rows[:N_TIMING]:
+        t0 = time.perf_counter()
+        fn(row)
+        lat.append((time.perf_counter() - t0) * 1e6)
+    return stats.median(lat)
+
+
+pipeline_p50 = p50(lambda row: model.predict_proba(pd.DataFrame([row]))[0][1])
+engine_p50 = p50(engine.predict_row)
+print(
+    f"P50 unitaire · pipeline: {pipeline_p50:.0f} µs | moteur compilé: {engine_p50:.0f} µs"
+    f" | x{pipeline_p50 / engine_p50:.1f}"
+)
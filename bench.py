@@ -0,0 +1,342 @@
+# bench.py
+# Benchmark de l'API en process (ASGI, sans Docker ni réseau) :
+# - open loop : arrivées à débit constant, latence mesurée depuis l'instant
+#   d'envoi prévu (pas de coordinated omission)
+# - closed loop : N clients qui enchaînent leurs requêtes
+# Percentiles p50/p95/p99/p99.9 sur histogrammes log-linéaires (type HDR),
+# résultats JSON comparables, et SLO vérifiés contre une baseline stockée.
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+TEST_PATH = "app/model/test_set.csv"
+RESULTS_DIR = "bench_results"
+BASELINE_PATH = "bench_baseline.json"
+PERCENTILES = (50, 95, 99, 99.9)
+
+parser = argparse.ArgumentParser(description="Benchmark de l'API de churn")
+parser.add_argument(
+    "--scenarios",
+    default="predict,batch,metrics",
+    help="Endpoints à mesurer : predict, batch, metrics",
+)
+parser.add_argument("--mode", choices=["open", "closed", "both"], default="both")
+parser.add_argument("--duration", type=float, default=10.0, help="Secondes par mesure")
+parser.add_argument("--warmup", type=float, default=1.0, help="Secondes de chauffe")
+parser.add_argument(
+    "--rate",
+    type=float,
+    default=None,
+    help="Requêtes/s en open loop (défaut : par scénario, voir DEFAULT_RATES)",
+)
+parser.add_argument("--concurrency", type=int, default=8, help="Clients (closed loop)")
+parser.add_argument("--batch-size", type=int, default=1000, help="Lignes par lot")
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument(
+    "--cache",
+    action="store_true",
+    help="Garde le cache de prédictions (désactivé par défaut : lignes de test répétées)",
+)
+parser.add_argument("--output", default=None, help="Fichier JSON des résultats")
+parser.add_argument("--baseline", default=BASELINE_PATH)
+parser.add_argument(
+    "--save-baseline", action="store_true", help="Enregistre ce run comme baseline"
+)
+parser.add_argument(
+    "--max-p99-regression",
+    type=float,
+    default=0.25,
+    help="Hausse max du p99 vs baseline (0.25 = +25 %%)",
+)
+parser.add_argument(
+    "--max-throughput-regression",
+    type=float,
+    default=0.15,
+    help="Baisse max du débit vs baseline (0.15 = -15 %%)",
+)
+
+# Débit open loop par défaut (requêtes/s), sous la saturation d'un seul CPU
+DEFAULT_RATES = {"predict": 200.0, "batch": 5.0, "metrics": 100.0}
+
+
+# Histogramme log-linéaire en µs : 2^SUB_BITS sous-buckets par puissance de 2,
+# soit une erreur relative < 1/128 sur tous les percentiles
+class LatencyHistogram:
+    SUB_BITS = 7
+
+    def __init__(self):
+        self.counts = {}
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, us):
+        if us < 1:
+            return 0
+        exponent = int(math.log2(us))
+        sub = int((us / 2**exponent - 1) * (1 << self.SUB_BITS))
+        return (exponent << self.SUB_BITS) + sub + 1
+
+    def _upper(self, index):
+        if index == 0:
+            return 1.0
+        exponent, sub = divmod(index - 1, 1 << self.SUB_BITS)
+        return 2**exponent * (1 + (sub + 1) / (1 << self.SUB_BITS))
+
+    def record(self, seconds):
+        us = seconds * 1e6
+        i = self._index(us)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.n += 1
+        self.total += us
+        self.max = max(self.max, us)
+
+    def percentile(self, q):
+        if not self.n:
+            return float("nan")
+        rank, seen = math.ceil(q / 100 * self.n), 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(self._upper(i), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "unit": "us",
+            "sub_bucket_bits": self.SUB_BITS,
+            "counts": {str(i): n for i, n in sorted(self.counts.items())},
+        }
+
+
+# --- Charges utiles tirées de test_set.csv ---
+
+
+def make_requests(scenario, rows, rng, batch_size, n=512):
+    if scenario == "predict":
+        return [
+            ("POST", "/predict", {"json": rows[i]})
+            for i in rng.integers(0, len(rows), n)
+        ]
+    if scenario == "batch":
+        return [
+            (
+                "POST",
+                "/predict_batch",
+                {"json": [rows[i] for i in rng.integers(0, len(rows), batch_size)]},
+            )
+            for _ in range(16)
+        ]
+    if scenario == "metrics":
+        return [
+            ("GET", "/metrics", {"params": {"threshold": round(float(t), 2)}})
+            for t in rng.uniform(0.05, 0.95, n)
+        ]
+    raise ValueError(f"Scénario inconnu : {scenario}")
+
+
+async def send(client, request):
+    method, path, kwargs = request
+    response = await client.request(method, path, **kwargs)
+    return response.status_code == 200
+
+
+async def run_closed(client, requests, concurrency, duration):
+    hist, errors = LatencyHistogram(), 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset):
+        nonlocal errors
+        i = offset
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            ok = await send(client, requests[i % len(requests)])
+            hist.record(time.perf_counter() - t0)
+            errors += not ok
+            i += concurrency
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(k) for k in range(concurrency)))
+    return hist, errors, time.perf_counter() - start
+
+
+async def run_open(client, requests, rate, duration):
+    hist, errors = LatencyHistogram(), 0
+    interval = 1.0 / rate
+
+    async def one(request, scheduled):
+        nonlocal errors
+        ok = await send(client, request)
+        # Latence depuis l'instant prévu : un serveur en retard pénalise
+        # aussi les requêtes qui auraient dû partir pendant ce retard
+        hist.record(time.perf_counter() - scheduled)
+        errors += not ok
+
+    start = time.perf_counter()
+    tasks, i = [], 0
+    while True:
+        scheduled = start + i * interval
+        if scheduled - start >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(requests[i % len(requests)], scheduled)))
+        i += 1
+    await asyncio.gather(*tasks)
+    return hist, errors, time.perf_counter() - start
+
+
+def summarize(hist, errors, elapsed, rows_per_request):
+    result = {
+        "requests": hist.n,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(hist.n / elapsed, 2),
+        "rows_per_s": round(hist.n * rows_per_request / elapsed, 1),
+        "mean_ms": round(hist.total / max(hist.n, 1) / 1000, 3),
+        "max_ms": round(hist.max / 1000, 3),
+    }
+    for q in PERCENTILES:
+        result[f"p{q:g}_ms"] = round(hist.percentile(q) / 1000, 3)
+    result["histogram"] = hist.to_dict()
+    return result
+
+
+async def bench(args):
+    from app.main import app
+
+    rows = pd.read_csv(TEST_PATH).drop(columns=["Churn"]).to_dict("records")
+    rng = np.random.default_rng(args.seed)
+    modes = ["open", "closed"] if args.mode == "both" else [args.mode]
+    results = {}
+
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    # Démarrage/arrêt de l'app (micro-batcher, registre) comme sous uvicorn
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=60.0
+        ) as client:
+            for scenario in args.scenarios.split(","):
+                requests = make_requests(scenario, rows, rng, args.batch_size)
+                rows_per_request = args.batch_size if scenario == "batch" else 1
+                await run_closed(client, requests, 1, args.warmup)
+                for mode in modes:
+                    if mode == "open":
+                        rate = args.rate or DEFAULT_RATES[scenario]
+                        measured = await run_open(client, requests, rate, args.duration)
+                    else:
+                        measured = await run_closed(
+                            client, requests, args.concurrency, args.duration
+                        )
+                    result = summarize(*measured, rows_per_request)
+                    result["target_rps"] = rate if mode == "open" else None
+                    results[f"{scenario}/{mode}"] = result
+                    print_result(f"{scenario}/{mode}", result)
+    return results
+
+
+def print_result(name, r):
+    print(
+        f"{name:<16} | {r['throughput_rps']:8.1f} req/s | {r['rows_per_s']:10.0f} lignes/s"
+        f" | P50 {r['p50_ms']:7.2f} | P95 {r['p95_ms']:7.2f} | P99 {r['p99_ms']:7.2f}"
+        f" | P99.9 {r['p99.9_ms']:7.2f} ms | erreurs {r['errors']}"
+    )
+
+
+# Régressions par rapport à la baseline : p99 (open et closed loop) et débit
+# (closed loop seulement : en open loop le débit est imposé)
+def check_slos(results, baseline, max_p99_regression, max_throughput_regression):
+    failures = []
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        p99_limit = base["p99_ms"] * (1 + max_p99_regression)
+        if r["p99_ms"] > p99_limit:
+            failures.append(
+                f"{name} : p99 {r['p99_ms']:.2f} ms > {p99_limit:.2f} ms "
+                f"(baseline {base['p99_ms']:.2f} ms)"
+            )
+        if name.endswith("/closed"):
+            floor = base["throughput_rps"] * (1 - max_throughput_regression)
+            if r["throughput_rps"] < floor:
+                failures.append(
+                    f"{name} : débit {r['throughput_rps']:.1f} req/s < {floor:.1f} "
+                    f"(baseline {base['throughput_rps']:.1f})"
+                )
+        if r["errors"]:
+            failures.append(f"{name} : {r['errors']} erreurs")
+    return failures
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    # Mesure du modèle et non du cache ; pas de surveillance des versions
+    if not args.cache:
+        os.environ["PREDICTION_CACHE"] = "0"
+    os.environ.setdefault("MODEL_POLL_S", "0")
+    # Le trafic du benchmark n'alimente ni le journal des prédictions ni les
+    # profils de dérive
+    os.environ["PREDICTION_LOG"] = "0"
+    os.environ["MONITORING"] = "0"
+
+    results = asyncio.run(bench(args))
+    run = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k != "baseline"},
+        },
+        "results": results,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"Résultats : {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline enregistrée : {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = check_slos(
+            results,
+            baseline,
+            args.max_p99_regression,
+            args.max_throughput_regression,
+        )
+        if failures:
+            print("❌ SLO non respectés :")
+            for failure in failures:
+                print(f"  - {failure}")
+            sys.exit(1)
+        print(f"✅ SLO respectés (baseline {baseline['meta'].get('commit')})")
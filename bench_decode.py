@@ -0,0 +1,92 @@
+# bench_decode.py
+# Coût par ligne du décodage + validation + encodage d'un corps JSON :
+# chemin Pydantic de /predict et /predict_batch vs décodage rapide de
+# /predict_fast et /predict_batch_fast
+import json
+import time
+from typing import List
+
+import numpy as np
+import pandas as pd
+from pydantic import TypeAdapter
+
+from app.decoding import FastDecoder
+from app.engine import CompiledEngine
+from app.schemas import FEATURE_NAMES, ColumnarBatch, CustomerFeatures
+
+BOOSTER_PATH = "app/model/xgb_churn_booster.ubj"
+PREPROCESSING_PATH = "app/model/preprocessing.npz"
+TEST_PATH = "app/model/test_set.csv"
+SIZES = (10, 100, 10_000)
+MIN_SECONDS = 1.0
+
+engine = CompiledEngine.load(BOOSTER_PATH, PREPROCESSING_PATH)
+decoder = FastDecoder(engine)
+df = pd.read_csv(TEST_PATH).drop(columns=["Churn"])
+rows_adapter = TypeAdapter(List[CustomerFeatures])
+
+
+# Ce que fait FastAPI pour /predict_batch : json.loads, un CustomerFeatures
+# par ligne, puis reconstruction des colonnes et encodage
+def pydantic_rows(body):
+    batch = rows_adapter.validate_python(json.loads(body))
+    columns = {name: [getattr(row, name) for row in batch] for name in FEATURE_NAMES}
+    return engine.encode_columns(columns)
+
+
+def pydantic_columns(body):
+    batch = ColumnarBatch.model_validate(json.loads(body))
+    return engine.encode_columns({name: getattr(batch, name) for name in FEATURE_NAMES})
+
+
+def pydantic_row(body):
+    return engine.encode_row(CustomerFeatures.model_validate(json.loads(body)).__dict__)
+
+
+def fast_row(body):
+    return decoder.encode_row(decoder.loads(body))
+
+
+def fast_rows(body):
+    return decoder.encode_rows(decoder.loads(body))
+
+
+def fast_columns(body):
+    return decoder.encode_columns(decoder.loads(body))
+
+
+def per_row_us(fn, body, n_rows):
+    fn(body)  # chauffe
+    n, start = 0, time.perf_counter()
+    while time.perf_counter() - start < MIN_SECONDS:
+        fn(body)
+        n += 1
+    return (time.perf_counter() - start) / n / n_rows * 1e6
+
+
+sample = df.iloc[0].to_dict()
+row_body = json.dumps(sample).encode()
+assert np.array_equal(pydantic_row(row_body), fast_row(row_body))
+before, after = per_row_us(pydantic_row, row_body, 1), per_row_us(fast_row, row_body, 1)
+print(
+    f"{'1':>6} {'objet':<8} | Pydantic: {before:8.2f} µs/ligne"
+    f" | rapide: {after:8.2f} µs/ligne | x{before / after:.1f}"
+)
+
+for size in SIZES:
+    sample = df.sample(size, replace=True, random_state=0)
+    rows_body = json.dumps(sample.to_dict("records")).encode()
+    columns_body = json.dumps(sample.to_dict("list")).encode()
+    assert np.array_equal(pydantic_rows(rows_body), fast_rows(rows_body))
+    assert np.array_equal(pydantic_columns(columns_body), fast_columns(columns_body))
+
+    for layout, slow, fast, body in (
+        ("lignes", pydantic_rows, fast_rows, rows_body),
+        ("colonnes", pydantic_columns, fast_columns, columns_body),
+    ):
+        before = per_row_us(slow, body, size)
+        after = per_row_us(fast, body, size)
+        print(
+            f"{size:>6} {layout:<8} | Pydantic: {before:8.2f} µs/ligne"
+            f" | rapide: {after:8.2f} µs/ligne | x{before / after:.1f}"
+        )
@@ -0,0 +1,136 @@
+# bench_startup.py
+# Démarrage à froid : temps entre le lancement du process et l'import de
+# app.main, la première réponse de /health, de /ready puis de /predict, et
+# mémoire résidente (RSS) du worker ; pipeline joblib vs artefact compact,
+# démarrage complet vs paresseux (LAZY_STARTUP=1, jeu de test lu au premier
+# /metrics). --profile N : modules les plus coûteux à l'import (-X importtime)
+import argparse
+import json
+import os
+import statistics as stats
+import subprocess
+import sys
+import time
+
+CHILD = """
+import json, os, sys, time
+t0 = float(os.environ["BENCH_T0"])
+from app.main import app
+marks = {"import": time.time() - t0}
+from fastapi.testclient import TestClient
+
+HEAVY = ("pandas", "sklearn", "scipy", "joblib", "pyarrow")
+payload = {
+    "gender": "Male", "SeniorCitizen": 0, "Partner": "Yes", "Dependents": "No",
+    "tenure": 12, "PhoneService": "Yes", "MultipleLines": "No",
+    "InternetService": "Fiber optic", "OnlineSecurity": "No", "OnlineBackup": "Yes",
+    "DeviceProtection": "No", "TechSupport": "No", "StreamingTV": "Yes",
+    "StreamingMovies": "No", "Contract": "Month-to-month", "PaperlessBilling": "Yes",
+    "PaymentMethod": "Electronic check", "MonthlyCharges": 89.10, "TotalCharges": 1068.20,
+}
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+
+
+with TestClient(app) as client:
+    assert client.get("/health").status_code == 200
+    marks["health"] = time.time() - t0
+    while client.get("/ready").status_code != 200:
+        time.sleep(0.001)
+    marks["ready"] = time.time() - t0
+    assert client.post("/predict", json=payload).status_code == 200
+    marks["predict"] = time.time() - t0
+    marks["rss_predict"] = rss_mb()
+    marks["heavy"] = [m for m in HEAVY if sys.modules.get(m) is not None]
+    assert client.get("/metrics").status_code == 200
+    marks["rss_metrics"] = rss_mb()
+print(json.dumps(marks))
+"""
+
+# Simule l'image API (requirements-api.txt) où scikit-learn n'est pas installé :
+# xgboost importe sklearn dès qu'il est présent
+WITHOUT_SKLEARN = "import sys; sys.modules['sklearn'] = None\n"
+
+MODES = {
+    "pipeline (joblib)": ({"INFERENCE_ENGINE": "pipeline"}, ""),
+    "artefact compact": ({"INFERENCE_ENGINE": "compiled"}, ""),
+    "artefact, sans sklearn": ({"INFERENCE_ENGINE": "compiled"}, WITHOUT_SKLEARN),
+    "sans sklearn, paresseux": (
+        {"INFERENCE_ENGINE": "compiled", "LAZY_STARTUP": "1"},
+        WITHOUT_SKLEARN,
+    ),
+}
+
+parser = argparse.ArgumentParser(description="Démarrage à froid de l'API")
+parser.add_argument("--runs", type=int, default=5, help="Démarrages par mode")
+parser.add_argument(
+    "--profile",
+    type=int,
+    default=15,
+    help="Modules affichés par -X importtime (0 = aucun)",
+)
+args = parser.parse_args()
+
+# Ni journal des prédictions ni profils de dérive alimentés par le benchmark
+BASE_ENV = {
+    **os.environ,
+    "PREDICTION_CACHE": "0",
+    "MODEL_POLL_S": "0",
+    "PREDICTION_LOG": "0",
+    "MONITORING": "0",
+}
+
+print(
+    f"{'mode':<24} | {'import':>7} | {'/health':>7} | {'/ready':>7} | "
+    f"{'1er /predict':>12} | {'RSS':>6} | {'RSS /metrics':>12} | modules lourds"
+)
+for name, (extra_env, prelude) in MODES.items():
+    runs = []
+    for _ in range(args.runs):
+        env = {**BASE_ENV, **extra_env, "BENCH_T0": repr(time.time())}
+        out = subprocess.run(
+            [sys.executable, "-c", prelude + CHILD],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if out.returncode != 0:
+            sys.exit(f"{name} : échec du démarrage\n{out.stderr[-2000:]}")
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    def p50(key):
+        return stats.median(run[key] for run in runs)
+
+    print(
+        f"{name:<24} | {p50('import') * 1000:5.0f}ms | {p50('health') * 1000:5.0f}ms"
+        f" | {p50('ready') * 1000:5.0f}ms | {p50('predict') * 1000:10.0f}ms"
+        f" | {p50('rss_predict'):4.0f}Mo | {p50('rss_metrics'):10.0f}Mo"
+        f" | {', '.join(runs[-1]['heavy']) or '-'}"
+    )
+
+# Profil d'import de app.main (mode paresseux, sans sklearn) : temps propre
+# et cumulé (µs) des modules les plus lents, tels que rapportés par CPython
+if args.profile:
+    extra_env, prelude = MODES["sans sklearn, paresseux"]
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", prelude + "import app.main"],
+        env={**BASE_ENV, **extra_env},
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        rows.append((int(self_us), int(cumulative_us), module.strip()))
+    total = max((cumulative for _, cumulative, _ in rows), default=0)
+    print(f"\n-X importtime : import app.main = {total / 1000:.0f} ms")
+    print(f"{'propre':>9} | {'cumulé':>9} | module")
+    for self_us, cumulative_us, module in sorted(rows, reverse=True)[: args.profile]:
+        print(f"{self_us / 1000:7.1f}ms | {cumulative_us / 1000:7.1f}ms | {module}")
@@ -0,0 +1,77 @@
+# bench_trees.py
+# Parité des évaluateurs d'arbres aplatis (app/trees.py) avec predict_proba sur
+# test_set.csv, puis latence par ligne et par lot contre le Booster XGBoost
+import argparse
+import statistics as stats
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from app.engine import CompiledEngine
+from app.trees import BACKENDS, MAX_ROWS, FlatEnsemble
+
+MODEL_PATH = "app/model/xgb_churn_pipeline.pkl"
+TEST_PATH = "app/model/test_set.csv"
+TOL = 1e-6
+
+parser = argparse.ArgumentParser(description="Parité et latence des backends d'arbres")
+parser.add_argument("--model", default=MODEL_PATH)
+parser.add_argument("--sizes", default="1,8,32,128,512,4096", help="Tailles de lot")
+parser.add_argument("--repeat", type=int, default=200, help="Mesures par taille")
+args = parser.parse_args()
+
+model = joblib.load(args.model)
+engine = CompiledEngine.from_pipeline(model)
+X_test = pd.read_csv(TEST_PATH).drop(columns=["Churn"])
+expected = model.predict_proba(X_test)[:, 1]
+X = engine.encode_columns(X_test.to_dict(orient="list"))
+
+predictors = {"xgboost": engine.predict_proba}
+for backend in BACKENDS[1:]:
+    try:
+        trees = FlatEnsemble.from_booster(
+            engine.booster, engine.iteration_range, engine.missing, backend=backend
+        )
+    except ValueError as e:
+        print(f"⚠️ {backend} ignoré : {e}")
+        continue
+    predictors[backend] = trees.predict_proba
+
+failed = False
+for name, predict in predictors.items():
+    diff = float(np.max(np.abs(predict(X) - expected)))
+    failed |= diff > TOL
+    print(f"Parité {name:<8} {'OK' if diff <= TOL else 'ÉCHEC'} · écart max {diff:.2e}")
+
+
+# Médiane de la latence d'un appel sur un lot de n lignes (tiré du jeu de test,
+# différent à chaque mesure pour ne pas entraîner le prédicteur de branchement)
+def p50(predict, n):
+    rng = np.random.default_rng(0)
+    batches = [X[rng.integers(0, len(X), n)] for _ in range(args.repeat)]
+    predict(batches[0])  # compilation JIT éventuelle
+    lat = []
+    for batch in batches:
+        t0 = time.perf_counter()
+        predict(batch)
+        lat.append(time.perf_counter() - t0)
+    return stats.median(lat)
+
+
+sizes = [int(s) for s in args.sizes.split(",")]
+print(f"\n{'lignes':>7} " + " ".join(f"{name:>18}" for name in predictors))
+for n in sizes:
+    results = {name: p50(predict, n) for name, predict in predictors.items()}
+    cells = [
+        f"{results[name] * 1e6:>9.1f} µs (x{results['xgboost'] / results[name]:.1f})"
+        for name in predictors
+    ]
+    print(f"{n:>7} " + " ".join(f"{c:>18}" for c in cells))
+print(
+    "\nLots routés vers les arbres aplatis par défaut : "
+    + ", ".join(f"{b} ≤ {n} lignes" for b, n in MAX_ROWS.items())
+)
+sys.exit(1 if failed else 0)
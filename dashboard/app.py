@@ -1,23 +1,29 @@
 import streamlit as st
-import requests
 import pandas as pd
 import plotly.express as px
-import os
-
-# Toujours obtenir le chemin absolu du projet
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-MODEL_DIR = os.path.join(BASE_DIR, "app", "model")
-
-st.write("Base directory utilisé :", BASE_DIR)
-st.write("Model directory utilisé :", MODEL_DIR)
+import requests
 
-# API_URL = "http://localhost:8001"
-API_URL = "http://churn-api:8000"  # ⚠️ à adapter selon ton docker-compose
+import data
 
 st.set_page_config(page_title="Churn Prediction Dashboard", layout="wide")
 
 st.title("Churn Prediction Dashboard")
 
+# Version active du modèle (vérifiée toutes les DASHBOARD_VERSION_TTL_S s) :
+# clé de tous les caches, les données ne sont rechargées qu'au changement
+try:
+    version = data.model_version()
+    st.session_state["model_version"] = version
+except requests.RequestException as e:
+    version = st.session_state.get("model_version")
+    st.warning(f"API injoignable ({e})")
+if version is not None:
+    st.caption(f"API : {data.API_URL} · modèle {version}")
+    loaded = data.load(version)
+else:
+    error = RuntimeError("aucune version du modèle connue")
+    loaded = {name: error for name in ("probabilities", "curve", "importances")}
+
 # --- Onglets
 tabs = st.tabs(["Prédiction Client", "Métriques Globales", "Analyse Modèle"])
 
@@ -94,12 +100,11 @@ with tabs[0]:
             "MonthlyCharges": MonthlyCharges,
             "TotalCharges": TotalCharges,
         }
-        r = requests.post(f"{API_URL}/predict?threshold={threshold}", json=payload)
-        if r.status_code == 200:
-            res = r.json()
+        try:
+            res = data.predict(payload, threshold)
             st.success(f"Churn : **{res['churn']}** (proba={res['probability']})")
-        else:
-            st.error("Erreur API")
+        except requests.RequestException as e:
+            st.error(f"Erreur API : {e}")
 
 # ===============================
 # 2. Onglet Métriques globales
@@ -108,9 +113,11 @@ with tabs[1]:
     st.header("Métriques globales")
 
     threshold = st.slider("Seuil", 0.0, 1.0, 0.4, 0.05, key="metrics")
-    r = requests.get(f"{API_URL}/metrics?threshold={threshold}")
-    if r.status_code == 200:
-        metrics = r.json()
+    # Lu dans la courbe des seuils en cache : pas d'appel à l'API quand le
+    # seuil change
+    curve = loaded["curve"]
+    if not isinstance(curve, Exception):
+        metrics = data.threshold_metrics(curve, threshold)
 
         # --- Explications pour un public novice ---
         st.subheader("Explications des métriques 📊")
@@ -146,7 +153,7 @@ with tabs[1]:
         st.json(metrics)
 
     else:
-        st.warning("Impossible de récupérer les métriques")
+        st.warning(f"Impossible de calculer les métriques : {curve}")
 
 
 # ===============================
@@ -156,8 +163,8 @@ with tabs[2]:
     st.header("Analyse du modèle")
 
     # --- Feature importances ---
-    try:
-        df_importance = pd.read_csv(os.path.join(MODEL_DIR, "feature_importances.csv"))
+    df_importance = loaded["importances"]
+    if not isinstance(df_importance, Exception):
         fig = px.bar(
             df_importance,
             x="importance",
@@ -166,29 +173,22 @@ with tabs[2]:
             title="Feature Importances (XGBoost)",
         )
         st.plotly_chart(fig, use_container_width=True)
-    except Exception as e:
+    else:
         st.info(
-            f"Importances des features non disponibles : {e} (génère-les après entraînement)"
+            f"Importances des features non disponibles : {df_importance} "
+            "(génère-les après entraînement)"
         )
 
     # --- Distribution des probabilités ---
-    try:
-        df_test = pd.read_csv(os.path.join(MODEL_DIR, "test_set.csv"))
+    y_proba = loaded["probabilities"]
+    if not isinstance(y_proba, Exception):
         st.write("Distribution des probabilités de churn (jeu de test)")
-
-        # ⚠️ cet endpoint doit être implémenté côté API
-        r = requests.get(f"{API_URL}/predict_proba_all")
-        if r.status_code == 200:
-            y_proba = r.json()
-            df_test["proba"] = y_proba
-            fig = px.histogram(
-                df_test,
-                x="proba",
-                nbins=30,
-                title="Distribution des probabilités de churn",
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.warning("Impossible de récupérer les probabilités depuis l’API")
-    except Exception as e:
-        st.info(f"Probabilités non disponibles : {e}")
+        fig = px.histogram(
+            pd.DataFrame({"proba": y_proba}),
+            x="proba",
+            nbins=30,
+            title="Distribution des probabilités de churn",
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info(f"Probabilités non disponibles : {y_proba}")
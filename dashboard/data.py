@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MODEL_DIR = os.path.join(BASE_DIR, "app", "model")
+
+API_URL = os.getenv("API_URL", "http://churn-api:8000")
+# (connexion, lecture) : une API surchargée ne bloque pas le dashboard
+TIMEOUT = (
+    float(os.getenv("API_CONNECT_TIMEOUT_S", "2")),
+    float(os.getenv("API_READ_TIMEOUT_S", "10")),
+)
+# Fréquence de vérification de la version active (les autres données sont
+# mises en cache par version et ne sont rechargées qu'au changement de modèle)
+VERSION_TTL_S = float(os.getenv("DASHBOARD_VERSION_TTL_S", "10"))
+
+
+# Session HTTP partagée par toutes les sessions Streamlit : connexions
+# keep-alive réutilisées, quelques nouvelles tentatives sur les GET
+@st.cache_resource
+def session():
+    http = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=2,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=("GET",),
+        ),
+    )
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    return http
+
+
+def get(path, **params):
+    r = session().get(f"{API_URL}{path}", params=params, timeout=TIMEOUT)
+    r.raise_for_status()
+    return r.json()
+
+
+def predict(payload, threshold):
+    r = session().post(
+        f"{API_URL}/predict",
+        params={"threshold": threshold},
+        json=payload,
+        timeout=TIMEOUT,
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+@st.cache_data(ttl=VERSION_TTL_S, show_spinner=False)
+def model_version():
+    return get("/models")["active"]
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+# Probabilités du jeu de test : un seul appel par version du modèle
+@st.cache_data(max_entries=4, show_spinner=False)
+def probabilities(version):
+    probs = get("/predict_proba_all", model_version=version)
+    if isinstance(probs, dict):
+        raise RuntimeError(probs.get("error", "réponse inattendue"))
+    return np.asarray(probs, dtype=np.float64)
+
+
+# Dossier d'une version : versions/<version>/ (les variantes "<version>/<nom>"
+# reprennent celui de leur version), racine de app/model/ sinon
+def version_dir(version):
+    directory = os.path.join(MODEL_DIR, "versions", version.split("/")[0])
+    return directory if os.path.isdir(directory) else MODEL_DIR
+
+
+# Fichiers du dossier de la version : clé = version + date de modification
+@st.cache_data(max_entries=4, show_spinner=False)
+def importances(version, mtime):
+    return pd.read_csv(os.path.join(version_dir(version), "feature_importances.csv"))
+
+
+# Balayage des seuils calculé par l'API (/metrics/curve), un seul appel par
+# version : déplacer le curseur lit le point le plus proche, sans appel
+CURVE_STEP = 0.01
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def curve(version):
+    result = get("/metrics/curve", model_version=version, step=CURVE_STEP)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+
+def threshold_metrics(curve, threshold):
+    point = curve["curve"][round(threshold / CURVE_STEP)]
+    return {
+        "threshold": threshold,
+        "precision": point["precision"],
+        "recall": point["recall"],
+        "f1_score": point["f1_score"],
+        "accuracy": point["accuracy"],
+        "pr_auc": curve["pr_auc"],
+    }
+
+
+# Données des onglets chargées en parallèle (appel API et lectures de
+# fichiers) ; chaque entrée vaut la donnée ou l'exception levée, pour qu'un
+# onglet en erreur n'empêche pas les autres de s'afficher
+def load(version):
+    importances_mtime = _mtime(
+        os.path.join(version_dir(version), "feature_importances.csv")
+    )
+    tasks = {
+        "probabilities": (probabilities, version),
+        "curve": (curve, version),
+        "importances": (importances, version, importances_mtime),
+    }
+    with ThreadPoolExecutor(len(tasks)) as pool:
+        futures = {name: pool.submit(fn, *args) for name, (fn, *args) in tasks.items()}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            results[name] = e
+    return results
@@ -0,0 +1,85 @@
+# feedback.py
+# Import en masse des retours terrain (churn constaté) dans le journal SQLite
+# de l'API, et métriques par fenêtre glissante
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from app.feedback import FeedbackStore
+
+FEEDBACK_DB = os.getenv("FEEDBACK_DB", "app/model/feedback.sqlite")
+# Valeurs acceptées pour la colonne de churn (en plus de 0/1 et booléens)
+LABELS = {"yes": 1, "no": 0, "true": 1, "false": 0, "1": 1, "0": 0}
+
+parser = argparse.ArgumentParser(description="Retours terrain du modèle de churn")
+parser.add_argument("--db", default=FEEDBACK_DB, help="Base SQLite de l'API")
+commands = parser.add_subparsers(dest="command", required=True)
+
+ingest = commands.add_parser("ingest", help="Importe un fichier CSV/Parquet de retours")
+ingest.add_argument("input", help="Fichier d'entrée (.csv ou .parquet)")
+ingest.add_argument("--prediction-id-column", default="prediction_id")
+ingest.add_argument("--customer-id-column", default="customerID")
+ingest.add_argument("--label-column", default="Churn")
+ingest.add_argument("--chunksize", type=int, default=100_000)
+
+report = commands.add_parser("report", help="Précision, rappel, PR-AUC par fenêtre")
+report.add_argument("--windows", default="7,30,90", help="Fenêtres en jours")
+report.add_argument("--threshold", type=float, default=0.40)
+report.add_argument("--model-version", default=None)
+
+
+def read_chunks(path, chunksize):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, dtype=str)
+
+
+def labels(chunk, args):
+    churn = chunk[args.label_column].astype(str).str.strip().str.lower().map(LABELS)
+    if churn.isna().any():
+        bad = chunk.loc[churn.isna(), args.label_column].iloc[0]
+        sys.exit(f"Valeur de churn non reconnue : {bad!r}")
+    customers = (
+        chunk[args.customer_id_column].astype(str)
+        if args.customer_id_column in chunk
+        else [None] * len(chunk)
+    )
+    return zip(
+        chunk[args.prediction_id_column].astype(str), customers, churn.astype(int)
+    )
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    store = FeedbackStore(args.db)
+
+    if args.command == "ingest":
+        totals = {}
+        for chunk in read_chunks(args.input, args.chunksize):
+            for name, n in store.ingest(labels(chunk, args)).items():
+                totals[name] = totals.get(name, 0) + n
+            print(f"\r{totals['received']:,} retours lus", end="", file=sys.stderr)
+        print(
+            f"\n✅ {totals.get('inserted', 0):,} retours enregistrés "
+            f"({totals.get('duplicates', 0):,} doublons, "
+            f"{totals.get('unmatched', 0):,} sans prédiction connue) -> {args.db}"
+        )
+    else:
+        windows = [int(days) for days in args.windows.split(",")]
+        results = store.metrics(windows, args.threshold, args.model_version)
+        print(f"Seuil {args.threshold} · version {args.model_version or 'toutes'}")
+        for window, m in results.items():
+            if not m["n_labeled"]:
+                print(f"{window:>5} | aucun retour")
+                continue
+            print(
+                f"{window:>5} | {m['n_labeled']:8,} retours ({m['n_positive']:,} churn)"
+                f" | précision {m['precision']:.3f} | rappel {m['recall']:.3f}"
+                f" | PR-AUC {m['pr_auc']:.3f}"
+            )
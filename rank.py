@@ -0,0 +1,81 @@
+# rank.py
+# Classement des k clients les plus à risque d'un fichier CSV/Parquet (schéma
+# Telco), scoré par morceaux : mémoire proportionnelle à k, pas au fichier
+import argparse
+import sys
+
+from app.bulk import ChunkWriter, explain_frame, rank_file
+from app.schemas import FEATURE_NAMES
+
+MODEL_PATH = "app/model/xgb_churn_pipeline.pkl"
+
+parser = argparse.ArgumentParser(description="Top-K des clients à risque de churn")
+parser.add_argument("input", help="Fichier d'entrée (.csv ou .parquet)")
+parser.add_argument("output", help="Fichier de sortie (.csv ou .parquet)")
+parser.add_argument("-k", "--top", type=int, default=5000, help="Nombre de clients")
+parser.add_argument("--model", default=MODEL_PATH, help="Pipeline sauvegardé")
+parser.add_argument("--chunksize", type=int, default=100_000)
+parser.add_argument("--workers", type=int, default=1, help="Processus de scoring")
+parser.add_argument("--id-column", default="customerID")
+parser.add_argument(
+    "--explain",
+    type=int,
+    default=0,
+    metavar="N",
+    help="Ajoute les N champs qui contribuent le plus au score (TreeSHAP)",
+)
+parser.add_argument(
+    "--keep-features", action="store_true", help="Recopie les champs d'entrée"
+)
+
+
+def progress(rows, seconds):
+    print(
+        f"\r{rows:,} lignes · {rows / seconds:,.0f} lignes/s", end="", file=sys.stderr
+    )
+
+
+def main():
+    args = parser.parse_args()
+    top, stats = rank_file(
+        args.input,
+        args.model,
+        FEATURE_NAMES,
+        args.top,
+        chunksize=args.chunksize,
+        workers=args.workers,
+        id_column=args.id_column,
+        progress=progress,
+    )
+
+    out = top.drop(columns=[] if args.keep_features else FEATURE_NAMES)
+    if args.explain and len(top):
+        import joblib
+
+        from app.engine import CompiledEngine
+        from app.explain import Explainer
+
+        engine = CompiledEngine.from_pipeline(joblib.load(args.model))
+        explanations = explain_frame(
+            Explainer(engine), top, FEATURE_NAMES, top_k=args.explain
+        )
+        out["explanation"] = [
+            ", ".join(
+                f"{name}={value:+.3f}" for name, value in e["contributions"].items()
+            )
+            for e in explanations
+        ]
+
+    writer = ChunkWriter(args.output)
+    try:
+        writer.write(out)
+    finally:
+        writer.close()
+    print(
+        f"\n✅ Top {len(out):,} sur {stats['rows']:,} lignes en {stats['seconds']:.1f} s "
+        f"({stats['rows_per_s']:,.0f} lignes/s) -> {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
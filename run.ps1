@@ -25,10 +25,13 @@ switch ($command) {
         Start-Process "http://localhost:8501"
     }
     "test-latency" {
-        python test_latency.py
+        python bench.py --scenarios predict --mode closed --concurrency 1
     }
     "load-test" {
-        python load_test.py
+        python bench.py
+    }
+    "bench-baseline" {
+        python bench.py --save-baseline
     }
     Default {
         Write-Host " Commandes disponibles :"
@@ -40,6 +43,7 @@ switch ($command) {
         Write-Host "  ./run.ps1 api          -> open API docs"
         Write-Host "  ./run.ps1 dashboard    -> open Streamlit app"
         Write-Host "  ./run.ps1 test-latency -> run latency test"
-        Write-Host "  ./run.ps1 load-test    -> run load test"
+        Write-Host "  ./run.ps1 load-test    -> run benchmark + SLO check"
+        Write-Host "  ./run.ps1 bench-baseline -> save benchmark baseline"
     }
 }
@@ -0,0 +1,47 @@
+# score.py
+# Scoring en masse d'un fichier CSV/Parquet (schéma Telco) par morceaux
+import argparse
+import sys
+
+from app.bulk import score_file
+from app.schemas import FEATURE_NAMES
+
+MODEL_PATH = "app/model/xgb_churn_pipeline.pkl"
+
+parser = argparse.ArgumentParser(description="Score un fichier clients par morceaux")
+parser.add_argument("input", help="Fichier d'entrée (.csv ou .parquet)")
+parser.add_argument("output", help="Fichier de sortie (.csv ou .parquet)")
+parser.add_argument("--model", default=MODEL_PATH, help="Pipeline sauvegardé")
+parser.add_argument("--chunksize", type=int, default=100_000)
+parser.add_argument("--workers", type=int, default=1, help="Processus de scoring")
+parser.add_argument("--threshold", type=float, default=0.40)
+parser.add_argument("--id-column", default="customerID")
+
+
+def progress(rows, seconds):
+    print(
+        f"\r{rows:,} lignes · {rows / seconds:,.0f} lignes/s", end="", file=sys.stderr
+    )
+
+
+def main():
+    args = parser.parse_args()
+    stats = score_file(
+        args.input,
+        args.output,
+        args.model,
+        FEATURE_NAMES,
+        chunksize=args.chunksize,
+        workers=args.workers,
+        threshold=args.threshold,
+        id_column=args.id_column,
+        progress=progress,
+    )
+    print(
+        f"\n✅ {stats['rows']:,} lignes scorées en {stats['seconds']:.1f} s "
+        f"({stats['rows_per_s']:,.0f} lignes/s) -> {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
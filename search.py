@@ -0,0 +1,369 @@
+# search.py
+# Recherche d'hyperparamètres par successive halving, reprenable après interruption
+import hashlib
+import json
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.metrics import recall_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, train_test_split
+
+
+# Nombre minimal de lignes d'entraînement au premier rung
+MIN_RESOURCES = 200
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True, default=float)
+
+
+# Cache par fold : le préprocesseur (indépendant des paramètres classifier__*)
+# est ajusté une seule fois par fold, et les DMatrix d'un rung sont construites
+# une fois puis partagées par tous les candidats de ce rung
+class FoldCache:
+    def __init__(self, preprocessor, X, y, folds, random_state=42):
+        self.random_state = random_state
+        self.folds = []
+        for train_idx, val_idx in folds:
+            pre = clone(preprocessor)
+            X_train = pre.fit_transform(X.iloc[train_idx])
+            y_train = y.iloc[train_idx].to_numpy()
+            dval = xgb.DMatrix(pre.transform(X.iloc[val_idx]))
+            self.folds.append((X_train, y_train, dval, y.iloc[val_idx].to_numpy()))
+        self._rung = {}
+
+    def prepare(self, n_resources):
+        # Libère les DMatrix du rung précédent avant de construire celles-ci
+        self._rung.clear()
+        for fold, (X_train, y_train, _, _) in enumerate(self.folds):
+            positions = np.arange(min(n_resources, len(y_train)))
+            fit_pos, es_pos = train_test_split(
+                positions,
+                test_size=0.1,
+                stratify=y_train[positions],
+                random_state=self.random_state,
+            )
+            dtrain = xgb.QuantileDMatrix(X_train[fit_pos], y_train[fit_pos])
+            des = xgb.QuantileDMatrix(X_train[es_pos], y_train[es_pos], ref=dtrain)
+            self._rung[fold] = (dtrain, des)
+
+    # Folds d'entraînement complets, sans early stopping (recherche exhaustive)
+    def prepare_full(self):
+        self._rung.clear()
+        for fold, (X_train, y_train, _, _) in enumerate(self.folds):
+            self._rung[fold] = (xgb.QuantileDMatrix(X_train, y_train), None)
+
+    def get(self, fold):
+        dtrain, des = self._rung[fold]
+        _, _, dval, y_val = self.folds[fold]
+        return dtrain, des, dval, y_val
+
+
+# Successive halving sur le param_grid du Pipeline (préprocesseur + XGBoost) :
+# chaque rung entraîne les candidats restants sur une part croissante des
+# données de chaque fold, avec l'early stopping natif de XGBoost (sur 10 % du
+# fold d'entraînement), puis ne garde que le meilleur 1/eta (rappel CV).
+# Chaque essai terminé est ajouté au fichier de checkpoint : une recherche
+# interrompue reprend là où elle s'est arrêtée.
+class SuccessiveHalvingSearch:
+    def __init__(
+        self,
+        pipeline,
+        param_grid,
+        cv=5,
+        eta=3,
+        n_candidates=None,
+        min_resources=None,
+        early_stopping_rounds=20,
+        checkpoint_path=None,
+        fold_cache=True,
+        n_jobs=-1,
+        random_state=42,
+        verbose=1,
+    ):
+        self.pipeline = pipeline
+        self.param_grid = param_grid
+        self.cv = cv
+        self.eta = eta
+        self.n_candidates = n_candidates
+        self.min_resources = min_resources
+        self.early_stopping_rounds = early_stopping_rounds
+        self.checkpoint_path = checkpoint_path
+        self.fold_cache = fold_cache
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.verbose = verbose
+
+    # --- Checkpoint ---
+
+    def _load_checkpoint(self, fingerprint):
+        done = {}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                for line in f:
+                    try:
+                        trial = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # ligne tronquée par une interruption
+                    if trial.get("fingerprint") == fingerprint:
+                        done[trial["key"]] = trial
+        return done
+
+    def _save_trial(self, trial):
+        if self.checkpoint_path:
+            with open(self.checkpoint_path, "a") as f:
+                f.write(json.dumps(trial) + "\n")
+
+    def _fingerprint(self, X, y):
+        h = hashlib.sha1()
+        h.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+        h.update(np.asarray(y).tobytes())
+        h.update(
+            json.dumps(
+                [
+                    self.cv,
+                    self.eta,
+                    self.early_stopping_rounds,
+                    self.random_state,
+                    self.fold_cache,
+                ]
+            ).encode()
+        )
+        return h.hexdigest()[:16]
+
+    # --- Essais ---
+
+    def _fit_one(self, params, X, y, train_idx, val_idx):
+        t0 = time.perf_counter()
+        fit_idx, es_idx = train_test_split(
+            train_idx,
+            test_size=0.1,
+            stratify=y.iloc[train_idx],
+            random_state=self.random_state,
+        )
+        estimator = clone(self.pipeline).set_params(**params)
+        preprocessor = estimator.named_steps["preprocessor"]
+        classifier = estimator.named_steps["classifier"]
+        classifier.set_params(early_stopping_rounds=self.early_stopping_rounds)
+
+        X_fit = preprocessor.fit_transform(X.iloc[fit_idx])
+        classifier.fit(
+            X_fit,
+            y.iloc[fit_idx],
+            eval_set=[(preprocessor.transform(X.iloc[es_idx]), y.iloc[es_idx])],
+            verbose=False,
+        )
+        y_pred = classifier.predict(preprocessor.transform(X.iloc[val_idx]))
+        return {
+            "recall": float(recall_score(y.iloc[val_idx], y_pred)),
+            "best_iteration": int(classifier.best_iteration),
+            "seconds": time.perf_counter() - t0,
+        }
+
+    def _fit_cached(self, params, fold):
+        t0 = time.perf_counter()
+        dtrain, des, dval, y_val = self._cache.get(fold)
+        classifier = clone(self.pipeline).set_params(**params).named_steps["classifier"]
+        xgb_params = {
+            k: v for k, v in classifier.get_xgb_params().items() if v is not None
+        }
+        xgb_params["nthread"] = self._nthread
+        booster = xgb.train(
+            xgb_params,
+            dtrain,
+            num_boost_round=classifier.n_estimators,
+            evals=[(des, "es")],
+            early_stopping_rounds=self.early_stopping_rounds,
+            verbose_eval=False,
+        )
+        proba = booster.predict(dval, iteration_range=(0, booster.best_iteration + 1))
+        # XGBClassifier.predict : classe 1 si proba > 0.5
+        return {
+            "recall": float(recall_score(y_val, proba > 0.5)),
+            "best_iteration": int(booster.best_iteration),
+            "seconds": time.perf_counter() - t0,
+        }
+
+    # --- Recherche ---
+
+    def fit(self, X, y):
+        start = time.perf_counter()
+        candidates = list(ParameterGrid(self.param_grid))
+        rng = np.random.RandomState(self.random_state)
+        if self.n_candidates and self.n_candidates < len(candidates):
+            picked = rng.choice(len(candidates), self.n_candidates, replace=False)
+            candidates = [candidates[i] for i in sorted(picked)]
+
+        # Ordre aléatoire fixe de chaque fold d'entraînement : un rung à n lignes
+        # prend les n premières, les rungs suivants en ajoutent
+        rng_folds = np.random.RandomState(self.random_state)
+        folds = [
+            (rng_folds.permutation(train_idx), val_idx)
+            for train_idx, val_idx in StratifiedKFold(self.cv).split(X, y)
+        ]
+        n_fold_train = max(len(train_idx) for train_idx, _ in folds)
+        # Autant de rungs que le permettent le nombre de candidats et les
+        # données (au moins MIN_RESOURCES lignes au premier rung)
+        min_resources = self.min_resources or MIN_RESOURCES
+        n_rungs = 1 + min(
+            math.floor(math.log(len(candidates), self.eta)),
+            math.floor(math.log(max(n_fold_train / min_resources, 1), self.eta)),
+        )
+        min_resources = n_fold_train // self.eta ** (n_rungs - 1)
+        if self.fold_cache:
+            # Threads (XGBoost relâche le GIL) : les DMatrix ne sont pas picklables
+            n_workers = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+            self._nthread = max(1, os.cpu_count() // n_workers)
+            self._cache = FoldCache(
+                self.pipeline.named_steps["preprocessor"],
+                X,
+                y,
+                folds,
+                self.random_state,
+            )
+        fingerprint = self._fingerprint(X, y)
+        done = self._load_checkpoint(fingerprint)
+        if done and self.verbose:
+            print(f"Reprise : {len(done)} essais déjà terminés dans le checkpoint")
+
+        self.history_ = []
+        self.n_fits_ = 0
+        for rung in range(n_rungs):
+            n_resources = min_resources * self.eta**rung
+            if rung == n_rungs - 1:
+                n_resources = n_fold_train
+            todo, results = [], {}
+            for params in candidates:
+                for fold, (train_idx, val_idx) in enumerate(folds):
+                    key = f"{_params_key(params)}|{rung}|{fold}|{n_resources}"
+                    if key in done:
+                        results[key] = done[key]
+                    else:
+                        todo.append((key, params, fold, train_idx, val_idx))
+
+            if self.verbose:
+                print(
+                    f"Rung {rung}: {len(candidates)} candidats x {len(folds)} folds, "
+                    f"{n_resources} lignes ({len(todo)} essais à lancer)"
+                )
+            if self.fold_cache:
+                if todo:
+                    self._cache.prepare(n_resources)
+                outputs = Parallel(
+                    n_jobs=self.n_jobs, prefer="threads", return_as="generator"
+                )(
+                    delayed(self._fit_cached)(params, fold)
+                    for _, params, fold, _, _ in todo
+                )
+            else:
+                outputs = Parallel(n_jobs=self.n_jobs, return_as="generator")(
+                    delayed(self._fit_one)(
+                        params, X, y, train_idx[:n_resources], val_idx
+                    )
+                    for _, params, _, train_idx, val_idx in todo
+                )
+            for (key, params, fold, _, _), output in zip(todo, outputs):
+                trial = {
+                    "fingerprint": fingerprint,
+                    "key": key,
+                    "params": params,
+                    "rung": rung,
+                    "fold": fold,
+                    "n_resources": n_resources,
+                    **output,
+                }
+                self._save_trial(trial)
+                results[key] = trial
+                self.n_fits_ += 1
+
+            scores = []
+            for params in candidates:
+                trials = [
+                    results[f"{_params_key(params)}|{rung}|{fold}|{n_resources}"]
+                    for fold in range(len(folds))
+                ]
+                scores.append(
+                    (
+                        float(np.mean([t["recall"] for t in trials])),
+                        int(np.mean([t["best_iteration"] for t in trials])),
+                        params,
+                    )
+                )
+            scores.sort(key=lambda s: -s[0])
+            self.history_.append(
+                {"rung": rung, "n_resources": n_resources, "scores": scores}
+            )
+            if rung < n_rungs - 1:
+                candidates = [
+                    p for _, _, p in scores[: math.ceil(len(scores) / self.eta)]
+                ]
+
+        self.best_score_, best_iteration, self.best_params_ = scores[0]
+        # Réentraînement sur tout le jeu avec le nombre d'arbres retenu par l'early stopping
+        self.best_n_estimators_ = best_iteration + 1
+        self.best_estimator_ = clone(self.pipeline).set_params(
+            **{**self.best_params_, "classifier__n_estimators": self.best_n_estimators_}
+        )
+        self.best_estimator_.fit(X, y)
+        self._cache = None
+        self.elapsed_ = time.perf_counter() - start
+        return self
+
+
+# Recherche exhaustive équivalente à GridSearchCV(cv=StratifiedKFold(cv),
+# scoring="recall") : chaque candidat est entraîné sur les QuantileDMatrix du
+# FoldCache (préprocesseur ajusté et matrice quantifiée une fois par fold, pas
+# une fois par fit), dans des threads
+class CachedGridSearch:
+    def __init__(self, pipeline, param_grid, cv=5, n_jobs=-1, verbose=1):
+        self.pipeline = pipeline
+        self.param_grid = param_grid
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.verbose = verbose
+
+    def _fit_fold(self, params, fold):
+        dtrain, _, dval, y_val = self._cache.get(fold)
+        classifier = clone(self.pipeline).set_params(**params).named_steps["classifier"]
+        xgb_params = {
+            k: v for k, v in classifier.get_xgb_params().items() if v is not None
+        }
+        xgb_params["nthread"] = self._nthread
+        booster = xgb.train(xgb_params, dtrain, num_boost_round=classifier.n_estimators)
+        # XGBClassifier.predict : classe 1 si proba > 0.5
+        return float(recall_score(y_val, booster.predict(dval) > 0.5))
+
+    def fit(self, X, y):
+        start = time.perf_counter()
+        candidates = list(ParameterGrid(self.param_grid))
+        folds = list(StratifiedKFold(self.cv).split(X, y))
+        n_workers = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        self._nthread = max(1, os.cpu_count() // n_workers)
+        self._cache = FoldCache(self.pipeline.named_steps["preprocessor"], X, y, folds)
+        self._cache.prepare_full()
+        if self.verbose:
+            print(
+                f"Grid : {len(candidates)} candidats x {len(folds)} folds, "
+                f"{len(candidates) * len(folds)} fits"
+            )
+        recalls = Parallel(n_jobs=self.n_jobs, prefer="threads")(
+            delayed(self._fit_fold)(params, fold)
+            for params in candidates
+            for fold in range(len(folds))
+        )
+        scores = np.asarray(recalls).reshape(len(candidates), len(folds)).mean(axis=1)
+        # Premier meilleur dans l'ordre du grid, comme GridSearchCV
+        best = int(np.argmax(scores))
+        self.best_score_, self.best_params_ = float(scores[best]), candidates[best]
+        self.n_fits_ = len(recalls)
+        self.best_estimator_ = clone(self.pipeline).set_params(**self.best_params_)
+        self.best_estimator_.fit(X, y)
+        self._cache = None
+        self.elapsed_ = time.perf_counter() - start
+        return self
@@ -1,16 +1,141 @@
 # train.py
+import argparse
+import multiprocessing
 import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pandas as pd
 import numpy as np
 import joblib
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold, train_test_split, GridSearchCV
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from xgboost import XGBClassifier
-from sklearn.metrics import classification_report, confusion_matrix
+from sklearn.metrics import classification_report, confusion_matrix, recall_score
 import kagglehub
 
+from app.engine import CompiledEngine
+from app.monitoring import REFERENCE_FILE, build_reference, save_reference
+from app.policies import POLICIES_FILE, build_policies, save_policies
+from app.registry import VERSION_FORMAT
+from app.variants import (
+    REPORT_FILE,
+    VARIANTS_DIR,
+    cheapest,
+    low_importance_columns,
+    measure,
+    quantize,
+    report,
+    save_variant,
+    truncate,
+    with_booster,
+)
+from search import CachedGridSearch, SuccessiveHalvingSearch
+
+parser = argparse.ArgumentParser(description="Entraînement du modèle de churn")
+parser.add_argument(
+    "--search",
+    choices=["grid", "halving"],
+    default="grid",
+    help="grid = GridSearchCV exhaustif, halving = successive halving reprenable",
+)
+parser.add_argument("--eta", type=int, default=3, help="Facteur de réduction (halving)")
+parser.add_argument(
+    "--n-candidates",
+    type=int,
+    default=None,
+    help="Échantillon aléatoire du param_grid (halving, défaut : tout le grid)",
+)
+parser.add_argument(
+    "--checkpoint",
+    default="app/model/search_checkpoint.jsonl",
+    help="Essais terminés (halving), relus pour reprendre une recherche interrompue",
+)
+parser.add_argument(
+    "--no-fold-cache",
+    action="store_true",
+    help="Refait le préprocessing à chaque fit : halving sans cache, ou GridSearchCV (grid)",
+)
+parser.add_argument(
+    "--compare-grid",
+    action="store_true",
+    help="Mesure d'abord le GridSearchCV d'origine puis compare temps, mémoire et rappel",
+)
+parser.add_argument(
+    "--version",
+    default=time.strftime(VERSION_FORMAT),
+    help="Version publiée dans app/model/versions/, horodatage AAAAMMJJ-HHMMSS "
+    "(défaut : maintenant)",
+)
+parser.add_argument(
+    "--no-variants",
+    action="store_true",
+    help="Ne produit pas les variantes allégées (moins d'arbres, float16, moins de colonnes)",
+)
+parser.add_argument(
+    "--variant-trees",
+    default="0.25,0.5,0.75",
+    help="Fractions du nombre d'arbres gardées par les variantes tronquées",
+)
+parser.add_argument(
+    "--variant-coverage",
+    type=float,
+    default=0.99,
+    help="Part de l'importance cumulée gardée par la variante à colonnes réduites",
+)
+parser.add_argument(
+    "--recall-target",
+    type=float,
+    default=None,
+    help="Rappel minimal au seuil --threshold (défaut : rappel du modèle complet - 0.01)",
+)
+parser.add_argument(
+    "--threshold", type=float, default=0.40, help="Seuil des métriques des variantes"
+)
+parser.add_argument(
+    "--precision-floors",
+    default="0.5",
+    help="Précisions minimales des politiques de seuil max_recall_pXX",
+)
+parser.add_argument(
+    "--cost-fn",
+    type=float,
+    default=5.0,
+    help="Coût d'un churner manqué pour la politique min_cost",
+)
+parser.add_argument(
+    "--cost-fp",
+    type=float,
+    default=1.0,
+    help="Coût d'un client fidèle ciblé à tort pour la politique min_cost",
+)
+parser.add_argument(
+    "--policy-segments",
+    default="Contract,InternetService",
+    help="Features pour lesquelles les politiques ont un seuil par modalité",
+)
+parser.add_argument(
+    "--min-segment-size",
+    type=int,
+    default=50,
+    help="Effectif minimal d'une modalité pour avoir son propre seuil",
+)
+args = parser.parse_args()
+
+# La version active de l'API est la plus récente par horodatage : le nom est
+# vérifié, et une version existante refusée, avant l'entraînement
+try:
+    time.strptime(args.version, VERSION_FORMAT)
+except ValueError:
+    parser.error(f"--version {args.version!r} : horodatage AAAAMMJJ-HHMMSS attendu")
+if os.path.exists(os.path.join("app/model/versions", args.version)):
+    parser.error(f"--version {args.version!r} existe déjà dans app/model/versions/")
+
 # Download latest version
 path = kagglehub.dataset_download("blastchar/telco-customer-churn")
 
@@ -91,15 +216,148 @@ param_grid = {
     "classifier__gamma": [0, 1],
 }
 
-grid = GridSearchCV(pipeline, param_grid, cv=5, scoring="recall", n_jobs=-1, verbose=2)
 
-grid.fit(X_train, y_train)
+# Pic mémoire (Mo) du process et de ses workers (loky),
+# échantillonné pendant la recherche avec psutil : RUSAGE_CHILDREN ne compte
+# que les enfants terminés et attendus, pas les workers loky encore vivants.
+# Sans psutil, repli sur getrusage (sous-estimé).
+class PeakMemory:
+    def __init__(self, interval_s=0.2):
+        self.interval_s = interval_s
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        import psutil
+
+        process = psutil.Process()
+        while True:
+            rss = 0
+            for p in [process, *process.children(recursive=True)]:
+                try:
+                    rss += p.memory_info().rss
+                except psutil.Error:  # worker terminé entre-temps
+                    pass
+            self.peak_mb = max(self.peak_mb, rss / 1024**2)
+            if self._stop.wait(self.interval_s):
+                return
+
+    def __enter__(self):
+        try:
+            import psutil  # noqa: F401
+        except ImportError:
+            self._thread = None
+        else:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
 
-print("Best params:", grid.best_params_)
-print("Best recall (CV):", grid.best_score_)
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            return
+        try:
+            import resource
+        except ImportError:
+            self.peak_mb = float("nan")
+            return
+        self.peak_mb = (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        ) / 1024
+
+
+# Avant : le GridSearchCV d'origine, préprocessing et matrice XGBoost
+# refaits à chaque fit
+def run_grid():
+    grid = GridSearchCV(
+        pipeline, param_grid, cv=5, scoring="recall", n_jobs=-1, verbose=2
+    )
+    t0 = time.perf_counter()
+    grid.fit(X_train, y_train)
+    grid.elapsed_ = time.perf_counter() - t0
+    return grid
+
+
+# Référence de --compare-grid, mesurée dans un process forké avant la
+# recherche retenue : ni sa mémoire ni ses workers ne restent dans la mesure
+# suivante
+def measure_grid():
+    from joblib.externals.loky import get_reusable_executor
+
+    with PeakMemory() as grid_memory:
+        grid = run_grid()
+    # Workers loky arrêtés : le process forké peut se terminer
+    get_reusable_executor().shutdown(wait=True)
+    return {
+        "elapsed": grid.elapsed_,
+        "peak_mb": grid_memory.peak_mb,
+        "best_score": grid.best_score_,
+        "test_recall": recall_score(y_test, grid.best_estimator_.predict(X_test)),
+    }
+
+
+os.makedirs("app/model", exist_ok=True)
+
+baseline = None
+if args.compare_grid and not (args.search == "grid" and args.no_fold_cache):
+    fork = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(1, mp_context=fork) as pool:
+        baseline = pool.submit(measure_grid).result()
+
+with PeakMemory() as memory:
+    if args.search == "halving":
+        search = SuccessiveHalvingSearch(
+            pipeline,
+            param_grid,
+            cv=5,
+            eta=args.eta,
+            n_candidates=args.n_candidates,
+            checkpoint_path=args.checkpoint,
+            fold_cache=not args.no_fold_cache,
+            n_jobs=-1,
+        )
+        search.fit(X_train, y_train)
+        print(f"Successive halving : {search.n_fits_} fits en {search.elapsed_:.1f} s")
+    elif args.no_fold_cache:
+        search = run_grid()
+    else:
+        # Même résultat que GridSearchCV, matrices de chaque fold réutilisées
+        search = CachedGridSearch(pipeline, param_grid, cv=5, n_jobs=-1)
+        search.fit(X_train, y_train)
+        print(
+            f"Grid (folds en cache) : {search.n_fits_} fits en {search.elapsed_:.1f} s"
+        )
+
+print("Best params:", search.best_params_)
+print("Best recall (CV):", search.best_score_)
+print(
+    f"Temps de recherche : {search.elapsed_:.1f} s · "
+    f"pic mémoire : {memory.peak_mb:.0f} Mo"
+)
+
+# Avant/après : GridSearchCV d'origine contre la recherche retenue
+if baseline is not None:
+    label = "grid (cache)" if args.search == "grid" else args.search
+    print("\n=== Comparaison avec le GridSearchCV d'origine ===")
+    for name, elapsed, peak_mb, cv_recall, test_recall in [
+        ("GridSearchCV", *baseline.values()),
+        (
+            label,
+            search.elapsed_,
+            memory.peak_mb,
+            search.best_score_,
+            recall_score(y_test, search.best_estimator_.predict(X_test)),
+        ),
+    ]:
+        print(
+            f"{name:<12} | {elapsed:8.1f} s | {peak_mb:6.0f} Mo "
+            f"| recall CV {cv_recall:.3f} | recall test {test_recall:.3f}"
+        )
 
 # === 5. Évaluation finale ===
-best_model = grid.best_estimator_
+best_model = search.best_estimator_
 y_pred = best_model.predict(X_test)
 print("\n=== Rapport classification (seuil 0.5) ===")
 print(classification_report(y_test, y_pred))
@@ -130,13 +388,170 @@ print(f"Importances sauvegardées dans {importances_path}")
 
 
 # === 6. Sauvegardes ===
-os.makedirs("app/model", exist_ok=True)
-
 # Sauvegarde du modèle
 joblib.dump(best_model, "app/model/xgb_churn_pipeline.pkl")
 
+# Artefact compact pour l'API, chargeable sans sklearn :
+# booster XGBoost (UBJSON) + paramètres du scaler et vocabulaires one-hot (.npz)
+engine = CompiledEngine.from_pipeline(best_model)
+engine.save("app/model/xgb_churn_booster.ubj", "app/model/preprocessing.npz")
+
+# Profil de référence du suivi de dérive de l'API : distribution des features
+# à l'entraînement et des probabilités sur le jeu de test (hors échantillon)
+reference = build_reference(engine, X_train, best_model.predict_proba(X_test)[:, 1])
+save_reference(reference, os.path.join("app/model", REFERENCE_FILE))
+
 # Sauvegarde du jeu de test
 df_test = pd.concat([X_test, y_test], axis=1)
 df_test.to_csv("app/model/test_set.csv", index=False)
 
 print("\nModèle et test_set sauvegardés dans app/model/")
+
+# === 7. Variantes allégées ===
+
+
+# Classifieur réentraîné sans les colonnes encodées `dropped` (mises à zéro,
+# ou absentes d'une sortie creuse) ; préprocessing de `model` inchangé
+def without_columns(model, engine, X, y, dropped):
+    X_enc = model.named_steps["preprocessor"].transform(X)
+    mask = np.ones(X_enc.shape[1])
+    mask[dropped] = 0.0
+    if hasattr(X_enc, "multiply"):  # sortie creuse : colonnes absentes
+        X_enc = X_enc.multiply(mask).tocsr()
+        X_enc.eliminate_zeros()
+    else:
+        X_enc = X_enc * mask
+    reduced = clone(model.named_steps["classifier"]).fit(X_enc, y)
+    return with_booster(engine, reduced.get_booster())
+
+
+# Moins d'arbres, seuils et feuilles en float16, colonnes peu importantes
+# retirées (classifieur réentraîné sans elles, préprocessing inchangé pour que
+# l'API accepte les mêmes entrées) ; rappel/PR-AUC et latence de chacune.
+# float16 et cols<n> simulent seulement la perte de qualité : le booster reste
+# en float32 et toutes les colonnes sont encodées (accuracy_only du rapport).
+# Constructeurs (pipeline ajusté, moteur, X, y) -> moteur, appliqués au modèle
+# final et à chaque modèle de fold des politiques de seuil
+builders, accuracy_only = {}, []
+if not args.no_variants:
+    start, stop = engine.iteration_range
+    n_trees = (stop or engine.booster.num_boosted_rounds()) - start
+    for fraction in sorted({float(f) for f in args.variant_trees.split(",")}):
+        n = max(1, round(n_trees * fraction))
+        if n < n_trees:
+            builders[f"trees{n}"] = lambda m, e, X, y, n=n: truncate(e, n)
+    builders["float16"] = lambda m, e, X, y: quantize(e)
+    accuracy_only.append("float16")
+
+    dropped = low_importance_columns(
+        importances_df, feature_names, args.variant_coverage
+    )
+    if dropped:
+        n_kept = len(feature_names) - len(dropped)
+        builders[f"cols{n_kept}"] = partial(without_columns, dropped=dropped)
+        accuracy_only.append(f"cols{n_kept}")
+
+variants = {
+    name: build(best_model, engine, X_train, y_train)
+    for name, build in builders.items()
+}
+if variants:
+    X_test_enc = engine.encode_columns(X_test.to_dict(orient="list"))
+    results = {"full": measure(engine, X_test_enc, y_test, args.threshold)}
+    for name, variant in variants.items():
+        results[name] = measure(variant, X_test_enc, y_test, args.threshold)
+    recall_target = args.recall_target
+    if recall_target is None:
+        recall_target = results["full"]["recall"] - 0.01
+    variants_report = report(results, recall_target, accuracy_only)
+    print(
+        f"\n=== Variantes (seuil {args.threshold}, rappel cible {recall_target:.3f}) ==="
+    )
+    print(variants_report.to_string())
+    print(
+        "Variante recommandée (rappel cible, au moins 10 % plus rapide) : "
+        f"{cheapest(variants_report) or 'aucune, garder le modèle complet'}"
+    )
+    variants_report.to_csv(os.path.join("app/model", REPORT_FILE))
+
+
+# Politiques de seuil (paramètre policy de /predict) : points de fonctionnement
+# optimaux, globaux et par modalité des segments, choisis sur les prédictions
+# hors fold du jeu d'entraînement (CV à 5 folds, mêmes hyperparamètres, et
+# mêmes constructeurs pour les variantes). Le jeu de test, lu par /metrics et
+# le rapport des variantes, ne sert pas à les régler.
+segments = [name for name in args.policy_segments.split(",") if name]
+precision_floors = [float(f) for f in args.precision_floors.split(",")]
+oof = {name: np.zeros(len(X_train)) for name in ["full", *builders]}
+folds = StratifiedKFold(5, shuffle=True, random_state=42).split(X_train, y_train)
+for fit_idx, val_idx in folds:
+    X_fit, y_fit = X_train.iloc[fit_idx], y_train.iloc[fit_idx]
+    fold_model = clone(best_model).fit(X_fit, y_fit)
+    fold_engine = CompiledEngine.from_pipeline(fold_model)
+    X_val_enc = fold_engine.encode_columns(X_train.iloc[val_idx].to_dict(orient="list"))
+    oof["full"][val_idx] = fold_engine.predict_proba(X_val_enc)
+    for name, build in builders.items():
+        fold_variant = build(fold_model, fold_engine, X_fit, y_fit)
+        oof[name][val_idx] = fold_variant.predict_proba(X_val_enc)
+
+
+def threshold_policies(y_score):
+    return build_policies(
+        y_train,
+        y_score,
+        {name: X_train[name] for name in segments},
+        precision_floors=precision_floors,
+        cost_fn=args.cost_fn,
+        cost_fp=args.cost_fp,
+        min_segment_size=args.min_segment_size,
+    )
+
+
+policies = threshold_policies(oof["full"])
+save_policies(policies, os.path.join("app/model", POLICIES_FILE))
+print("\n=== Politiques de seuil (prédictions hors fold) ===")
+for name, policy in policies["policies"].items():
+    print(f"{name:<32} seuil {policy['threshold']:.4f}")
+
+variant_references, variant_policies = {}, {}
+if variants:
+    shutil.rmtree(os.path.join("app/model", VARIANTS_DIR), ignore_errors=True)
+    for name, variant in variants.items():
+        probs = variant.predict_proba(X_test_enc)
+        variant_references[name] = build_reference(variant, X_train, probs)
+        variant_policies[name] = threshold_policies(oof[name])
+    for name, variant in variants.items():
+        save_variant(
+            variant,
+            os.path.join("app/model", VARIANTS_DIR, name),
+            variant_references[name],
+            variant_policies[name],
+        )
+
+# Version publiée pour le rechargement à chaud de l'API : écrite dans un dossier
+# caché (ignoré par le registre) puis renommée d'un bloc, l'API ne voit donc
+# jamais une version à moitié écrite
+version_dir = os.path.join("app/model/versions", args.version)
+staging_dir = os.path.join("app/model/versions", f".{args.version}.tmp")
+# Reste éventuel d'un entraînement interrompu : ses fichiers ne sont pas repris
+shutil.rmtree(staging_dir, ignore_errors=True)
+os.makedirs(staging_dir)
+joblib.dump(best_model, os.path.join(staging_dir, "xgb_churn_pipeline.pkl"))
+engine.save(
+    os.path.join(staging_dir, "xgb_churn_booster.ubj"),
+    os.path.join(staging_dir, "preprocessing.npz"),
+)
+save_reference(reference, os.path.join(staging_dir, REFERENCE_FILE))
+save_policies(policies, os.path.join(staging_dir, POLICIES_FILE))
+importances_df.to_csv(os.path.join(staging_dir, "feature_importances.csv"), index=False)
+for name, variant in variants.items():
+    save_variant(
+        variant,
+        os.path.join(staging_dir, VARIANTS_DIR, name),
+        variant_references[name],
+        variant_policies[name],
+    )
+if variants:
+    variants_report.to_csv(os.path.join(staging_dir, REPORT_FILE))
+os.rename(staging_dir, version_dir)
+print(f"Version {args.version} publiée dans {version_dir}")